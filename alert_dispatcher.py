@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import queue
+import sys
+import threading
+import time
+
+_ALERT = object()  # Đánh dấu yêu cầu phát âm thanh trong hàng đợi
+_STOP = object()
+
+
+class AlertDispatcher:
+    """Một thread duy nhất in ra terminal và phát âm thanh, không chặn luồng đọc log
+
+    Các yêu cầu phát âm thanh trong cùng một cửa sổ thời gian được gộp lại,
+    mỗi cửa sổ phát tối đa một lần.
+    """
+
+    def __init__(self, play_fn, window=2.0, max_queue=10000, stream=None, logger=None):
+        self.play_fn = play_fn
+        self.window = window
+        self.stream = stream or sys.stdout
+        self.logger = logger
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+
+        self.dropped = 0     # Số mục bị bỏ do hàng đợi đầy
+        self.coalesced = 0   # Số yêu cầu âm thanh được gộp vào lần phát khác
+        self.played = 0
+
+    def alert(self):
+        """Yêu cầu phát âm thanh cảnh báo - chỉ một lần put_nowait trên luồng gọi"""
+        try:
+            self._queue.put_nowait(_ALERT)
+        except queue.Full:
+            self.dropped += 1
+
+    def print(self, text=""):
+        """Thay cho print(): đưa dòng vào hàng đợi, thread nền sẽ ghi ra terminal"""
+        try:
+            self._queue.put_nowait(text)
+        except queue.Full:
+            self.dropped += 1
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _play(self):
+        try:
+            self.play_fn()
+            self.played += 1
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Lỗi phát âm thanh: {e}")
+
+    def _run(self):
+        last_play = float("-inf")
+        pending_alert = False
+        while True:
+            timeout = None
+            if pending_alert:
+                timeout = max(last_play + self.window - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            # Gom tất cả dòng đang chờ để ghi một lần
+            lines = []
+            stop = False
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                elif item is _ALERT:
+                    if pending_alert:
+                        self.coalesced += 1
+                    pending_alert = True
+                else:
+                    lines.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except Exception:
+                    pass
+
+            if pending_alert and time.monotonic() - last_play >= self.window:
+                self._play()
+                last_play = time.monotonic()
+                pending_alert = False
+
+            if stop:
+                return
+
+    def stats(self):
+        return {"queued": self.depth(), "dropped": self.dropped,
+                "coalesced": self.coalesced, "played": self.played}
+
+    def stop(self, timeout=5):
+        """Ghi nốt các dòng còn trong hàng đợi rồi dừng thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
@@ -0,0 +1,751 @@
+# -*- coding: utf-8 -*-
+# Benchmark thông lượng đọc và so khớp syslog của các detector Layer 2
+import argparse
+import contextlib
+import json
+import os
+import re
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+from syslog_generator import generate_lines, generate_messages
+
+
+def generate_file(path, lines, match_rate):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in generate_lines(lines, match_rate):
+            f.write(line + "\n")
+
+
+def build_detectors(names):
+    from mac_flood_protect import MACFloodMonitor
+    from dhcp_snooping_protect import DHCPSnoopingMonitor
+    from stp_auto_recover import BPDUGuardMonitor
+    available = {"mac": MACFloodMonitor, "dhcp": DHCPSnoopingMonitor, "stp": BPDUGuardMonitor}
+    return [available[name]() for name in names]
+
+
+def run_worker(path, names):
+    """Đọc toàn bộ file và chạy các detector, giống vòng lặp trong monitor_logs"""
+    from match_rules import RuleTable, parse_host
+    rules = RuleTable(d.rule for d in build_detectors(names))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                hit = rules.match(line)
+                if hit:
+                    rule, m = hit
+                    rule.owner.process_attack(m.group(1).rstrip(".,"), line, parse_host(line))
+
+
+def bench_rules(lines, rates):
+    """So sánh re.search từng mẫu với RuleTable ở nhiều tỉ lệ khớp"""
+    from match_rules import MatchRule, RuleTable
+    patterns = [
+        (r"%PORT_SECURITY-2-PSECURE_VIOLATION:.*port (\S+)", ("PORT_SECURITY-2-PSECURE_VIOLATION",)),
+        (r"%DHCP_SNOOPING-\d+-DHCP_SNOOPING_ERRDISABLE_WARNING:.*interface (\S+)",
+         tuple(f"DHCP_SNOOPING-{sev}-DHCP_SNOOPING_ERRDISABLE_WARNING" for sev in range(8))),
+        (r"%SPANTREE-2-BLOCK_BPDUGUARD.*port (\S+)", ("SPANTREE-2-BLOCK_BPDUGUARD",)),
+    ]
+    table = RuleTable(MatchRule(str(i), p, tags=t) for i, (p, t) in enumerate(patterns))
+
+    for rate in rates:
+        data = list(generate_lines(lines, rate))
+
+        start = time.perf_counter()
+        hits_old = 0
+        for line in data:
+            for pattern, _ in patterns:
+                if re.search(pattern, line):
+                    hits_old += 1
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits_new = 0
+        match = table.match
+        for line in data:
+            if match(line):
+                hits_new += 1
+        new = time.perf_counter() - start
+
+        if hits_old != hits_new:
+            raise RuntimeError(f"Kết quả khác nhau: {hits_old} != {hits_new}")
+        print(f"[khop {rate:.2%}] re.search: {lines / old:,.0f} dong/s | RuleTable: {lines / new:,.0f} dong/s | x{old / new:.1f}")
+
+
+def legacy_state():
+    return {
+        "is_attacking": False,
+        "first_detected": None,
+        "last_activity": None,
+        "attack_count": 0,
+        "attack_timestamps": [],
+        "is_persistent": False,
+        "recovery_cycle": False
+    }
+
+
+def legacy_update(st):
+    """Cập nhật trạng thái theo cách cũ: dict + list datetime + lọc lại cửa sổ mỗi lần"""
+    now = datetime.now()
+    st["last_activity"] = now
+    st["attack_count"] += 1
+    st["attack_timestamps"].append(now)
+    if len(st["attack_timestamps"]) > 10:
+        st["attack_timestamps"] = st["attack_timestamps"][-10:]
+    recent = [ts for ts in st["attack_timestamps"] if (datetime.now() - ts).total_seconds() <= 120]
+    if len(recent) >= 3:
+        intervals = [(recent[i] - recent[i-1]).total_seconds() for i in range(1, len(recent))]
+        return 20 <= sum(intervals) / len(intervals) <= 40
+    return False
+
+
+def slotted_update(st):
+    now = time.monotonic()
+    st.record(now)
+    count, avg = st.window_stats(now, 120)
+    return count >= 3 and avg is not None and 20 <= avg <= 40
+
+
+def bench_state(ports, updates):
+    """Bộ nhớ và tốc độ cập nhật trạng thái cổng: dict cũ so với PortState"""
+    from port_state import PortState
+    setups = [("dict", legacy_state, legacy_update), ("PortState", PortState, slotted_update)]
+    for label, factory, update in setups:
+        tracemalloc.start()
+        state = defaultdict(factory)
+        names = [f"Ethernet{i // 48}/{i % 48}" for i in range(ports)]
+        for name in names:
+            # Mỗi cổng bị tấn công đủ 10 lần để ring buffer/list đầy
+            for _ in range(10):
+                update(state[name])
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for i in range(updates):
+            update(state[names[i % ports]])
+        elapsed = time.perf_counter() - start
+        print(f"[{label}] {ports:,} cong: {current / 1024 / 1024:.1f} MB ({current / ports:.0f} B/cong) | {updates / elapsed:,.0f} cap nhat/s")
+
+
+def measure(path, groups):
+    """Chạy mỗi nhóm detector trong một tiến trình con, đo wall time và CPU"""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    procs = [
+        subprocess.Popen([sys.executable, __file__, "worker", path, ",".join(group)])
+        for group in groups
+    ]
+    for proc in procs:
+        if proc.wait() != 0:
+            raise RuntimeError(f"worker lỗi: {proc.args}")
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return wall, cpu
+
+
+def bench_periodicity(ports, periodic_ratio, jitter, seed=1):
+    """Tốc độ và độ chính xác chấm điểm chu kỳ bằng NumPy so với luật trung bình 20-40s"""
+    import random
+    from periodicity import score_periodicity, times_matrix
+    from port_state import PortState
+    rnd = random.Random(seed)
+    now = 10_000.0
+    states, truth = [], []
+    for i in range(ports):
+        st = PortState()
+        periodic = rnd.random() < periodic_ratio
+        t = now - rnd.uniform(0, 5)
+        times = []
+        for _ in range(PortState.HISTORY):
+            times.append(t)
+            if periodic:
+                # Chu kỳ 30s có dao động, thỉnh thoảng bỏ lỡ một chu kỳ
+                t -= 30 * (2 if rnd.random() < 0.1 else 1) + rnd.uniform(-jitter, jitter)
+            else:
+                t -= rnd.expovariate(1 / 30)
+        for ts in reversed(times):
+            st.record(ts)
+        states.append(st)
+        truth.append(periodic)
+
+    start = time.perf_counter()
+    score, cycles = score_periodicity(times_matrix(states), now, 30, 270)
+    elapsed = time.perf_counter() - start
+    found = (cycles >= 2) & (score >= 0.75)
+
+    start = time.perf_counter()
+    legacy = []
+    for st in states:
+        count, avg = st.window_stats(now, 120)
+        legacy.append(count >= 3 and avg is not None and 20 <= avg <= 40)
+    legacy_elapsed = time.perf_counter() - start
+
+    def accuracy(pred):
+        tp = sum(1 for p, t in zip(pred, truth) if p and t)
+        fp = sum(1 for p, t in zip(pred, truth) if p and not t)
+        return tp / max(sum(truth), 1), fp / max(len(truth) - sum(truth), 1)
+
+    for label, pred, spent in (("NumPy", list(found), elapsed), ("luat 20-40s", legacy, legacy_elapsed)):
+        recall, false_pos = accuracy(pred)
+        print(f"[{label}] {ports:,} cong trong {spent * 1000:.0f} ms | phat hien {recall:.1%} | bao nham {false_pos:.1%}")
+
+
+def bench_reader(size_mb, match_rate, path=None):
+    """Đọc hết một file syslog lớn: readline + decode mọi dòng so với đọc theo khối chỉ decode dòng khớp"""
+    from log_tailer import LogTailer
+    from match_rules import RuleTable
+    rules = RuleTable(d.rule for d in build_detectors(["mac", "dhcp", "stp"]))
+    workdir = None
+    if path is None:
+        workdir = tempfile.mkdtemp(prefix="l2reader_")
+        path = os.path.join(workdir, "syslog.log")
+        block = "".join(line + "\n" for line in generate_lines(100_000, match_rate)).encode()
+        with open(path, "wb") as f:
+            for _ in range(max(size_mb * 1024 * 1024 // len(block), 1)):
+                f.write(block)
+    size = os.path.getsize(path)
+    try:
+        results = {}
+        for label, needles in (("readline", None), ("khoi + loc byte", rules.needles())):
+            tailer = LogTailer(path, needles=needles)
+            tailer._open(seek_end=False)
+            before = resource.getrusage(resource.RUSAGE_SELF)
+            start = time.perf_counter()
+            decoded = hits = 0
+            for line in tailer._read_available():
+                decoded += 1
+                if rules.match(line.strip()):
+                    hits += 1
+            elapsed = time.perf_counter() - start
+            after = resource.getrusage(resource.RUSAGE_SELF)
+            tailer.close()
+            cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+            results[label] = elapsed
+            print(f"[{label}] {size / 1024 / 1024:,.0f} MB trong {elapsed:.2f}s "
+                  f"({size / 1024 / 1024 / elapsed:,.0f} MB/s, CPU {cpu:.2f}s) | "
+                  f"decode {decoded:,} dong, khop {hits:,}")
+        print(f"Nhanh hon {results['readline'] / results['khoi + loc byte']:.1f} lan")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir)
+
+
+def bench_sharded(lines, hosts, match_rate, worker_counts):
+    """Thông lượng xử lý dòng khớp luật: một tiến trình so với chia cho N tiến trình theo switch"""
+    from monitor_core import Layer2Monitor
+    names = [f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(hosts)]
+    # Khoảng 2000 dòng mỗi giây theo timestamp của switch
+    stamp = lambda t: f"Mar  1 {t // 3600 % 24:02d}:{t // 60 % 60:02d}:{t % 60:02d}"
+    data = [f"{stamp(n // 2000)} {names[n % hosts]} {message}"
+            for n, message in enumerate(generate_messages(lines, match_rate))]
+    workdir = tempfile.mkdtemp(prefix="l2shard_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    base = None
+    try:
+        for workers in worker_counts:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                monitor = Layer2Monitor(build_detectors(["mac", "dhcp", "stp"]), os.path.join(workdir, "syslog.log"))
+            monitor.sound_enabled = False
+            monitor.alerts.stream = open(os.devnull, "w")
+            if workers:
+                monitor.enable_sharding(workers)
+            before = resource.getrusage(resource.RUSAGE_SELF)
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            start = time.perf_counter()
+            for line in data:
+                monitor.process_line(line)
+            if workers:
+                # stop() chờ các tiến trình con xử lý hết các lô đã gửi
+                monitor.sharded.stop()
+            elapsed = time.perf_counter() - start
+            cpu = lambda a, b: (a.ru_utime - b.ru_utime) + (a.ru_stime - b.ru_stime)
+            main_cpu = cpu(resource.getrusage(resource.RUSAGE_SELF), before)
+            worker_cpu = cpu(resource.getrusage(resource.RUSAGE_CHILDREN), children)
+            monitor.alerts.stop()
+            rate = lines / elapsed
+            base = base or rate
+            # Tiến trình đọc log là phần không chia được: nó giới hạn mức tăng tốc khi có đủ core
+            ceiling = f", toi da ~x{(main_cpu + worker_cpu) / main_cpu:.1f} khi du core" if workers else ""
+            print(f"[{workers or 1} tien trinh{'' if workers else ' (khong chia)'}] {lines:,} dong, {hosts} switch "
+                  f"trong {elapsed:.2f}s: {rate:,.0f} dong/s (x{rate / base:.2f}) | CPU tien trinh doc "
+                  f"{main_cpu / lines * 1e6:.2f} us/dong, tien trinh con {worker_cpu / lines * 1e6:.2f} us/dong{ceiling}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+    from event_log import close_writers
+    close_writers()
+
+
+def bench_fanin(file_counts, lines, match_rate, idle_seconds):
+    """Theo dõi một thư mục mỗi switch một file: CPU lúc rảnh, thông lượng và độ trễ nhận file mới"""
+    import threading
+    from log_tailer import DirectoryTailer
+    from match_rules import RuleTable
+    rules = RuleTable(d.rule for d in build_detectors(["mac", "dhcp", "stp"]))
+    messages = list(generate_messages(10_000, match_rate))
+    cpu = lambda: sum(resource.getrusage(resource.RUSAGE_SELF)[:2])
+    for files in file_counts:
+        workdir = tempfile.mkdtemp(prefix="l2fanin_")
+        names = [f"10.{i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(files)]
+        for name in names:
+            open(os.path.join(workdir, f"{name}.log"), "w").close()
+        tailer = DirectoryTailer(os.path.join(workdir, "*.log"), needles=rules.needles(), yield_idle=True)
+        seen = {}
+
+        def consume():
+            for line in tailer.lines():
+                if line is not None:
+                    seen[tailer.host] = seen.get(tailer.host, 0) + 1
+
+        def wait_for(total, timeout=60):
+            deadline = time.monotonic() + timeout
+            while sum(seen.values()) + tailer.lines_skipped < total and time.monotonic() < deadline:
+                time.sleep(0.005)
+
+        thread = threading.Thread(target=consume, daemon=True)
+        try:
+            thread.start()
+            while len(tailer.readers) < files:
+                time.sleep(0.01)
+            # Không có log mới: CPU chỉ gồm các lần thức dậy định kỳ, không phụ thuộc số file
+            before = cpu()
+            time.sleep(idle_seconds)
+            idle = (cpu() - before) / idle_seconds
+
+            before, start = cpu(), time.perf_counter()
+            per_file = max(lines // files, 1)
+            for i, name in enumerate(names):
+                with open(os.path.join(workdir, f"{name}.log"), "a") as f:
+                    f.writelines(f"Mar  1 00:00:{n % 60:02d} {name} {messages[(i + n) % len(messages)]}\n"
+                                 for n in range(per_file))
+            wait_for(per_file * files)
+            elapsed = time.perf_counter() - start
+            busy = cpu() - before
+            wrong = sum(1 for host in seen if host not in names)
+
+            # Switch mới xuất hiện: thời gian từ lúc ghi dòng đầu tiên tới khi tailer sinh ra dòng đó
+            start = time.perf_counter()
+            with open(os.path.join(workdir, "10.255.255.254.log"), "a") as f:
+                f.write(f"Mar  1 00:00:00 10.255.255.254 {next(generate_messages(1, 1.0))}\n")
+            while "10.255.255.254" not in seen and time.perf_counter() - start < 10:
+                time.sleep(0.001)
+            pickup = time.perf_counter() - start
+            print(f"[{files:,} file] ranh: CPU {idle * 100:.2f}% | ghi {per_file * files:,} dong: "
+                  f"{per_file * files / elapsed:,.0f} dong/s, CPU {busy:.2f}s, host sai {wrong} | "
+                  f"file moi sau {pickup * 1000:.1f} ms")
+        finally:
+            tailer.stop()
+            thread.join(timeout=5)
+            shutil.rmtree(workdir)
+
+
+def bench_storm(ports, bursts, burst_lines, repeat_every):
+    """Bão PSECURE_VIOLATION: mỗi cổng xả burst_lines dòng giống nhau sau mỗi recovery cycle 30s,
+    thỉnh thoảng kèm dòng "last message repeated"; so sánh không gộp (window 0) với StormGuard"""
+    from monitor_core import Layer2Monitor
+    stamp = lambda t: f"Mar  1 {t // 3600 % 24:02d}:{t // 60 % 60:02d}:{t % 60:02d}"
+    data = []
+    for cycle in range(bursts):
+        for j in range(burst_lines):
+            for k in range(ports):
+                host = f"10.0.{k // 48}.1"
+                data.append(f"{stamp(cycle * 30)} {host} <186>0: *Mar  1 00:00:00.123: "
+                            f"%PORT_SECURITY-2-PSECURE_VIOLATION: Security violation occurred, caused by "
+                            f"MAC address aabb.cc00.0001 on port Ethernet0/{k % 48}.")
+                if repeat_every and j % repeat_every == repeat_every - 1:
+                    data.append(f"{stamp(cycle * 30)} {host} last message repeated 50 times")
+    workdir = tempfile.mkdtemp(prefix="l2storm_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for window in (0, 5.0):
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                monitor = Layer2Monitor(build_detectors(["mac"]), os.path.join(workdir, "syslog.log"))
+            monitor.sound_enabled = False
+            monitor.alerts.stream = open(os.devnull, "w")
+            monitor.guard.window = window
+            calls = [0, 0]  # process_attack, dòng in ra terminal
+            for detector in monitor.detectors:
+                def counted(*args, _orig=detector.process_attack):
+                    calls[0] += 1
+                    _orig(*args)
+                detector.process_attack = counted
+
+                def printed(text="", _orig=detector.console):
+                    calls[1] += 1
+                    _orig(text)
+                detector.console = printed
+            start = time.perf_counter()
+            for line in data:
+                monitor.process_line(line)
+            elapsed = time.perf_counter() - start
+            states = [st for d in monitor.detectors for sh in d.shards.values() for st in sh.interface_state.values()]
+            monitor.alerts.stop()
+            print(f"[{'khong gop' if not window else f'gop {window:g}s'}] {len(data):,} dong trong {elapsed:.2f}s "
+                  f"({len(data) / elapsed:,.0f} dong/s) | process_attack {calls[0]:,}, in terminal {calls[1]:,} | "
+                  f"tong attack_count {sum(st.attack_count for st in states):,}, "
+                  f"lien tuc {sum(st.is_persistent for st in states)}/{len(states)} cong | {monitor.guard.stats()}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+    from event_log import close_writers
+    close_writers()
+
+
+def mac_table_output(entries, flood_port=None, flood=0, seed=1):
+    """Sinh output show mac address-table với entries MAC trên 48 cổng, thêm flood MAC trên flood_port"""
+    import random
+    rnd = random.Random(seed)
+    rows = ["          Mac Address Table", "-------------------------------------------", "",
+            "Vlan    Mac Address       Type        Ports", "----    -----------       --------    -----"]
+    for i in range(entries):
+        mac = f"{0xaabb00000000 + i:012x}"
+        rows.append(f"{1 + i % 10:4d}    {mac[:4]}.{mac[4:8]}.{mac[8:]}    DYNAMIC     Et{i % 48 // 4}/{i % 4}")
+    for _ in range(flood):
+        mac = f"{rnd.getrandbits(48):012x}"
+        rows.append(f"   1    {mac[:4]}.{mac[4:8]}.{mac[8:]}    DYNAMIC     {flood_port}")
+    rows.append(f"Total Mac Addresses for this criterion: {entries + flood}")
+    return "\n".join(rows)
+
+
+def bench_mac_table(entries, flood):
+    """Tốc độ phân tích + so sánh bảng MAC và bộ nhớ: số nguyên đóng gói so với chuỗi"""
+    from mac_table import MacTableTracker, parse_mac_table
+    first = mac_table_output(entries)
+    second = mac_table_output(entries, "Et0/1", flood)
+
+    tracker = MacTableTracker()
+    tracker.update("sw", first, 0.0)
+    start = time.perf_counter()
+    deltas = tracker.update("sw", second, 60.0)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    packed = parse_mac_table(second)
+    packed_mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del packed
+
+    tracemalloc.start()
+    strings = defaultdict(set)
+    for line in second.splitlines():
+        parts = line.split()
+        if len(parts) == 4 and parts[0].isdigit():
+            strings[parts[3]].add((parts[0], parts[1]))
+    str_mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"[bang MAC] {entries + flood:,} MAC: phan tich + so sanh {elapsed * 1000:.0f} ms | "
+          f"so nguyen {packed_mem / 1024 / 1024:.1f} MB, chuoi {str_mem / 1024 / 1024:.1f} MB | thay doi: {deltas}")
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def current_rss():
+    """RSS hiện tại của tiến trình (byte), đọc từ /proc"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_monitor(args):
+    """Chạy monitor_logs trên file do syslog_generator ghi ra, đo thông lượng, độ trễ, RSS và CPU"""
+    from monitor_core import Layer2Monitor
+    workdir = tempfile.mkdtemp(prefix="l2bench_")
+    log_path = os.path.join(workdir, "syslog.log")
+    timings_path = os.path.join(workdir, "timings.json")
+    open(log_path, "w").close()
+
+    seq_re = re.compile(r"<\d+>(\d+):")
+    detected = {}  # số thứ tự dòng -> time.monotonic() lúc detector nhận được
+    processed = [0, None, None]  # số dòng, thời điểm dòng đầu, thời điểm dòng cuối
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        monitor = Layer2Monitor(build_detectors(args.detectors.split(",")), log_path)
+
+    process_line = monitor.process_line
+
+    def counted(line, host=None):
+        now = time.monotonic()
+        if processed[1] is None:
+            processed[1] = now
+        processed[0] += 1
+        processed[2] = now
+        process_line(line, host)
+    monitor.process_line = counted
+
+    # Đo ở StormGuard: mọi dòng tấn công đều đi qua, kể cả dòng được gộp không tới process_attack
+    attack = monitor.guard.attack
+
+    def timed(detector, interface, log_line, device, now, count=None):
+        m = seq_re.search(log_line)
+        if m:
+            detected.setdefault(int(m.group(1)), time.monotonic())
+        attack(detector, interface, log_line, device, now, count)
+    monitor.guard.attack = timed
+
+    generator = os.path.join(os.path.dirname(os.path.abspath(__file__)), "syslog_generator.py")
+    cmd = [sys.executable, generator, "--output", log_path, "--timings", timings_path,
+           "--count", str(args.lines), "--rate", str(args.rate), "--match-rate", str(args.match_rate),
+           "--burst-size", str(args.burst_size), "--cycle-ports", str(args.cycle_ports)]
+
+    def drive():
+        # Chờ monitor mở file rồi mới ghi, chờ đọc hết rồi dừng monitor
+        time.sleep(0.5)
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+        # Dòng không chứa tag của luật nào bị tailer bỏ qua trước khi tới process_line
+        while (processed[0] + monitor.tailer.lines_skipped < args.lines
+               and time.monotonic() - (processed[2] or 0) < args.drain):
+            time.sleep(0.05)
+        monitor.signal_handler(signal.SIGTERM, None)
+
+    driver = threading.Thread(target=drive, daemon=True)
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    driver.start()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        monitor.monitor_logs()
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    driver.join()
+
+    with open(timings_path) as f:
+        written = dict(json.load(f))
+    latencies = [detected[n] - t for n, t in written.items() if n in detected]
+    lines, first, last = processed
+    lines += monitor.tailer.lines_skipped
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    result = {
+        "commit": git_commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "params": {"lines": args.lines, "rate": args.rate, "match_rate": args.match_rate,
+                   "burst_size": args.burst_size, "cycle_ports": args.cycle_ports,
+                   "detectors": args.detectors},
+        "lines": lines,
+        "lines_per_s": round(lines / (last - first), 1) if lines > 1 else None,
+        "attack_lines": len(written),
+        "detected": len(latencies),
+        "latency_ms": {"p50": ms(percentile(latencies, 0.5)), "p99": ms(percentile(latencies, 0.99)),
+                       "max": ms(max(latencies, default=None))},
+        "rss_mb": round(current_rss() / 1024 / 1024, 1) if current_rss() else None,
+        "max_rss_mb": round(after.ru_maxrss / 1024, 1),
+        "cpu_s": round(cpu, 3),
+        "cpu_us_per_line": round(cpu / lines * 1e6, 3) if lines else None,
+    }
+    for name in ("syslog.log", "timings.json"):
+        os.remove(os.path.join(workdir, name))
+    os.rmdir(workdir)
+    return result
+
+
+def startup_worker(path):
+    """Khởi động monitor như dịch vụ thật và báo thời điểm xử lý xong dòng đầu tiên"""
+    from monitor_core import Layer2Monitor
+    monitor = Layer2Monitor(build_detectors(["mac", "dhcp", "stp"]), path)
+    monitor.tailer.from_start = True
+    process_line = monitor.process_line
+
+    def first_line(line, host=None):
+        process_line(line, host)
+        sys.stdout.write(f"\nFIRST_LINE {time.monotonic()}\n")
+        sys.stdout.flush()
+        os._exit(0)
+    monitor.process_line = first_line
+    monitor.monitor_logs()
+
+
+def bench_startup(runs):
+    """Thời gian từ lúc chạy tiến trình tới khi dòng syslog đầu tiên được xử lý"""
+    workdir = tempfile.mkdtemp(prefix="l2startup_")
+    path = os.path.join(workdir, "syslog.log")
+    with open(path, "w") as f:
+        f.write(next(generate_lines(1, 1.0)) + "\n")
+    times = []
+    for _ in range(runs):
+        start = time.monotonic()
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "startup-worker", path],
+                             capture_output=True, text=True, cwd=workdir,
+                             env={**os.environ, "PYGAME_HIDE_SUPPORT_PROMPT": "1"})
+        marker = [l for l in out.stdout.splitlines() if l.startswith("FIRST_LINE ")]
+        if not marker:
+            raise RuntimeError(f"worker lỗi: {out.stderr}")
+        times.append(float(marker[0].split()[1]) - start)
+    shutil.rmtree(workdir)
+    p50 = percentile(times, 0.5)
+    print(f"[khoi dong] dong dau tien sau p50 {p50 * 1000:.0f} ms | max {max(times) * 1000:.0f} ms "
+          f"({runs} lan) - {'DAT' if p50 < 0.15 else 'CHUA DAT'} muc tieu 150 ms")
+
+
+def compare_results(result, baseline):
+    """In thay đổi so với kết quả của commit trước"""
+    metrics = [("lines_per_s", result["lines_per_s"], baseline.get("lines_per_s")),
+               ("latency p50 ms", result["latency_ms"]["p50"], baseline.get("latency_ms", {}).get("p50")),
+               ("latency p99 ms", result["latency_ms"]["p99"], baseline.get("latency_ms", {}).get("p99")),
+               ("max_rss_mb", result["max_rss_mb"], baseline.get("max_rss_mb")),
+               ("cpu_us_per_line", result["cpu_us_per_line"], baseline.get("cpu_us_per_line"))]
+    print(f"[SO SANH] {baseline.get('commit')} -> {result['commit']}")
+    for name, new, old in metrics:
+        if new is None or not old:
+            continue
+        print(f"  {name}: {old} -> {new} ({(new - old) / old:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đọc syslog cho các detector Layer 2")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    compare = sub.add_parser("compare", help="3 tiến trình riêng so với 1 tiến trình dùng chung")
+    compare.add_argument("--lines", type=int, default=1_000_000)
+    compare.add_argument("--match-rate", type=float, default=0.001)
+    compare.add_argument("--file", default="bench_syslog.log")
+
+    rules = sub.add_parser("rules", help="re.search từng mẫu so với RuleTable")
+    rules.add_argument("--lines", type=int, default=500_000)
+    rules.add_argument("--rates", default="0.0001,0.01,0.5")
+
+    state = sub.add_parser("state", help="Bộ nhớ và tốc độ cập nhật trạng thái cổng")
+    state.add_argument("--ports", type=int, default=100_000)
+    state.add_argument("--updates", type=int, default=1_000_000)
+
+    mon = sub.add_parser("monitor", help="Đo monitor_logs: dòng/s, độ trễ phát hiện, RSS, CPU (JSON)")
+    mon.add_argument("--lines", type=int, default=500_000)
+    mon.add_argument("--rate", type=int, default=20_000, help="Tốc độ ghi dòng/giây, 0 = không giới hạn")
+    mon.add_argument("--match-rate", type=float, default=0.01)
+    mon.add_argument("--burst-size", type=int, default=20)
+    mon.add_argument("--cycle-ports", type=int, default=2)
+    mon.add_argument("--detectors", default="mac,dhcp,stp")
+    mon.add_argument("--drain", type=float, default=2.0, help="Số giây chờ monitor đọc hết sau khi ghi xong")
+    mon.add_argument("--json", metavar="FILE", help="Lưu kết quả, mặc định benchmark_<commit>.json")
+    mon.add_argument("--baseline", metavar="FILE", help="So sánh với kết quả JSON của commit khác")
+
+    period = sub.add_parser("periodicity", help="Chấm điểm chu kỳ recovery bằng NumPy trên nhiều cổng")
+    period.add_argument("--ports", type=int, default=100_000)
+    period.add_argument("--periodic-ratio", type=float, default=0.1)
+    period.add_argument("--jitter", type=float, default=6.0, help="Độ dao động (giây) của chu kỳ 30s")
+
+    reader = sub.add_parser("reader", help="Đọc file lớn: readline + decode so với đọc theo khối lọc trên byte")
+    reader.add_argument("--size-mb", type=int, default=2048)
+    reader.add_argument("--match-rate", type=float, default=0.001)
+    reader.add_argument("--file", help="Dùng file syslog có sẵn thay vì sinh file mới")
+
+    shard = sub.add_parser("sharded", help="Xử lý dòng khớp luật trên một so với nhiều tiến trình chia theo switch")
+    shard.add_argument("--lines", type=int, default=500_000)
+    shard.add_argument("--hosts", type=int, default=300)
+    shard.add_argument("--match-rate", type=float, default=0.5)
+    shard.add_argument("--workers", default="0,1,2,4,8", help="Danh sách số tiến trình, 0 = không chia")
+
+    fanin = sub.add_parser("fanin", help="Theo dõi thư mục mỗi switch một file (CPU lúc rảnh, dòng/s, file mới)")
+    fanin.add_argument("--files", default="10,100,1000", help="Danh sách số file")
+    fanin.add_argument("--lines", type=int, default=200_000)
+    fanin.add_argument("--match-rate", type=float, default=0.01)
+    fanin.add_argument("--idle-seconds", type=float, default=5.0)
+
+    storm = sub.add_parser("storm", help="Bão dòng tấn công giống nhau: gộp bằng StormGuard so với không gộp")
+    storm.add_argument("--ports", type=int, default=96)
+    storm.add_argument("--bursts", type=int, default=5, help="Số recovery cycle (30s) liên tiếp")
+    storm.add_argument("--burst-lines", type=int, default=300, help="Số dòng giống nhau mỗi cổng mỗi cycle")
+    storm.add_argument("--repeat-every", type=int, default=100,
+                       help="Chèn dòng \"last message repeated 50 times\" sau mỗi N dòng của một cổng (0 = không)")
+
+    mac = sub.add_parser("mactable", help="Phân tích và so sánh bảng MAC giữa hai lần hỏi")
+    mac.add_argument("--entries", type=int, default=100_000)
+    mac.add_argument("--flood", type=int, default=2_000, help="Số MAC mới trên một cổng ở lần hỏi thứ hai")
+
+    startup = sub.add_parser("startup", help="Thời gian từ lúc khởi động tới khi xử lý dòng đầu tiên")
+    startup.add_argument("--runs", type=int, default=10)
+    startup_w = sub.add_parser("startup-worker")
+    startup_w.add_argument("path")
+
+    worker = sub.add_parser("worker")
+    worker.add_argument("path")
+    worker.add_argument("detectors")
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        run_worker(args.path, args.detectors.split(","))
+        return
+    if args.command == "rules":
+        bench_rules(args.lines, [float(r) for r in args.rates.split(",")])
+        return
+    if args.command == "state":
+        bench_state(args.ports, args.updates)
+        return
+    if args.command == "periodicity":
+        bench_periodicity(args.ports, args.periodic_ratio, args.jitter)
+        return
+    if args.command == "reader":
+        bench_reader(args.size_mb, args.match_rate, args.file)
+        return
+    if args.command == "sharded":
+        bench_sharded(args.lines, args.hosts, args.match_rate, [int(w) for w in args.workers.split(",")])
+        return
+    if args.command == "fanin":
+        bench_fanin([int(n) for n in args.files.split(",")], args.lines, args.match_rate, args.idle_seconds)
+        return
+    if args.command == "storm":
+        bench_storm(args.ports, args.bursts, args.burst_lines, args.repeat_every)
+        return
+    if args.command == "mactable":
+        bench_mac_table(args.entries, args.flood)
+        return
+    if args.command == "startup":
+        bench_startup(args.runs)
+        return
+    if args.command == "startup-worker":
+        startup_worker(args.path)
+        return
+    if args.command == "monitor":
+        result = bench_monitor(args)
+        path = args.json or f"benchmark_{result['commit'] or datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+        print(json.dumps(result, indent=2))
+        if args.baseline:
+            with open(args.baseline) as f:
+                compare_results(result, json.load(f))
+        return
+
+    generate_file(args.file, args.lines, args.match_rate)
+    try:
+        setups = {
+            "3 tien trinh": [["mac"], ["dhcp"], ["stp"]],
+            "1 tien trinh": [["mac", "dhcp", "stp"]],
+        }
+        for label, groups in setups.items():
+            wall, cpu = measure(args.file, groups)
+            print(f"[{label}] {args.lines / wall:,.0f} dong/s | CPU {cpu * 1_000_000 / args.lines:.2f} s / 1M dong")
+    finally:
+        os.remove(args.file)
+
+
+if __name__ == "__main__":
+    main()
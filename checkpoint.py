@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+
+class CheckpointStore:
+    """Lưu vị trí đọc log và trạng thái cổng vào file append-only, chịu được crash
+
+    Mỗi lần checkpoint chỉ ghi thêm một dòng JSON gồm vị trí đọc và các cổng đã thay đổi.
+    Khi nạp lại, các dòng được áp dụng theo thứ tự; dòng cuối ghi dở do crash bị bỏ qua.
+    Sau compact_after lần ghi, file được viết lại thành một snapshot đầy đủ.
+    """
+
+    def __init__(self, path, compact_after=500, logger=None):
+        self.path = str(path)
+        self.compact_after = compact_after
+        self.logger = logger
+        self.records = 0  # Số dòng hiện có trong file
+
+    def load(self):
+        """Trả về (position, states); states: rule -> {(device, iface): bản ghi cổng}"""
+        position = None
+        states = {}
+        self.records = 0
+        try:
+            f = open(self.path, encoding="utf-8")
+        except FileNotFoundError:
+            return None, {}
+        with f:
+            for raw in f:
+                try:
+                    rec = json.loads(raw)
+                except ValueError:
+                    # Dòng ghi dở khi tiến trình bị dừng đột ngột
+                    if self.logger:
+                        self.logger.warning(f"Bỏ qua dòng checkpoint hỏng trong {self.path}")
+                    continue
+                self.records += 1
+                if rec.get("position") is not None:
+                    # Theo dõi nhiều file thì vị trí là {tên file: [st_dev, st_ino, offset]}
+                    position = rec["position"]
+                    if isinstance(position, list):
+                        position = tuple(position)
+                for rule, ports in rec.get("ports", {}).items():
+                    table = states.setdefault(rule, {})
+                    for device, iface, port in ports:
+                        table[(device, iface)] = port
+        return position, states
+
+    def append(self, position, ports):
+        """Ghi thêm các cổng đã thay đổi kể từ lần trước; ports: rule -> [[device, iface, bản ghi]]"""
+        line = json.dumps({"position": position, "ports": ports}, separators=(",", ":"))
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.records += 1
+
+    def rewrite(self, position, ports):
+        """Thay file bằng một snapshot đầy đủ (ghi file tạm rồi đổi tên nguyên tử)"""
+        tmp = self.path + ".tmp"
+        line = json.dumps({"position": position, "ports": ports}, separators=(",", ":"))
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.records = 1
+
+    def needs_compaction(self):
+        return self.records >= self.compact_after
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Thời gian sự kiện lấy từ timestamp switch ghi trong dòng syslog, kèm watermark cho dòng đến trễ
+import time
+from datetime import datetime
+
+from match_rules import parse_timestamp
+
+
+class EventClock:
+    """Đồng hồ theo thời gian của switch thay cho thời điểm đọc được dòng log
+
+    Mọi cửa sổ (recovery, timeout, chu kỳ) đều tính theo đồng hồ này nên đọc trực tiếp,
+    đọc bù log tồn đọng hay chạy lại log cũ đều cho cùng kết luận ở mọi tốc độ đọc.
+    Dòng UDP có thể đến không theo thứ tự: timeout chỉ được tính đến watermark,
+    tức thời điểm lớn nhất đã thấy trừ đi lateness giây.
+    Đồng hồ của các switch lệch nhau nên mỗi switch có thời điểm lớn nhất và watermark riêng:
+    switch chạy nhanh không làm tấn công trên switch khác kết thúc sớm.
+    """
+
+    def __init__(self, lateness=2.0, year=None, realtime=True, cache_size=4096):
+        self.lateness = lateness
+        self.year = year            # Năm của định dạng truyền thống (không ghi năm), None = tự suy ra
+        self.realtime = realtime    # Khi không có dòng mới, thời gian sự kiện vẫn trôi theo đồng hồ máy
+        self.cache_size = cache_size
+        self._cache = {}            # Tiền tố timestamp (đến giây) -> epoch
+        self.max_event = None       # Timestamp lớn nhất đã thấy của mọi switch
+        self._seen_at = None        # time.monotonic() lúc max_event được cập nhật
+        self._devices = {}          # Switch -> [timestamp lớn nhất của switch, time.monotonic() lúc cập nhật]
+        self.parsed = 0
+        self.cache_misses = 0
+        self.unparsed = 0
+        self.late = 0
+
+    def _parse_prefix(self, key, line):
+        ts = parse_timestamp(line, self.year)
+        if ts is not None and self.year is None and ts > time.time() + 86400:
+            # "Dec 31 23:59:59" đọc sau giao thừa thuộc năm trước
+            ts = parse_timestamp(line, datetime.now().year - 1)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[key] = ts
+        self.cache_misses += 1
+        return ts
+
+    def timestamp(self, line):
+        """Epoch trong header của dòng, None nếu không đọc được; chỉ parse lại khi tiền tố đổi"""
+        # Định dạng truyền thống "Mar  1 00:00:01": cả giây nằm trong 15 ký tự đầu
+        if len(line) > 16 and line[3] == " " and line[6] == " " and line[9] == ":":
+            key = line[:15]
+            ts = self._cache.get(key)
+            if ts is None:
+                ts = self._parse_prefix(key, line)
+            return ts
+        # RFC 3339 "2025-08-28T10:00:01.123+07:00": phần lẻ của giây cộng riêng, khóa cache là phần còn lại
+        sp = line.find(" ")
+        if sp < 19 or line[10] != "T":
+            return None
+        token = line[:sp]
+        frac = 0.0
+        rest = token[19:]
+        if rest[:1] == ".":
+            end = 1
+            while end < len(rest) and rest[end].isdigit():
+                end += 1
+            frac = float(rest[:end]) if end > 1 else 0.0
+            rest = rest[end:]
+        key = token[:19] + rest
+        ts = self._cache.get(key)
+        if ts is None:
+            ts = self._parse_prefix(key, key + " ")
+        return None if ts is None else ts + frac
+
+    def advance(self, ts, device=None):
+        """Đẩy đồng hồ (và đồng hồ của switch device nếu có) tới ts nếu ts mới hơn mọi thời điểm đã thấy"""
+        if self.max_event is None or ts > self.max_event:
+            self.max_event = ts
+            self._seen_at = time.monotonic()
+        if device is not None:
+            latest = self._devices.get(device)
+            if latest is None:
+                self._devices[device] = [ts, time.monotonic()]
+            elif ts > latest[0]:
+                latest[0] = ts
+                latest[1] = time.monotonic()
+
+    def observe(self, line, device=None):
+        """Thời điểm sự kiện của một dòng từ switch device; dòng không có timestamp dùng thời gian hiện tại của switch"""
+        ts = self.timestamp(line)
+        if ts is None:
+            self.unparsed += 1
+            return self.now(device)
+        self.parsed += 1
+        latest = self._devices.get(device) if device is not None else None
+        newest = self.max_event if latest is None else latest[0]
+        if newest is not None and ts < newest - self.lateness:
+            self.late += 1
+        self.advance(ts, device)
+        return ts
+
+    def now(self, device=None):
+        """Thời gian sự kiện hiện tại: timestamp lớn nhất đã thấy cộng thời gian đã trôi từ lúc đó
+
+        Có device thì tính theo timestamp lớn nhất của chính switch đó (nếu đã thấy dòng nào của nó).
+        """
+        latest = self._devices.get(device) if device is not None else None
+        if latest is None:
+            if self.max_event is None:
+                return time.time()
+            latest = (self.max_event, self._seen_at)
+        if not self.realtime:
+            return latest[0]
+        return latest[0] + (time.monotonic() - latest[1])
+
+    def watermark(self, device=None):
+        """Mốc thời gian đã chắc chắn nhận đủ dòng (của switch device), dùng để kết thúc các tấn công hết hạn"""
+        return self.now(device) - self.lateness
+
+    def lag(self):
+        """Độ trễ (giây) giữa đồng hồ máy và timestamp mới nhất đã đọc, None khi chưa có dòng nào"""
+        return None if self.max_event is None else time.time() - self.max_event
+
+    def stats(self):
+        return {"parsed": self.parsed, "cache_misses": self.cache_misses,
+                "unparsed": self.unparsed, "late": self.late}
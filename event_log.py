@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import queue
+import threading
+import time
+
+_STOP = object()
+_writers = []
+
+
+class BatchWriter:
+    """Thread nền ghi file theo lô: luồng gọi chỉ tốn một lần put vào hàng đợi"""
+
+    def __init__(self, path, format_fn, max_batch=1000):
+        self.path = path
+        self.format_fn = format_fn    # Chuyển một mục trong hàng đợi thành một dòng text
+        self.max_batch = max_batch
+        self.queue = queue.SimpleQueue()
+        self.written = 0
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        _writers.append(self)
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def _run(self):
+        get = self.queue.get
+        get_nowait = self.queue.get_nowait
+        while True:
+            batch = [get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            lines = []
+            for item in batch:
+                if item is _STOP:
+                    stop = True
+                    continue
+                try:
+                    lines.append(self.format_fn(item))
+                except Exception:
+                    pass
+            if lines:
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+                self.written += len(lines)
+            if stop:
+                self._file.close()
+                return
+
+    @property
+    def closed(self):
+        return not self._thread.is_alive()
+
+    def close(self, timeout=5):
+        if not self.closed:
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+
+
+class _QueueWriterHandler(logging.Handler):
+    """Đưa LogRecord vào BatchWriter, việc định dạng message diễn ra ở thread nền"""
+
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record):
+        self.writer.put(record)
+
+
+def setup_queue_logger(name, log_file):
+    """Logger ghi file qua hàng đợi, dùng chung định dạng với log cũ"""
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    # Bỏ handler có writer đã đóng (khi tạo lại monitor trong cùng tiến trình)
+    for h in [h for h in logger.handlers if isinstance(h, _QueueWriterHandler) and h.writer.closed]:
+        logger.removeHandler(h)
+    if not logger.handlers:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        logger.addHandler(_QueueWriterHandler(BatchWriter(log_file, formatter.format)))
+    return logger
+
+
+class EventLog:
+    """Luồng sự kiện JSONL cho máy đọc: mỗi sự kiện tấn công là một dòng JSON"""
+
+    FIELDS = ("event", "device", "interface", "rule", "attack_count", "persistent", "ts", "first_detected")
+
+    def __init__(self, path):
+        self.writer = BatchWriter(path, self._format)
+
+    def _format(self, item):
+        # Chỉ dựng dict và json.dumps trong thread nền
+        return json.dumps(dict(zip(self.FIELDS, item)), ensure_ascii=False)
+
+    def emit(self, event, device, interface, rule, attack_count, persistent, ts=None, first_detected=None):
+        """Ghi một sự kiện; ts và first_detected là thời gian sự kiện (epoch theo đồng hồ switch)
+
+        ts là None với sự kiện không gắn với dòng log nào (kết quả hỏi switch): dùng đồng hồ máy.
+        """
+        if ts is None:
+            ts = time.time()
+        self.writer.put((event, device, interface, rule, attack_count, persistent, ts, first_detected))
+
+
+def close_writers():
+    """Ghi nốt mọi hàng đợi log/sự kiện và đóng file"""
+    while _writers:
+        _writers.pop().close()
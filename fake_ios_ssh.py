@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# SSH server giả lập Cisco IOS để chạy thử pool Netmiko và các thao tác cấu hình
+import argparse
+import socket
+import threading
+import time
+import paramiko
+
+
+class FakeIOSDevice:
+    """Trạng thái dùng chung của switch giả lập: ghi lại mọi lệnh nhận được"""
+
+    def __init__(self, hostname="Switch", username="admin", password="cisco123", secret="cisco123",
+                 login_delay=0.0, show_outputs=None):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.secret = secret
+        self.login_delay = login_delay   # Giả lập thời gian bắt tay SSH chậm của IOS
+        self.show_outputs = show_outputs or {}
+        self.commands = []
+        self.sessions = 0
+        self.lock = threading.Lock()
+
+    def record(self, mode, command):
+        with self.lock:
+            self.commands.append((mode, command))
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, device):
+        self.device = device
+
+    def check_auth_password(self, username, password):
+        if username == self.device.username and password == self.device.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        return True
+
+
+class _IOSShell:
+    """Mô phỏng tối thiểu CLI của IOS: user/enable/config/config-if"""
+
+    def __init__(self, device, channel):
+        self.device = device
+        self.channel = channel
+        self.mode = "user"
+        self.awaiting_secret = False
+        self.last_cr = False
+
+    def prompt(self):
+        name = self.device.hostname
+        return {
+            "user": f"{name}>",
+            "enable": f"{name}#",
+            "config": f"{name}(config)#",
+            "config-if": f"{name}(config-if)#",
+        }[self.mode]
+
+    def send(self, text):
+        self.channel.sendall(text.replace("\n", "\r\n").encode())
+
+    def handle(self, line):
+        if self.awaiting_secret:
+            self.awaiting_secret = False
+            if line == self.device.secret:
+                self.mode = "enable"
+            else:
+                self.send("% Access denied\n")
+            self.send("\n" + self.prompt())
+            return
+
+        command = line.strip()
+        self.device.record(self.mode, command)
+        out = ""
+        if not command or command.startswith("terminal "):
+            pass
+        elif command == "enable":
+            if self.mode == "user":
+                self.send("Password: ")
+                self.awaiting_secret = True
+                return
+        elif command == "disable":
+            self.mode = "user"
+        elif command in ("configure terminal", "conf t") and self.mode == "enable":
+            out = "Enter configuration commands, one per line.  End with CNTL/Z.\n"
+            self.mode = "config"
+        elif command == "end" and self.mode.startswith("config"):
+            self.mode = "enable"
+        elif command == "exit":
+            if self.mode == "config-if":
+                self.mode = "config"
+            elif self.mode == "config":
+                self.mode = "enable"
+            else:
+                self.channel.close()
+                return
+        elif command.startswith("interface ") and self.mode.startswith("config"):
+            self.mode = "config-if"
+        elif command.startswith("show "):
+            out = self.device.show_outputs.get(command, "")
+            if callable(out):
+                out = out()
+            if out and not out.endswith("\n"):
+                out += "\n"
+        self.send("\n" + out + self.prompt())
+
+    def run(self):
+        self.send("\n" + self.prompt())
+        buf = ""
+        while not self.channel.closed:
+            data = self.channel.recv(4096)
+            if not data:
+                break
+            for ch in data.decode(errors="replace"):
+                if ch == "\x00":
+                    continue
+                if ch in "\r\n":
+                    # Coi "\r\n" là một lần xuống dòng
+                    if ch == "\n" and buf == "" and self.last_cr:
+                        self.last_cr = False
+                        continue
+                    self.last_cr = ch == "\r"
+                    line, buf = buf, ""
+                    if not self.awaiting_secret:
+                        self.send(line)  # IOS echo lại lệnh
+                    self.handle(line)
+                else:
+                    self.last_cr = False
+                    buf += ch
+
+
+class FakeIOSServer:
+    """SSH server cục bộ, mỗi kết nối là một phiên IOS giả lập"""
+
+    def __init__(self, device=None, bind="127.0.0.1", port=0):
+        self.device = device or FakeIOSDevice()
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((bind, port))
+        self.sock.listen(100)
+        self.address = self.sock.getsockname()
+        self._thread = None
+
+    def _serve_client(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        try:
+            transport.start_server(server=_ServerInterface(self.device))
+            channel = transport.accept(20)
+            if channel is None:
+                return
+            time.sleep(self.device.login_delay)
+            with self.device.lock:
+                self.device.sessions += 1
+            _IOSShell(self.device, channel).run()
+        except Exception:
+            pass
+        finally:
+            transport.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve_client, args=(client,), daemon=True).start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def switch_config(self):
+        """switch_config dạng Netmiko để kết nối tới server này"""
+        return {
+            "device_type": "cisco_ios",
+            "host": self.address[0],
+            "port": self.address[1],
+            "username": self.device.username,
+            "password": self.device.password,
+            "secret": self.device.secret,
+        }
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSH server giả lập Cisco IOS")
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--hostname", default="Switch")
+    parser.add_argument("--login-delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server = FakeIOSServer(FakeIOSDevice(args.hostname, login_delay=args.login_delay), args.bind, args.port).start()
+    print(f"[FAKE IOS] {args.hostname} dang lang nghe tai {server.address[0]}:{server.address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# Hỏi định kỳ bộ đếm port-security / DHCP snooping / STP và bảng MAC của cả dãy switch qua Netmiko
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from match_rules import SWITCH_WIDE, full_interface_name
+
+_PSECURE_ROW = re.compile(r"^\s*(\S+)\s+(\d+)\s+(\d+)\s+(\d+)\s+\S+", re.M)
+_DHCP_DROPPED = re.compile(r"Packets Dropped From untrusted ports\s*=\s*(\d+)")
+_STP_PORT = re.compile(r"^\s*Port \d+ \((\S+)\) of (\S+) is", re.M)
+_STP_BPDU = re.compile(r"BPDU: sent \d+, received (\d+)")
+
+
+def parse_port_security(output):
+    """show port-security -> {cổng (tên đầy đủ): số lần vi phạm}"""
+    return {full_interface_name(iface): int(violations)
+            for iface, _, _, violations in _PSECURE_ROW.findall(output)}
+
+
+def parse_dhcp_snooping_statistics(output):
+    """show ip dhcp snooping statistics -> {SWITCH_WIDE: số gói bị drop từ cổng untrusted}"""
+    m = _DHCP_DROPPED.search(output)
+    return {SWITCH_WIDE: int(m.group(1))} if m else {}
+
+
+def parse_spanning_tree_detail(output):
+    """show spanning-tree detail -> {cổng portfast: tổng số BPDU nhận được trên mọi VLAN}"""
+    counters = {}
+    starts = [(m.start(), m.group(1)) for m in _STP_PORT.finditer(output)]
+    for i, (pos, iface) in enumerate(starts):
+        block = output[pos:starts[i + 1][0] if i + 1 < len(starts) else len(output)]
+        # Chỉ cổng edge (portfast) mới không được phép nhận BPDU
+        if "portfast" not in block:
+            continue
+        m = _STP_BPDU.search(block)
+        if m:
+            counters[iface] = counters.get(iface, 0) + int(m.group(1))
+    return counters
+
+
+PARSERS = {
+    "show port-security": parse_port_security,
+    "show ip dhcp snooping statistics": parse_dhcp_snooping_statistics,
+    "show spanning-tree detail": parse_spanning_tree_detail,
+}
+# Lệnh có bộ đếm theo từng cổng, so được với số dòng syslog đã báo trên cổng đó
+PER_PORT = {"show port-security", "show spanning-tree detail"}
+
+
+class FleetPoller:
+    """Hỏi bộ đếm của mọi switch trong inventory song song và chỉ gửi phần tăng thêm cho detector
+
+    Việc hỏi chạy trên ThreadPoolExecutor giới hạn số luồng; kết quả được đưa vào hàng đợi
+    để luồng đọc log gọi detector (trạng thái cổng chỉ được sửa trên một luồng).
+    Detector trừ đi các vi phạm syslog đã báo nên bộ đếm chỉ bổ sung phần syslog bị mất;
+    bộ đếm của cả switch (SWITCH_WIDE) chỉ được ghi nhận riêng, không thành tấn công trên cổng nào.
+    """
+
+    def __init__(self, pool, detectors, hosts, interval=30.0, max_workers=64, timeout=20, logger=None):
+        self.pool = pool
+        self.interval = interval
+        self.timeout = timeout
+        self.logger = logger
+        # Lệnh show -> detector có poll_command tương ứng
+        self.commands = {d.poll_command: d for d in detectors if getattr(d, "poll_command", None) in PARSERS}
+        for cmd, detector in self.commands.items():
+            if cmd in PER_PORT:
+                # Bắt đầu đếm vi phạm syslog báo giữa hai lần hỏi
+                detector.poll_reported = {}
+        # Dùng chung tài khoản của switch_config mặc định, chỉ đổi host
+        base = next(iter(self.commands.values())) if self.commands else None
+        # Detector theo dõi bảng MAC (MACFloodMonitor) có thuộc tính mac_table
+        self.mac_detectors = [d for d in detectors if getattr(d, "mac_table", None) is not None]
+        base = base or (self.mac_detectors[0] if self.mac_detectors else None)
+        self.switch_configs = [base.switch_config_for(host) for host in hosts] if base else []
+        self.results = queue.SimpleQueue()  # (switch, hàm của detector, tham số) chờ luồng đọc log gọi
+
+        self._last = {}  # (host, lệnh, cổng) -> giá trị lần trước
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poller")
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.cycles = 0
+        self.polled = 0
+        self.failed = 0
+        self.last_cycle_seconds = 0.0
+        self.overruns = 0
+
+    def poll_switch(self, config):
+        """Chạy các lệnh show trên một switch trong cùng một phiên, đưa các bộ đếm tăng vào hàng đợi"""
+        host = config["host"]
+        with self.pool.session(config, timeout=self.timeout) as conn:
+            outputs = {cmd: conn.send_command(cmd) for cmd in self.commands}
+            mac_output = conn.send_command("show mac address-table") if self.mac_detectors else None
+        polled_at = time.monotonic()
+        for cmd, output in outputs.items():
+            detector = self.commands[cmd]
+            for iface, value in PARSERS[cmd](output).items():
+                key = (host, cmd, iface)
+                old = self._last.get(key)
+                self._last[key] = value
+                if old is None:
+                    continue  # Lần hỏi đầu tiên chỉ lấy mốc
+                # Bộ đếm bị clear thì giá trị mới chính là phần tăng
+                delta = value - old if value >= old else value
+                if delta <= 0:
+                    continue
+                line = f"[POLL] {host} {cmd}: {iface} +{delta} (= {value})"
+                if iface == SWITCH_WIDE:
+                    # Bộ đếm cả switch không so được với số dòng syslog của từng cổng
+                    self.results.put((host, detector.switch_counter, (host, delta, line)))
+                else:
+                    self.results.put((host, detector.poll_delta, (host, iface, delta, line)))
+        for detector in self.mac_detectors:
+            table = detector.mac_table
+            deltas = table.update(host, mac_output, polled_at)
+            for iface, learned, rate in table.crossed(host, deltas, detector.mac_learning_threshold):
+                self.results.put((host, detector.mac_learning_warning, (host, iface, learned, rate)))
+
+    def poll_once(self):
+        """Hỏi toàn bộ inventory một lượt, trả về thời gian đã dùng"""
+        start = time.monotonic()
+        futures = {self._executor.submit(self.poll_switch, config): config["host"]
+                   for config in self.switch_configs}
+        done, not_done = wait(futures, timeout=self.interval)
+        for future in done:
+            exc = future.exception()
+            if exc is None:
+                self.polled += 1
+            else:
+                self.failed += 1
+                if self.logger:
+                    self.logger.warning(f"Không hỏi được bộ đếm của {futures[future]}: {exc}")
+        elapsed = time.monotonic() - start
+        if not_done:
+            self.overruns += 1
+            if self.logger:
+                self.logger.warning(f"Hỏi bộ đếm chưa xong {len(not_done)}/{len(futures)} switch sau {elapsed:.1f}s")
+            wait(not_done)
+        self.cycles += 1
+        self.last_cycle_seconds = time.monotonic() - start
+        return self.last_cycle_seconds
+
+    def _run(self):
+        while not self._stop.is_set():
+            elapsed = self.poll_once()
+            self._stop.wait(max(self.interval - elapsed, 0))
+
+    def start(self):
+        if self._thread is None and self.switch_configs:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            if self.logger:
+                self.logger.info(f"Hỏi bộ đếm {len(self.switch_configs)} switch mỗi {self.interval:.0f}s: "
+                                 f"{', '.join(self.commands)}")
+
+    def drain(self, forward=None):
+        """Gọi trên luồng đọc log: chuyển các bộ đếm tăng vào trạng thái cổng của detector
+
+        forward(switch, hàm, tham số) thay cho việc gọi trực tiếp khi trạng thái cổng nằm ở tiến trình khác.
+        """
+        handled = 0
+        while True:
+            try:
+                host, fn, args = self.results.get_nowait()
+            except queue.Empty:
+                return handled
+            if forward:
+                forward(host, fn, args)
+            else:
+                fn(*args)
+            handled += 1
+
+    def stats(self):
+        return {"switches": len(self.switch_configs), "cycles": self.cycles, "polled": self.polled,
+                "failed": self.failed, "overruns": self.overruns,
+                "last_cycle_s": round(self.last_cycle_seconds, 2)}
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Đường đi chung của một dòng syslog: bảng luật -> đồng hồ sự kiện -> timeout -> StormGuard -> detector
+from match_rules import parse_host
+
+
+def ingest_line(line, host, rules, clock, detectors, guard, accept=None):
+    """Xử lý một dòng syslog; chế độ trực tiếp, tiến trình con và replay đều đi qua đây nên cho cùng kết luận
+
+    host là switch đã gửi dòng nếu nguồn log đã biết (tên file), None thì lấy từ header của dòng.
+    accept(host) trả về False để bỏ qua dòng tấn công của switch không thuộc phần việc này.
+    Trả về True nếu dòng được chuyển cho detector.
+    """
+    hit = rules.match(line)
+    if hit:
+        rule, m = hit
+        if host is None:
+            host = parse_host(line)
+        if accept is not None and not accept(host):
+            return False
+        rule.hits += 1
+        now = clock.observe(line, host)
+        # Kết thúc các tấn công của switch này đã hết hạn trước dòng này (theo đồng hồ của chính switch)
+        # để đọc bù nhanh cũng cho cùng kết luận
+        watermark = clock.watermark(host)
+        for detector in detectors:
+            detector.check_device_timeouts(host, watermark)
+        # IOS kết thúc câu bằng dấu chấm ngay sau tên cổng ("... port Ethernet0/3.")
+        guard.attack(rule.owner, m.group(1).rstrip(".,"), line, host, now)
+        return True
+    if not guard.last_attack:
+        return False
+    if "message repeated " not in line:
+        # Như LogTailer: dòng "last message repeated" chỉ được tính khi đi ngay sau dòng tấn công
+        guard.last_attack.clear()
+        return False
+    repeat = guard.repeat_of(line, parse_host(line) if host is None else host)
+    if not repeat:
+        return False
+    detector, device, interface, count = repeat
+    now = clock.observe(line, device)
+    watermark = clock.watermark(device)
+    for owner in detectors:
+        owner.check_device_timeouts(device, watermark)
+    guard.attack(detector, interface, line, device, now, count)
+    return True
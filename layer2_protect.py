@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Chạy cả 3 detector trong một tiến trình, chỉ đọc syslog một lần
+import argparse
+from monitor_core import Layer2Monitor
+from mac_flood_protect import MACFloodMonitor
+from dhcp_snooping_protect import DHCPSnoopingMonitor
+from stp_auto_recover import BPDUGuardMonitor
+
+def main():
+    parser = argparse.ArgumentParser(description="Theo dõi tấn công Layer 2 từ syslog của switch")
+    parser.add_argument("--log-file", metavar="PATH", default="/var/log/syslog-remote/syslog.log",
+                        help="File syslog của rsyslog, hoặc mẫu glob các file theo switch như \"/var/log/remote/*.log\"")
+    parser.add_argument("--listen", metavar="ADDR:PORT",
+                        help="Nhận syslog trực tiếp qua UDP/TCP thay vì đọc file của rsyslog")
+    parser.add_argument("--mirror", metavar="FILE",
+                        help="Ghi lại các dòng nhận được ra file (chỉ dùng với --listen)")
+    parser.add_argument("--remediate", choices=["dry-run", "apply"],
+                        help="Tự động xử lý cổng bị tấn công qua Netmiko")
+    parser.add_argument("--checkpoint", metavar="FILE", default="logs/checkpoint.jsonl",
+                        help="File lưu vị trí đọc và trạng thái cổng để tiếp tục sau khi khởi động lại (\"\" = tắt)")
+    parser.add_argument("--metrics", metavar="ADDR:PORT",
+                        help="Mở endpoint /metrics cho Prometheus, ví dụ 127.0.0.1:9108")
+    parser.add_argument("--periodicity", action="store_true",
+                        help="Phân tích chu kỳ recovery của mọi cổng bằng NumPy (bắt cả tấn công có thời gian dao động)")
+    parser.add_argument("--poll-inventory", metavar="FILE",
+                        help="File danh sách IP switch (mỗi dòng một IP) để hỏi bộ đếm định kỳ qua Netmiko")
+    parser.add_argument("--poll-interval", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Chia việc xử lý cho N tiến trình theo switch (0 = xử lý ngay trong tiến trình đọc log)")
+    args = parser.parse_args()
+
+    monitor = Layer2Monitor([
+        MACFloodMonitor(),
+        DHCPSnoopingMonitor(),
+        BPDUGuardMonitor(),
+    ], log_file_path=args.log_file)
+    if args.checkpoint:
+        monitor.enable_checkpoint(args.checkpoint)
+    if args.poll_inventory:
+        with open(args.poll_inventory, encoding="utf-8") as f:
+            hosts = [line.split("#")[0].strip() for line in f]
+        monitor.enable_polling([h for h in hosts if h], interval=args.poll_interval)
+    if args.metrics:
+        bind, _, port = args.metrics.rpartition(":")
+        monitor.enable_metrics(bind or "127.0.0.1", int(port))
+    if args.periodicity:
+        monitor.enable_periodicity()
+    if args.remediate:
+        monitor.enable_remediation(dry_run=args.remediate == "dry-run")
+    if args.workers > 0:
+        monitor.enable_sharding(args.workers)
+    if args.listen:
+        bind, _, port = args.listen.rpartition(":")
+        monitor.listen_syslog(bind or "0.0.0.0", int(port), mirror_path=args.mirror)
+    else:
+        monitor.monitor_logs()
+
+if __name__ == "__main__":
+    main()
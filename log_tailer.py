@@ -0,0 +1,589 @@
+# -*- coding: utf-8 -*-
+import fnmatch
+import os
+import select
+import struct
+import time
+
+# Các cờ inotify (xem inotify(7))
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")  # struct inotify_event: wd, mask, cookie, len, sau đó là tên file
+
+
+def _load_inotify():
+    """Trả về libc nếu hệ thống hỗ trợ inotify, ngược lại trả về None"""
+    # ctypes.util kéo theo subprocess/tempfile: chỉ nạp khi tailer bắt đầu chạy, không nạp lúc import module
+    import ctypes
+    import ctypes.util
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def _watch_directory(directory):
+    """fd inotify không chặn theo dõi một thư mục, None nếu không dùng được inotify"""
+    libc = _load_inotify()
+    if libc is None:
+        return None
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _read_events(fd):
+    """Đọc hết các sự kiện inotify đang chờ, trả về danh sách (mask, tên file)"""
+    events = []
+    while True:
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return events
+        if not data:
+            return events
+        pos = 0
+        while pos < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            events.append((mask, data[pos:pos + length].rstrip(b"\0").decode("utf-8", errors="replace")))
+            pos += length
+
+
+class _FileReader:
+    """Đọc các dòng hoàn chỉnh của một file log, giữ lại phần dòng chưa ghi xong giữa hai lần đọc"""
+
+    def __init__(self, path, logger=None, resume_from=None, needles=None, buffer=None, yield_idle=False,
+                 host=None, followers=None):
+        self.path = path
+        self.logger = logger
+        self.resume_from = resume_from      # (st_dev, st_ino, offset) từ checkpoint lần trước
+        self.yield_idle = yield_idle        # Sinh ra None sau mỗi khối để luồng đọc log làm việc định kỳ
+        # Có needles thì đọc theo khối và chỉ decode các dòng chứa một trong các chuỗi byte này
+        self.needles = list(needles) if needles else None
+        # Dòng chứa followers chỉ được decode khi dòng ngay trước nó được decode ("last message repeated")
+        self.followers = list(followers) if followers else []
+        # Host của các dòng trong file; None khi mọi switch ghi chung một file (lấy từ nội dung dòng)
+        self.host = host
+        self.lines_skipped = 0              # Số dòng bị bỏ qua mà không decode
+        self.more = False                   # Lần đọc trước dừng vì đã đủ max_bytes, file còn dữ liệu
+
+        self._file = None
+        self._partial = b""
+        self._unread = 0                    # Số byte trong bộ đệm sau dòng vừa sinh ra
+        self._buffer = buffer
+        self._prev_kept = False             # Dòng hoàn chỉnh cuối cùng của khối trước đã được decode
+
+    def _open(self, seek_end, path=None):
+        self._file = open(path or self.path, "rb")
+        if seek_end:
+            self._file.seek(0, 2)
+        self._partial = b""
+        self._unread = 0
+        self._prev_kept = False
+
+    def position(self):
+        """(st_dev, st_ino, offset) của dòng hoàn chỉnh cuối cùng đã đọc"""
+        if self._file is None:
+            return self.resume_from
+        st = os.fstat(self._file.fileno())
+        return st.st_dev, st.st_ino, self._file.tell() - len(self._partial) - self._unread
+
+    def lag_bytes(self):
+        """Kích thước file trừ vị trí đã đọc, None khi đang đọc nốt file đã bị rotate"""
+        position = self.position()
+        if not position:
+            return None
+        st = os.stat(self.path)
+        if (st.st_dev, st.st_ino) != tuple(position[:2]):
+            return None
+        return max(st.st_size - position[2], 0)
+
+    def _find_rotated(self, dev, ino):
+        """Tìm file đã bị rotate (syslog.log.1, ...) có inode trùng với checkpoint"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        base = os.path.basename(self.path)
+        for name in os.listdir(directory):
+            if name == base or not name.startswith(base):
+                continue
+            candidate = os.path.join(directory, name)
+            try:
+                st = os.stat(candidate)
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) == (dev, ino):
+                return candidate
+        return None
+
+    def _resume(self):
+        """Đọc tiếp từ vị trí đã lưu, kể cả phần còn lại của file đã bị rotate khi dịch vụ dừng"""
+        dev, ino, offset = self.resume_from
+        try:
+            st = os.stat(self.path)
+            same_file = (st.st_dev, st.st_ino) == (dev, ino)
+        except FileNotFoundError:
+            st, same_file = None, False
+
+        if not same_file:
+            old = self._find_rotated(dev, ino)
+            if old:
+                self._open(seek_end=False, path=old)
+                if os.fstat(self._file.fileno()).st_size >= offset:
+                    self._file.seek(offset)
+                if self.logger:
+                    self.logger.info(f"Đọc tiếp file đã rotate {old} từ byte {offset}")
+                yield from self._read_available()
+                if self._partial:
+                    yield self._partial.decode("utf-8", errors="replace")
+                self._file.close()
+                self._file = None
+            # File hiện tại được tạo sau checkpoint nên đọc từ đầu
+            self._open(seek_end=False)
+            return
+
+        self._open(seek_end=False)
+        if st.st_size >= offset:
+            self._file.seek(offset)
+            if self.logger:
+                self.logger.info(f"Đọc tiếp {self.path} từ byte {offset} ({st.st_size - offset} byte chưa xử lý)")
+
+    def _read_available(self, max_bytes=None):
+        """Đọc hết các dòng hoàn chỉnh hiện có (hoặc khoảng max_bytes), giữ lại phần dòng chưa ghi xong"""
+        self.more = False
+        if self.needles:
+            yield from self._read_chunks(max_bytes)
+            return
+        f = self._file
+        consumed = 0
+        while True:
+            if max_bytes is not None and consumed >= max_bytes:
+                self.more = True
+                return
+            chunk = f.readline()
+            if not chunk:
+                return
+            consumed += len(chunk)
+            if not chunk.endswith(b"\n"):
+                self._partial += chunk
+                return
+            if self._partial:
+                chunk = self._partial + chunk
+                self._partial = b""
+            yield chunk.decode("utf-8", errors="replace")
+
+    def _read_chunks(self, max_bytes=None):
+        """Đọc file theo khối vào bộ đệm dùng lại, tìm needles trên byte và chỉ decode các dòng chứa chúng
+
+        Phần lớn dòng syslog không khớp luật nào nên không bị decode hay sao chép;
+        sau mỗi khối sinh ra None (nếu yield_idle) để luồng đọc log làm việc định kỳ khi đọc bù.
+        """
+        f = self._file
+        buf = self._buffer
+        filled = len(self._partial)
+        buf[:filled] = self._partial
+        self._partial = b""
+        consumed = 0
+        while True:
+            if filled == len(buf):
+                # Một dòng dài hơn cả bộ đệm: nới bộ đệm
+                buf.extend(bytes(len(buf)))
+            with memoryview(buf) as view:
+                n = f.readinto(view[filled:])
+            if not n:
+                break
+            consumed += n
+            end = filled + n
+            last = buf.rfind(b"\n", 0, end) + 1
+            if not last:
+                filled = end
+                continue
+
+            starts = set()
+            for needle in self.needles:
+                i = buf.find(needle, 0, last)
+                while i != -1:
+                    start = buf.rfind(b"\n", 0, i) + 1
+                    starts.add(start)
+                    i = buf.find(needle, buf.find(b"\n", i, last) + 1, last)
+            if self.followers:
+                follow = []
+                for needle in self.followers:
+                    i = buf.find(needle, 0, last)
+                    while i != -1:
+                        follow.append(buf.rfind(b"\n", 0, i) + 1)
+                        i = buf.find(needle, buf.find(b"\n", i, last) + 1, last)
+                # Theo thứ tự trong file để cả chuỗi dòng tóm tắt liên tiếp được giữ lại
+                for start in sorted(follow):
+                    if start in starts:
+                        continue
+                    if (buf.rfind(b"\n", 0, start - 1) + 1 in starts) if start else self._prev_kept:
+                        starts.add(start)
+                self._prev_kept = buf.rfind(b"\n", 0, last - 1) + 1 in starts
+            self.lines_skipped += buf.count(b"\n", 0, last) - len(starts)
+            for start in sorted(starts):
+                stop = buf.find(b"\n", start, last) + 1
+                line = buf[start:stop].decode("utf-8", errors="replace")
+                self._unread = end - stop
+                yield line
+            self._unread = 0
+
+            # Dời phần dòng chưa ghi xong về đầu bộ đệm
+            filled = end - last
+            buf[:filled] = buf[last:end]
+            if max_bytes is not None and consumed >= max_bytes:
+                self.more = True
+                break
+            if self.yield_idle:
+                self._partial = bytes(buf[:filled])
+                yield None
+                filled = len(self._partial)
+                buf[:filled] = self._partial
+                self._partial = b""
+        self._partial = bytes(buf[:filled])
+
+    def _reopen(self):
+        """Đọc nốt phần còn lại của file cũ đã bị rotate rồi mở file mới từ đầu"""
+        yield from self._read_available()
+        if self._partial:
+            yield self._partial.decode("utf-8", errors="replace")
+        self._file.close()
+        self._open(seek_end=False)
+
+    def _is_rotated(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # File cũ đã bị đổi tên, file mới chưa được tạo: tiếp tục đọc file cũ
+            return False
+        cur = os.fstat(self._file.fileno())
+        return (st.st_ino, st.st_dev) != (cur.st_ino, cur.st_dev)
+
+    def _is_truncated(self):
+        return os.fstat(self._file.fileno()).st_size < self._file.tell()
+
+    def _follow_rotation(self):
+        """Sau khi đã đọc hết file: mở file mới nếu file bị rotate, đọc lại từ đầu nếu bị truncate
+
+        Sinh ra các dòng còn lại của file cũ; trả về True nếu đã mở lại hoặc quay về đầu file.
+        """
+        if self._is_rotated():
+            # Đọc nốt phần còn lại của file cũ rồi mở file mới từ đầu
+            yield from self._reopen()
+            if self.logger:
+                self.logger.info(f"File log đã được rotate, mở lại {self.path}")
+            return True
+        if self._is_truncated():
+            self._file.seek(0)
+            self._partial = b""
+            self._unread = 0
+            self._prev_kept = False
+            if self.logger:
+                self.logger.info(f"File log bị truncate, đọc lại từ đầu {self.path}")
+            return True
+        return False
+
+
+class _Follower:
+    """Phần chung của LogTailer và DirectoryTailer: chờ inotify (hoặc polling) trên thư mục và dừng từ thread khác"""
+
+    def __init__(self, poll_interval, idle_timeout, timeout_fn):
+        self.poll_interval = poll_interval  # Chỉ dùng khi không có inotify
+        self.idle_timeout = idle_timeout    # Thức dậy định kỳ để kiểm tra rotate
+        self.timeout_fn = timeout_fn        # Trả về số giây tối đa được ngủ (None = idle_timeout)
+        self.running = True
+
+        self._inotify_fd = None
+        self._stop_r, self._stop_w = os.pipe()
+        os.set_blocking(self._stop_w, False)
+
+    def stop(self):
+        """Dừng tailer, an toàn khi gọi từ signal handler"""
+        self.running = False
+        if self._stop_w is None:
+            return
+        try:
+            os.write(self._stop_w, b"x")
+        except OSError:
+            pass
+
+    def _watch(self, directory):
+        # Theo dõi cả thư mục để nhận được sự kiện rename/create khi logrotate
+        self._inotify_fd = _watch_directory(directory)
+        if self._inotify_fd is None and self.logger:
+            self.logger.warning("Không dùng được inotify, chuyển sang chế độ polling")
+
+    def _timeout(self):
+        timeout = self.idle_timeout
+        if self.timeout_fn:
+            wanted = self.timeout_fn()
+            if wanted is not None:
+                timeout = min(timeout, wanted)
+        return timeout
+
+    def _sleep(self, timeout):
+        """Ngủ tới khi có sự kiện inotify, stop() hoặc hết timeout; trả về True nếu có sự kiện inotify"""
+        if self._inotify_fd is None:
+            time.sleep(min(self.poll_interval, timeout))
+            return False
+        ready, _, _ = select.select([self._inotify_fd, self._stop_r], [], [], timeout)
+        return self._inotify_fd in ready
+
+    def _close_watch(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        if self._stop_w is not None:
+            os.close(self._stop_r)
+            os.close(self._stop_w)
+            self._stop_r = self._stop_w = None
+
+
+class LogTailer(_FileReader, _Follower):
+    """Theo dõi file log theo sự kiện inotify, tự mở lại khi file bị rotate hoặc truncate"""
+
+    def __init__(self, path, logger=None, from_start=False, poll_interval=0.1, idle_timeout=5.0,
+                 yield_idle=False, timeout_fn=None, resume_from=None, needles=None, chunk_size=1 << 20,
+                 followers=None):
+        _FileReader.__init__(self, path, logger=logger, resume_from=resume_from, needles=needles,
+                             buffer=bytearray(chunk_size) if needles else None, yield_idle=yield_idle,
+                             followers=followers)
+        _Follower.__init__(self, poll_interval, idle_timeout, timeout_fn)
+        self.from_start = from_start
+
+    def _wait(self):
+        if self._sleep(self._timeout()):
+            # Chỉ cần biết có thay đổi, bỏ qua nội dung sự kiện
+            try:
+                while os.read(self._inotify_fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def lines(self):
+        """Sinh ra từng dòng log mới, kể cả sau khi file bị rotate"""
+        self._watch(os.path.dirname(os.path.abspath(self.path)))
+        try:
+            if self.resume_from:
+                yield from self._resume()
+            else:
+                self._open(seek_end=not self.from_start)
+            while self.running:
+                yield from self._read_available()
+                if not self.running:
+                    break
+                if (yield from self._follow_rotation()):
+                    continue
+                self._wait()
+                if self.yield_idle:
+                    yield None
+        finally:
+            self.close()
+
+    def close(self):
+        if self._file:
+            # Giữ lại vị trí đã đọc để checkpoint cuối cùng vẫn có offset
+            self.resume_from = self.position()
+            self._file.close()
+            self._file = None
+        self._close_watch()
+
+
+class DirectoryTailer(_Follower):
+    """Theo dõi mọi file log khớp một mẫu glob (rsyslog ghi mỗi switch một file) trong một vòng lặp
+
+    Một watch inotify trên thư mục cho biết file nào vừa được ghi, tạo mới hay rotate,
+    nên lúc không có log mới vòng lặp chỉ ngủ trên select dù có hàng nghìn file.
+    Host của mỗi dòng lấy từ tên file (/var/log/remote/%HOSTNAME%.log) chứ không parse từ dòng.
+    """
+
+    def __init__(self, pattern, logger=None, from_start=False, poll_interval=1.0, idle_timeout=5.0,
+                 yield_idle=False, timeout_fn=None, resume_from=None, needles=None, chunk_size=1 << 20,
+                 followers=None):
+        super().__init__(poll_interval, idle_timeout, timeout_fn)
+        self.pattern = pattern
+        self.directory = os.path.dirname(os.path.abspath(pattern))
+        self.name_pattern = os.path.basename(pattern)
+        self.logger = logger
+        self.from_start = from_start
+        self.resume_from = resume_from      # {tên file: (st_dev, st_ino, offset)} từ checkpoint lần trước
+        self.yield_idle = yield_idle
+        self.needles = list(needles) if needles else None
+        self.followers = followers
+        self.chunk_size = chunk_size        # Mỗi lượt chỉ đọc chừng này byte của một file rồi chuyển sang file khác
+        self.host = None                    # Host của dòng vừa sinh ra
+        self.readers = {}                   # Tên file -> _FileReader
+
+        self._buffer = bytearray(chunk_size) if self.needles else None  # Dùng chung cho mọi file
+        self._ready = {}                    # Tên file có thể còn dữ liệu chưa đọc (dict giữ thứ tự)
+        self._skipped_closed = 0            # lines_skipped của các file đã đóng
+        self._next_scan = 0.0
+
+    @staticmethod
+    def host_of(name):
+        """Host của switch theo tên file: "192.168.104.6.log" -> "192.168.104.6\""""
+        return os.path.splitext(name)[0]
+
+    @property
+    def lines_skipped(self):
+        return self._skipped_closed + sum(r.lines_skipped for r in list(self.readers.values()))
+
+    def position(self):
+        """{tên file: (st_dev, st_ino, offset)} của dòng hoàn chỉnh cuối cùng đã đọc trong từng file"""
+        return {name: reader.position() for name, reader in list(self.readers.items())}
+
+    def lag_bytes(self):
+        """Tổng số byte chưa đọc của mọi file (chạy ở thread metrics)"""
+        total = 0
+        for reader in list(self.readers.values()):
+            try:
+                total += reader.lag_bytes() or 0
+            except (OSError, ValueError):
+                pass
+        return total
+
+    def _add(self, name, seek_end=False, resume_from=None):
+        """Tạo reader cho file của một switch, trả về None nếu không mở được"""
+        reader = _FileReader(os.path.join(self.directory, name), logger=self.logger, resume_from=resume_from,
+                             needles=self.needles, buffer=self._buffer, host=self.host_of(name),
+                             followers=self.followers)
+        if resume_from is None:
+            try:
+                reader._open(seek_end=seek_end)
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"Không mở được {reader.path}: {e}")
+                return None
+        self.readers[name] = reader
+        self._ready[name] = None
+        return reader
+
+    def _remove(self, name):
+        reader = self.readers.pop(name)
+        self._ready.pop(name, None)
+        self._skipped_closed += reader.lines_skipped
+        reader._file.close()
+        reader._file = None
+
+    def _scan(self):
+        """Mở các file mới xuất hiện (đọc từ đầu) và đánh dấu mọi file cần kiểm tra"""
+        # Kể cả file đã bị xóa khỏi thư mục để _read_round ngừng theo dõi nó
+        self._ready.update(dict.fromkeys(self.readers))
+        for name in sorted(os.listdir(self.directory)):
+            if name in self.readers or not fnmatch.fnmatchcase(name, self.name_pattern):
+                continue
+            if self._add(name) and self.logger:
+                self.logger.info(f"Theo dõi file log mới {name} (switch {self.host_of(name)})")
+
+    def _start(self):
+        """Mở mọi file hiện có; file có trong checkpoint được đọc tiếp từ vị trí đã lưu"""
+        resume = self.resume_from if isinstance(self.resume_from, dict) else {}
+        names = sorted(n for n in os.listdir(self.directory) if fnmatch.fnmatchcase(n, self.name_pattern))
+        for name in names:
+            if name in resume:
+                reader = self._add(name, resume_from=tuple(resume[name]))
+                self.host = reader.host
+                try:
+                    yield from reader._resume()
+                except OSError as e:
+                    if self.logger:
+                        self.logger.warning(f"Không đọc tiếp được {reader.path}: {e}")
+                    del self.readers[name]
+            else:
+                # Có checkpoint thì file chưa có trong đó được tạo lúc dịch vụ dừng: đọc từ đầu
+                self._add(name, seek_end=not (self.from_start or resume))
+        if self.logger:
+            self.logger.info(f"Theo dõi {len(self.readers)} file log khớp {self.pattern}")
+
+    def _raise_fd_limit(self):
+        """Mỗi switch giữ một file mở: nâng giới hạn số file mở (ulimit -n) lên mức tối đa được phép"""
+        try:
+            import resource
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if soft != hard:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ImportError, ValueError, OSError):
+            pass
+
+    def _read_available(self, reader):
+        """Đọc tối đa chunk_size byte của một file"""
+        return reader._read_available(self.chunk_size)
+
+    def _read_round(self):
+        """Đọc lần lượt từng file đang có dữ liệu để một switch gửi nhiều log không chặn các switch khác"""
+        for name in list(self._ready):
+            del self._ready[name]
+            reader = self.readers.get(name)
+            if reader is None:
+                continue
+            self.host = reader.host
+            yield from self._read_available(reader)
+            if reader.more:
+                self._ready[name] = None
+                continue
+            try:
+                if (yield from reader._follow_rotation()):
+                    self._ready[name] = None
+                elif os.fstat(reader._file.fileno()).st_nlink == 0:
+                    # File đã bị xóa và không có file mới cùng tên (switch không còn gửi log)
+                    self._remove(name)
+                    if self.logger:
+                        self.logger.info(f"File log đã bị xóa, ngừng theo dõi {reader.path}")
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"Lỗi đọc {reader.path}: {e}")
+                self._remove(name)
+
+    def _wait(self):
+        # Còn file chưa đọc hết: chỉ lấy các sự kiện đang chờ
+        if not self._sleep(0 if self._ready else self._timeout()):
+            if self._inotify_fd is None and time.monotonic() >= self._next_scan:
+                # Không có inotify: quét lại thư mục
+                self._next_scan = time.monotonic() + self.poll_interval
+                self._scan()
+            return
+        for mask, name in _read_events(self._inotify_fd):
+            if mask & IN_Q_OVERFLOW:
+                # Hàng đợi sự kiện bị tràn: không biết file nào đã thay đổi nên kiểm tra tất cả
+                self._scan()
+            elif name in self.readers:
+                self._ready[name] = None
+            elif mask & (IN_CREATE | IN_MOVED_TO | IN_MODIFY) and fnmatch.fnmatchcase(name, self.name_pattern):
+                if self._add(name) and self.logger:
+                    self.logger.info(f"Theo dõi file log mới {name} (switch {self.host_of(name)})")
+
+    def lines(self):
+        """Sinh ra từng dòng log mới của mọi file; self.host là host của dòng vừa sinh ra"""
+        self._watch(self.directory)
+        self._raise_fd_limit()
+        try:
+            yield from self._start()
+            while self.running:
+                yield from self._read_round()
+                if not self.running:
+                    break
+                self._wait()
+                if self.yield_idle:
+                    yield None
+        finally:
+            self.close()
+
+    def close(self):
+        for reader in self.readers.values():
+            if reader._file:
+                # Giữ lại vị trí đã đọc để checkpoint cuối cùng vẫn có offset
+                reader.resume_from = reader.position()
+                reader._file.close()
+                reader._file = None
+        self._close_watch()
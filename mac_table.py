@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# Theo dõi số MAC mới học được trên từng cổng giữa hai lần hỏi show mac address-table
+import re
+from collections import defaultdict
+
+from match_rules import full_interface_name
+
+# "   1    aabb.cc00.0100    DYNAMIC     Et0/1"
+_MAC_ROW = re.compile(r"^\s*(\d+)\s+([0-9a-fA-F]{4})\.([0-9a-fA-F]{4})\.([0-9a-fA-F]{4})\s+\S+\s+(\S+)\s*$", re.M)
+
+
+def parse_mac_table(output):
+    """show mac address-table -> {cổng (tên đầy đủ): frozenset các MAC}, mỗi MAC là số nguyên 12 bit VLAN + 48 bit MAC"""
+    table = defaultdict(list)
+    for vlan, a, b, c, port in _MAC_ROW.findall(output):
+        table[port].append((int(vlan) << 48) | int(a + b + c, 16))
+    # Tên cổng như trong syslog để cảnh báo sớm trùng với trạng thái cổng của detector
+    return {full_interface_name(port): frozenset(keys) for port, keys in table.items()}
+
+
+class MacTableTracker:
+    """Giữ bảng MAC lần trước của mỗi switch, trả về số MAC mới học được trên từng cổng
+
+    Mỗi MAC là một số nguyên thay vì chuỗi, mỗi cổng là một frozenset nên phép trừ
+    tập hợp chạy trong C và bảng 100k MAC chỉ tốn vài MB.
+    """
+
+    def __init__(self):
+        self._tables = {}  # host -> (thời điểm, {cổng: frozenset})
+        self._above = {}   # host -> các cổng đã vượt ngưỡng ở lần hỏi trước (đã cảnh báo)
+
+    def update(self, host, output, now):
+        """Cập nhật bảng của host, trả về [(cổng, số MAC mới, số MAC mới/phút)]"""
+        table = parse_mac_table(output)
+        previous = self._tables.get(host)
+        self._tables[host] = (now, table)
+        if previous is None:
+            return []  # Lần đầu chỉ lấy mốc
+        then, old = previous
+        minutes = max(now - then, 1e-6) / 60
+        deltas = []
+        empty = frozenset()
+        for port, macs in table.items():
+            learned = len(macs - old.get(port, empty))
+            if learned:
+                deltas.append((port, learned, learned / minutes))
+        return deltas
+
+    def crossed(self, host, deltas, threshold):
+        """Các (cổng, số MAC mới, số MAC mới/phút) vừa vượt ngưỡng, mỗi đợt học MAC chỉ cảnh báo một lần
+
+        Cổng vẫn trên ngưỡng ở các lần hỏi sau không được trả về nữa; khi tụt xuống dưới ngưỡng
+        thì đợt học MAC nhanh kế tiếp lại được cảnh báo.
+        """
+        above = {port for port, _, rate in deltas if rate >= threshold}
+        warned = self._above.get(host, set())
+        self._above[host] = above
+        return [d for d in deltas if d[0] in above and d[0] not in warned]
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import re
+from datetime import datetime
+
+_MONTHS = {name: i for i, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+
+# rsyslog gộp các bản tin giống hệt nhau: "last message repeated N times" (dòng trước được lặp lại)
+# hoặc "message repeated N times: [ bản tin gốc ]"
+REPEAT_NEEDLE = b"last message repeated "
+_REPEAT = re.compile(r"message repeated (\d+) times")
+
+# Bộ đếm không gắn với cổng nào (thống kê DHCP snooping của cả switch)
+SWITCH_WIDE = "*"
+# Tên cổng viết tắt trong bảng show -> tên đầy đủ như trong syslog ("Et0/1" -> "Ethernet0/1")
+_SHORT_IFACE = re.compile(r"^([A-Za-z]{2})(\d\S*)$")
+_IFACE_NAMES = {"Et": "Ethernet", "Fa": "FastEthernet", "Gi": "GigabitEthernet", "Te": "TenGigabitEthernet",
+                "Tw": "TwoGigabitEthernet", "Fo": "FortyGigabitEthernet", "Hu": "HundredGigE", "Po": "Port-channel"}
+
+
+def parse_host(line):
+    """Lấy host/IP của switch từ một dòng syslog do rsyslog ghi ra, None nếu không xác định được"""
+    # Định dạng truyền thống: "Mar  1 00:00:01 192.168.104.6 ..."
+    if len(line) > 16 and line[3] == " " and line[6] == " " and line[9] == ":":
+        end = line.find(" ", 16)
+        host = line[16:end] if end > 16 else None
+    else:
+        sp = line.find(" ")
+        if sp <= 0:
+            return None
+        host = line[:sp]
+        if "T" in host and ":" in host:
+            # Định dạng RFC 3339: "2025-08-28T10:00:01.123+07:00 192.168.104.6 ..."
+            end = line.find(" ", sp + 1)
+            host = line[sp + 1:end] if end > sp + 1 else None
+    # "<189>..." hoặc số thứ tự "123:" của IOS không phải là host
+    if not host or host.startswith("<") or host.endswith(":"):
+        return None
+    return host
+
+
+def full_interface_name(iface):
+    """Đổi tên cổng viết tắt sang tên đầy đủ để trùng với trạng thái cổng lấy từ syslog"""
+    m = _SHORT_IFACE.match(iface)
+    if m and m.group(1) in _IFACE_NAMES:
+        return _IFACE_NAMES[m.group(1)] + m.group(2)
+    return iface
+
+
+def parse_repeat(line):
+    """Số lần lặp N trong dòng tóm tắt của rsyslog, None nếu không phải dòng lặp lại"""
+    i = line.find("message repeated ")
+    if i == -1:
+        return None
+    m = _REPEAT.match(line, i)
+    return int(m.group(1)) if m else None
+
+
+def parse_timestamp(line, year=None):
+    """Thời điểm (epoch) ghi trong header của dòng syslog, None nếu không đọc được"""
+    # Định dạng truyền thống không có năm: dùng năm được truyền vào hoặc năm hiện tại
+    if len(line) > 16 and line[3] == " " and line[6] == " " and line[9] == ":":
+        month = _MONTHS.get(line[:3])
+        if month is None:
+            return None
+        try:
+            return datetime(year or datetime.now().year, month, int(line[4:6]),
+                            int(line[7:9]), int(line[10:12]), int(line[13:15])).timestamp()
+        except ValueError:
+            return None
+    sp = line.find(" ")
+    if sp > 0 and "T" in line[:sp]:
+        try:
+            return datetime.fromisoformat(line[:sp]).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+class MatchRule:
+    """Một luật phát hiện: tag/literal để lọc nhanh và regex để lấy tên cổng"""
+
+    __slots__ = ("name", "regex", "tags", "literal", "owner", "hits")
+
+    def __init__(self, name, pattern, tags=(), literal=None, owner=None):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.tags = tuple(tags)      # Dạng "FACILITY-SEVERITY-MNEMONIC" của Cisco IOS
+        self.literal = literal       # Dùng khi luật không có tag IOS
+        self.owner = owner           # Detector xử lý khi luật khớp
+        self.hits = 0                # Số dòng đã khớp, chỉ luồng đọc log cập nhật
+
+    def __repr__(self):
+        return f"MatchRule({self.name!r})"
+
+
+class RuleTable:
+    """Bảng luật đã biên dịch: lọc dòng bằng tag IOS trước, chỉ chạy regex khi cần"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.by_tag = {}
+        self.literal_rules = []
+        for rule in self.rules:
+            for tag in rule.tags:
+                self.by_tag.setdefault(tag, []).append(rule)
+            if not rule.tags:
+                if not rule.literal:
+                    raise ValueError(f"Luật {rule.name} cần tags hoặc literal để lọc")
+                self.literal_rules.append(rule)
+
+    def needles(self):
+        """Các chuỗi byte mà mọi dòng khớp luật đều chứa, để lọc dòng trước khi decode"""
+        # Chỉ lấy phần "-MNEMONIC:" của tag: các mức severity của cùng một bản tin gộp lại một needle
+        found = {b"-" + tag.rsplit("-", 1)[-1].encode() + b":" for tag in self.by_tag}
+        found.update(rule.literal.encode() for rule in self.literal_rules)
+        return sorted(found)
+
+    def match(self, line):
+        """Trả về (rule, match) của luật đầu tiên khớp, hoặc None"""
+        # Tag IOS nằm giữa '%' đầu tiên và dấu ':' ngay sau nó
+        start = line.find("%")
+        if start != -1:
+            end = line.find(":", start)
+            if end != -1:
+                rules = self.by_tag.get(line[start + 1:end])
+                if rules:
+                    for rule in rules:
+                        m = rule.regex.search(line, start)
+                        if m:
+                            return rule, m
+
+        for rule in self.literal_rules:
+            if rule.literal in line:
+                m = rule.regex.search(line)
+                if m:
+                    return rule, m
+        return None
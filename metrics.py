@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_metrics(families):
+    """Định dạng text của Prometheus; families: [(tên, kiểu, mô tả, [(labels, giá trị)])]"""
+    out = []
+    for name, kind, help_text, samples in families:
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            if labels:
+                label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                out.append(f"{name}{{{label_str}}} {value}")
+            else:
+                out.append(f"{name} {value}")
+    return "\n".join(out) + "\n"
+
+
+class MetricsServer:
+    """Endpoint /metrics cho Prometheus, chạy trong thread nền
+
+    collect() được gọi ở thread HTTP mỗi lần scrape và chỉ đọc các bộ đếm
+    do luồng đọc log cập nhật, nên luồng đọc log không phải khóa gì.
+    """
+
+    def __init__(self, collect, bind="127.0.0.1", port=9108, logger=None):
+        self.collect = collect
+        self.bind = bind
+        self.port = port
+        self.logger = logger
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                try:
+                    body = format_metrics(server.collect()).encode("utf-8")
+                except Exception as e:
+                    if server.logger:
+                        server.logger.error(f"Lỗi thu thập metrics: {e}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((self.bind, self.port), Handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        if self.logger:
+            self.logger.info(f"Metrics Prometheus tại http://{self.bind}:{self.port}/metrics")
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
@@ -0,0 +1,818 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import signal
+import os
+import glob
+from log_tailer import DirectoryTailer, LogTailer
+from match_rules import REPEAT_NEEDLE, SWITCH_WIDE, MatchRule, RuleTable
+from timeout_scheduler import DeadlineScheduler
+from port_state import DeviceShard, PortState, wall_clock
+from alert_dispatcher import AlertDispatcher
+from checkpoint import CheckpointStore
+from event_log import EventLog, setup_queue_logger, close_writers
+from event_clock import EventClock
+from storm_guard import StormGuard
+from ingest import ingest_line
+
+
+def clock_text(ts):
+    """Giờ của sự kiện (theo đồng hồ switch) để in ra terminal"""
+    return time.strftime('%H:%M:%S', time.localtime(ts))
+
+
+class AttackDetector:
+    """Bộ phát hiện tấn công dùng chung, mỗi detector giữ trạng thái cổng riêng theo từng switch"""
+
+    # Các lớp con khai báo mẫu log, tag IOS, tên hiển thị và tiền tố file log
+    pattern = None
+    tags = ()
+    attack_name = "ATTACK"
+    display_name = "Attack Monitor"
+    log_prefix = "attack_monitor"
+    log_dir = "logs"
+    # Thao tác trên cổng khi phát hiện tấn công đơn lẻ / liên tục (None = không làm gì)
+    single_action = None
+    persistent_action = "shutdown"
+    # Lệnh show để FleetPoller hỏi bộ đếm (None = detector không hỏi switch)
+    poll_command = None
+
+    def __init__(self):
+        self.setup_logging()
+
+        self.rule = MatchRule(self.log_prefix, self.pattern, tags=self.tags, owner=self)
+        # Trạng thái cổng được chia theo switch: device -> DeviceShard
+        self.shards = {}
+
+        self.timeout_threshold = 30
+        self.recovery_interval = 30  # Thời gian recovery của switch
+        self.persistent_threshold = 3  # Số lần tấn công để coi là persistent
+        self.recovery_window = 120  # Cửa sổ (giây) để đếm các lần tấn công liên tục
+        # Switch -> deadline hết hạn tấn công của các cổng, chỉ xử lý các cổng đến hạn; mỗi switch một
+        # hàng đợi vì deadline tính theo đồng hồ của switch đó
+        self.timeouts = {}
+        # Các (switch, cổng) đã thay đổi kể từ checkpoint gần nhất
+        self.dirty = set()
+
+        # Được Layer2Monitor gán để phát âm thanh cảnh báo, in ra terminal, xử lý cổng và ghi sự kiện JSONL
+        self.alert_callback = None
+        self.console = print
+        self.remediation = None
+        self.events = None
+        # Đồng hồ sự kiện dùng chung của Layer2Monitor (None = dùng đồng hồ máy)
+        self.clock = None
+        # Khi có FleetPoller: (switch, cổng) -> số vi phạm syslog đã báo từ lần hỏi bộ đếm trước
+        self.poll_reported = None
+        # Tổng phần tăng của bộ đếm cả switch (SWITCH_WIDE) theo từng switch, đơn vị theo lệnh show
+        self.switch_counters = {}
+
+    def setup_logging(self):
+        log_dir = Path(self.log_dir)
+        log_dir.mkdir(parents=True, exist_ok=True)
+        fn = f"{self.log_prefix}_{datetime.now().strftime('%Y%m%d')}.log"
+        log_file = log_dir / fn
+
+        # Mỗi detector ghi vào file log riêng, kể cả khi chạy chung một tiến trình
+        # Ghi file qua hàng đợi: luồng đọc log không phải chờ định dạng và ghi đĩa
+        self.logger = setup_queue_logger(self.log_prefix, log_file)
+
+        self.logger.info(f"Bắt đầu theo dõi {self.display_name}")
+
+    def play_alert(self):
+        if self.alert_callback:
+            self.alert_callback()
+
+    def shard(self, device):
+        """Trạng thái các cổng của một switch, tạo mới nếu chưa có"""
+        sh = self.shards.get(device)
+        if sh is None:
+            sh = self.shards[device] = DeviceShard(device)
+        return sh
+
+    def switch_config_for(self, device):
+        """switch_config của switch đã gửi log, dùng chung tài khoản với switch_config mặc định"""
+        if device is None or device == self.switch_config["host"]:
+            return self.switch_config
+        return {**self.switch_config, "host": device}
+
+    def current_time(self, device=None):
+        """Thời gian sự kiện hiện tại (epoch) theo đồng hồ của switch device"""
+        return self.clock.now(device) if self.clock else time.time()
+
+    def watermark(self, device=None):
+        """Mốc kết thúc các tấn công hết hạn của switch device"""
+        return self.clock.watermark(device) if self.clock else time.time()
+
+    def schedule_timeout(self, device, interface, deadline):
+        timeouts = self.timeouts.get(device)
+        if timeouts is None:
+            timeouts = self.timeouts[device] = DeadlineScheduler()
+        timeouts.schedule(interface, deadline)
+
+    def request_remediation(self, device, interface, persistent):
+        """Đưa thao tác xử lý cổng vào hàng đợi, các yêu cầu trùng sẽ được gộp"""
+        action = self.persistent_action if persistent else self.single_action
+        if self.remediation and action:
+            # Độ trễ xử lý cổng đo theo lúc đọc được dòng log (monotonic), không theo đồng hồ switch
+            self.remediation.submit(self.switch_config_for(device), interface, action,
+                                    priority=1 if persistent else 0, detected_at=time.monotonic())
+
+    def emit_event(self, event, device, interface, st, now):
+        """Ghi một sự kiện tấn công vào luồng JSONL (nếu được bật)"""
+        if self.events:
+            # Cùng đồng hồ sự kiện cho ts và first_detected, không trộn với đồng hồ máy
+            self.events.emit(event, device, interface, self.log_prefix,
+                             st.attack_count, st.is_persistent, now, st.first_detected)
+
+    def is_recovery_cycle_attack(self, interface, now=None, device=None):
+        """Kiểm tra xem có phải là tấn công liên tục qua recovery cycle không"""
+        st = self.shard(device).interface_state[interface]
+        if now is None:
+            now = self.current_time()
+
+        # Số lần tấn công trong cửa sổ và khoảng cách trung bình, tính tăng dần
+        count, avg_interval = st.window_stats(now, self.recovery_window)
+
+        if count >= self.persistent_threshold and avg_interval is not None:
+            # Nếu khoảng cách trung bình gần với recovery interval (±10s)
+            if 20 <= avg_interval <= 40:
+                return True
+
+        return False
+
+    def process_attack(self, interface, log_line, device=None, now=None, count=1):
+        # now là thời điểm switch ghi trong dòng log; None với các nguồn không có timestamp (hỏi bộ đếm)
+        # count > 1 khi dòng đại diện cho nhiều bản tin giống nhau (dòng tóm tắt lặp lại của rsyslog)
+        if now is None:
+            now = self.current_time(device)
+        st = self.shard(device).interface_state[interface]
+        st.record(now, count)
+        self.dirty.add((device, interface))
+        # Tên cổng kèm switch để phân biệt Et0/3 của các switch khác nhau
+        port = f"{interface} ({device})" if device else interface
+
+        # Kiểm tra tấn công liên tục
+        is_recovery_cycle = self.is_recovery_cycle_attack(interface, now, device)
+        self.schedule_timeout(device, interface, now + self.timeout_threshold)
+
+        if not st.is_attacking:
+            st.is_attacking = True
+            st.first_detected = now
+            st.recovery_cycle = is_recovery_cycle
+            clock = clock_text(now)
+
+            # Ghi log đầy đủ vào file (tham số kiểu %s, chỉ định dạng ở thread ghi log)
+            self.logger.warning("PHÁT HIỆN TẤN CÔNG %s TRÊN CỔNG %s", self.attack_name, port)
+            self.logger.info("Log: %s", log_line)
+
+            if is_recovery_cycle:
+                st.is_persistent = True
+                self.logger.warning("<<TẤN CÔNG LIÊN TỤC>> được phát hiện trên %s (Recovery cycle)", port)
+                self.console(f"\n[{clock}] [CANH BAO!!] TAN CONG LIEN TUC - Cong: {port} (Lan thu {st.attack_count})")
+                self.console(f"[{clock}] [THONG TIN] Cong bi err-disable, se tu dong recovery sau {self.recovery_interval} giay")
+                self.console(f"[{clock}] [CANH BAO] Day la tan cong lien tuc qua recovery cycle!")
+            else:
+                # Chỉ hiển thị thông tin cơ bản trên terminal
+                self.console(f"[{clock}] [CANH BAO] PHAT HIEN TAN CONG - Cong: {port} (Lan thu {st.attack_count})")
+                self.console(f"[{clock}] [THONG TIN] Day la tan cong don le.")
+                self.logger.info("%s - Phát hiện tấn công đơn lẻ lần thứ %d", port, st.attack_count)
+            self.emit_event("attack_start", device, interface, st, now)
+            self.play_alert()
+        else:
+            # Tấn công đang tiếp tục
+            if is_recovery_cycle and not st.is_persistent:
+                st.is_persistent = True
+                clock = clock_text(now)
+                self.logger.warning("Tấn công trên %s chuyển thành LIÊN TỤC", port)
+                self.emit_event("attack_persistent", device, interface, st, now)
+                self.console(f"[{clock}] [CANH BAO!] TAN CONG CHUYEN THANH LIEN TUC - Cong: {port}")
+                self.console(f"[{clock}] [THONG TIN] Cong se duoc khoi phuc tu dong sau {self.recovery_interval} giay")
+            elif st.is_persistent:
+                clock = clock_text(now)
+                self.console(f"[{clock}] [CANH BAO] TAN CONG LIEN TUC TIEP TUC - Cong: {port} (Lan thu {st.attack_count})")
+                self.console(f"[{clock}] [THONG TIN] Cong bi err-disable, dang cho recovery cycle...")
+
+        self.request_remediation(device, interface, st.is_persistent)
+
+    def absorb_repeats(self, device, interface, count, now):
+        """Được StormGuard gọi cho dòng trùng lặp trong cửa sổ gộp: chỉ cộng vào lần tấn công gần nhất"""
+        self.shard(device).interface_state[interface].absorb(count, now)
+        self.dirty.add((device, interface))
+
+    def note_reported(self, device, interface, count):
+        """Được StormGuard gọi cho mỗi dòng syslog khi có hỏi bộ đếm: đếm vi phạm đã báo đến lần hỏi kế tiếp"""
+        reported = self.poll_reported
+        key = (device, interface)
+        reported[key] = reported.get(key, 0) + count
+
+    def poll_delta(self, device, interface, delta, line):
+        """Được FleetPoller gọi (trên luồng đọc log) với phần tăng của bộ đếm kể từ lần hỏi trước
+
+        Các vi phạm syslog đã báo từ lần hỏi trước được trừ đi để không đếm hai lần. Phần còn lại
+        là dòng syslog bị mất: cổng đang bị tấn công thì chỉ cộng vào attack_count, không thêm thời
+        điểm hỏi vào ring buffer (sẽ làm sai việc nhận ra recovery cycle); chỉ khi syslog chưa báo
+        gì thì bộ đếm mới là một lần phát hiện tấn công tại thời điểm hỏi.
+        """
+        if interface == SWITCH_WIDE:
+            self.switch_counter(device, delta, line)
+            return
+        if self.poll_reported is None:
+            self.poll_reported = {}
+        remainder = delta - self.poll_reported.pop((device, interface), 0)
+        if remainder <= 0:
+            return
+        st = self.shard(device).interface_state.get(interface)
+        if st is not None and st.is_attacking:
+            self.absorb_repeats(device, interface, remainder, self.current_time(device))
+        else:
+            self.process_attack(interface, line, device, None, remainder)
+
+    def switch_counter(self, device, delta, line):
+        """Phần tăng của bộ đếm cả switch (vd. số gói DHCP bị drop)
+
+        Đơn vị là gói chứ không phải lần vi phạm và không chỉ ra cổng nào, nên không trừ đi các
+        dòng syslog, không tạo trạng thái cổng mà chỉ cộng vào switch_counters và ghi sự kiện.
+        """
+        self.switch_counters[device] = self.switch_counters.get(device, 0) + delta
+        clock = time.strftime('%H:%M:%S')
+        self.logger.warning("Bộ đếm của cả switch tăng: %s", line)
+        self.console(f"[{clock}] [THONG TIN] {self.attack_name}: bo dem cua switch {device} tang {delta}")
+        if self.events:
+            self.events.emit("switch_counter", device, SWITCH_WIDE, self.log_prefix, delta, False)
+
+    def mark_periodic(self, device, interface, score, now):
+        """Được PeriodicityAnalyzer gọi khi cổng đang bị tấn công có chu kỳ recovery rõ ràng"""
+        st = self.shard(device).interface_state[interface]
+        if st.is_persistent:
+            return
+        st.is_persistent = True
+        st.recovery_cycle = True
+        self.dirty.add((device, interface))
+        port = f"{interface} ({device})" if device else interface
+        clock = clock_text(now)
+        self.logger.warning("Tấn công trên %s có chu kỳ recovery (điểm %.2f), chuyển thành LIÊN TỤC", port, score)
+        self.emit_event("attack_persistent", device, interface, st, now)
+        self.console(f"[{clock}] [CANH BAO!] TAN CONG THEO CHU KY RECOVERY - Cong: {port} (Lan thu {st.attack_count})")
+        self.request_remediation(device, interface, True)
+
+    def check_timeout_attacks(self, now=None):
+        """Kết thúc các tấn công hết hạn của mọi switch đang bị tấn công
+
+        now=None thì mỗi switch được so với watermark theo đồng hồ của chính nó;
+        một số now (hết dữ liệu khi chạy lại log cũ) áp dụng cho mọi switch.
+        """
+        for device in list(self.timeouts):
+            self.check_device_timeouts(device, self.watermark(device) if now is None else now)
+
+    def check_device_timeouts(self, device, now):
+        """Kết thúc các tấn công trên switch device không còn dòng log nào trước mốc now (watermark của switch)"""
+        timeouts = self.timeouts.get(device)
+        if timeouts is None:
+            return
+        # Chỉ lấy các cổng đã đến hạn, không duyệt trạng thái của mọi cổng
+        for iface in timeouts.pop_due(now):
+            st = self.shards[device].interface_state[iface]
+            if not st.is_attacking:
+                continue
+            deadline = st.last_activity + self.timeout_threshold
+            if deadline > now:
+                # Cổng vẫn còn hoạt động sau lần lên lịch trước, đặt lại deadline
+                timeouts.schedule(iface, deadline)
+                continue
+
+            # Tấn công kết thúc tại deadline, không phụ thuộc vào lúc kiểm tra
+            dur = timedelta(seconds=deadline - st.first_detected)
+            clock = clock_text(deadline)
+            port = f"{iface} ({device})" if device else iface
+
+            if st.is_persistent:
+                # Ghi log vào file
+                self.logger.info("%s - Tấn công liên tục tạm dừng (timeout). Thời gian: %s", port, dur)
+
+                # Hiển thị trên terminal
+                self.console(f"\n[{clock}] [THONG TIN] Tan cong lien tuc tam dung - Cong: {port}")
+                self.console(f"[{clock}] [CANH BAO] Co the se tiep tuc khi cong duoc recovery tu dong!")
+            else:
+                # Ghi log vào file
+                self.logger.info("%s - Tấn công đã dừng (timeout). Thời gian: %s", port, dur)
+
+                # Hiển thị trên terminal
+                self.console(f"[{clock}] [THONG TIN] Tan cong da dung - Cong: {port}")
+
+            self.emit_event("attack_stopped", device, iface, st, deadline)
+            self.dirty.add((device, iface))
+            st.is_attacking = False
+            st.first_detected = None
+            # Không reset is_persistent để theo dõi pattern
+        if not timeouts:
+            del self.timeouts[device]
+
+    def export_state(self, changed_only=False):
+        """Bản ghi các cổng để lưu checkpoint: [[device, iface, bản ghi], ...]"""
+        if changed_only:
+            keys, self.dirty = self.dirty, set()
+        else:
+            self.dirty = set()
+            keys = [(device, iface) for device, shard in self.shards.items()
+                    for iface in shard.interface_state]
+        return [[device, iface, self.shards[device].interface_state[iface].snapshot()]
+                for device, iface in keys]
+
+    def restore_state(self, ports):
+        """Nạp lại trạng thái cổng từ checkpoint và lên lịch timeout cho các cổng đang bị tấn công"""
+        for (device, iface), rec in ports.items():
+            st = self.shard(device).interface_state[iface] = PortState.restore(rec)
+            if st.last_activity is not None and self.clock:
+                # Đồng hồ của switch bắt đầu từ dòng tấn công mới nhất đã lưu để timeout không hết ngay
+                # trước khi đọc bù
+                self.clock.advance(st.last_activity, device)
+            if st.is_attacking:
+                self.schedule_timeout(device, iface, st.last_activity + self.timeout_threshold)
+        if ports:
+            self.logger.info(f"Nạp lại trạng thái {len(ports)} cổng")
+
+    def seconds_until_timeout(self):
+        """Số giây sớm nhất tới lúc một cổng có thể hết hạn (theo watermark của switch đó), None nếu không có"""
+        delays = [timeouts.next_deadline() - self.watermark(device) for device, timeouts in self.timeouts.items()]
+        return max(min(delays), 0) if delays else None
+
+    def generate_summary_report(self):
+        self.logger.info(f"==== BÁO CÁO {self.attack_name} ====")
+        for device in sorted(self.shards, key=str):
+            shard = self.shards[device]
+            if device is not None:
+                self.logger.info(f"-- Switch: {device} --")
+            for iface, st in shard.interface_state.items():
+                if st.first_detected or st.is_attacking or st.attack_count > 0:
+                    status = "Đang bị tấn công" if st.is_attacking else "Đã dừng"
+                    attack_type = "Liên tục" if st.is_persistent else "Đơn lẻ"
+                    self.logger.info(f"Cổng: {iface} | Trạng thái: {status} | Loại: {attack_type} | Số lần: {st.attack_count} | Lần đầu: {wall_clock(st.first_detected)}")
+        self.logger.info("=" * 40)
+
+    def shutdown(self):
+        self.generate_summary_report()
+        self.logger.info(f"Đã dừng {self.display_name}")
+
+
+class Layer2Monitor:
+    """Đọc syslog một lần duy nhất và chuyển từng dòng cho các detector"""
+
+    def __init__(self, detectors, log_file_path="/var/log/syslog-remote/syslog.log"):
+        self.setup_logging()
+
+        self.log_file_path = log_file_path
+        self.receiver = None
+        self.pool = None
+        self.remediation = None
+        self.checkpoint = None
+        self.checkpoint_interval = None
+        self._next_checkpoint = None
+        self.metrics = None
+        self.periodicity = None
+        self._next_periodicity = None
+        self.poller = None
+        self._poll_pool = None
+        self.sharded = None
+        # Mọi cửa sổ thời gian tính theo timestamp switch ghi trong dòng log
+        self.clock = EventClock()
+        # Bộ đếm cho metrics: chỉ luồng đọc log ghi, thread HTTP chỉ đọc nên không cần khóa
+        self.lines_processed = 0
+        self.process_seconds = 0.0
+        self._last_scrape = (time.monotonic(), 0)
+        self.detectors = list(detectors)
+        self.rules = RuleTable(d.rule for d in self.detectors)
+        # Gộp các dòng tấn công trùng lặp trong bão syslog trước khi tới detector
+        self.guard = StormGuard()
+        # Đọc file theo khối, chỉ decode các dòng chứa tag IOS của một luật (và dòng "last message
+        # repeated" ngay sau chúng); mẫu glob (/var/log/remote/*.log) nghĩa là rsyslog ghi mỗi switch một file
+        tailer_class = DirectoryTailer if glob.has_magic(log_file_path) else LogTailer
+        self.tailer = tailer_class(log_file_path, logger=self.logger, yield_idle=True,
+                                   timeout_fn=self.seconds_until_timeout, needles=self.rules.needles(),
+                                   followers=[REPEAT_NEEDLE])
+        self.alert_sound_path = "/opt/alert.mp3"
+        self.running = True
+        self.sound_enabled = True
+
+        self._sound_ready = threading.Event()
+        self._sound_pending = False  # Có cảnh báo đến trong lúc mixer đang khởi tạo
+        self.init_sound_system()
+        # Một thread nền cho terminal và âm thanh, gộp cảnh báo trong cửa sổ 2 giây
+        self.alerts = AlertDispatcher(self.play_alert, window=2.0, logger=self.logger)
+        for detector in self.detectors:
+            detector.alert_callback = self.alerts.alert
+            detector.console = self.alerts.print
+            detector.events = self.events
+            detector.clock = self.clock
+        self.alerts.start()
+        # Đo thời gian từng giai đoạn (SIGUSR1) và lấy mẫu stack (SIGUSR2), tắt mặc định;
+        # module profiling chỉ được nạp ở lần bật đầu tiên
+        self.profiler = None
+        self.sampler = None
+        signal.signal(signal.SIGINT,  self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)
+        signal.signal(signal.SIGUSR1, self.profile_signal_handler)
+        signal.signal(signal.SIGUSR2, self.profile_signal_handler)
+
+    def enable_remediation(self, dry_run=True):
+        """Bật xử lý cổng tự động qua Netmiko (dry_run chỉ ghi log lệnh sẽ gửi)"""
+        # concurrent.futures chỉ được nạp khi bật xử lý cổng
+        from netmiko_pool import SwitchConnectionPool
+        from remediation import RemediationQueue
+        self.pool = SwitchConnectionPool(logger=self.logger)
+        self.remediation = RemediationQueue(self.pool, dry_run=dry_run, logger=self.logger)
+        for detector in self.detectors:
+            detector.remediation = self.remediation
+        if not dry_run:
+            self.pool.start()
+            self.pool.prewarm({d.switch_config["host"]: d.switch_config for d in self.detectors}.values())
+        self.remediation.start()
+
+    def enable_checkpoint(self, path="logs/checkpoint.jsonl", interval=5.0):
+        """Lưu định kỳ vị trí đọc và trạng thái cổng; nạp lại checkpoint cũ nếu có"""
+        self.checkpoint = CheckpointStore(path, logger=self.logger)
+        self.checkpoint_interval = interval
+        position, states = self.checkpoint.load()
+        for detector in self.detectors:
+            detector.restore_state(states.get(detector.log_prefix, {}))
+        if position and isinstance(position, dict) != isinstance(self.tailer, DirectoryTailer):
+            self.logger.warning("Vị trí đọc trong checkpoint thuộc nguồn log khác, bỏ qua")
+            position = None
+        if position:
+            # Đọc bù phần log ghi ra trong lúc dịch vụ dừng trước khi theo dõi trực tiếp
+            self.tailer.resume_from = position
+            if isinstance(position, dict):
+                self.logger.info(f"Tiếp tục từ checkpoint: {len(position)} file log")
+            else:
+                self.logger.info(f"Tiếp tục từ checkpoint: inode {position[1]}, byte {position[2]}")
+        # Gộp các dòng cũ thành một snapshot ngay khi khởi động
+        self.checkpoint.rewrite(position, {d.log_prefix: d.export_state() for d in self.detectors})
+        self._next_checkpoint = time.monotonic() + interval
+
+    def save_checkpoint(self, force=False):
+        """Ghi checkpoint nếu đã đến hạn; chỉ ghi các cổng thay đổi, định kỳ ghi lại toàn bộ"""
+        # Khi chia nhiều tiến trình, checkpoint được ghi lúc mọi tiến trình con gửi trạng thái về
+        if not self.checkpoint or self.sharded:
+            return
+        now = time.monotonic()
+        if not force and now < self._next_checkpoint:
+            return
+        self._next_checkpoint = now + self.checkpoint_interval
+        self.write_checkpoint(self.tailer.position() if self.receiver is None else None)
+
+    def write_checkpoint(self, position):
+        if not self.checkpoint:
+            return
+        try:
+            if self.checkpoint.needs_compaction():
+                self.checkpoint.rewrite(position, {d.log_prefix: d.export_state() for d in self.detectors})
+            else:
+                ports = {d.log_prefix: d.export_state(changed_only=True) for d in self.detectors}
+                self.checkpoint.append(position, {k: v for k, v in ports.items() if v})
+        except OSError as e:
+            self.logger.error(f"Lỗi ghi checkpoint: {e}")
+
+    def enable_periodicity(self, interval=10.0):
+        """Định kỳ chấm điểm chu kỳ recovery của mọi cổng đang bị tấn công (cần NumPy)"""
+        import periodicity
+        if periodicity.np is None:
+            self.logger.warning("Không có NumPy, bỏ qua phân tích chu kỳ recovery")
+            return
+        self.periodicity = periodicity.PeriodicityAnalyzer(self.detectors, interval=interval, logger=self.logger)
+        self._next_periodicity = time.monotonic() + interval
+
+    def analyze_periodicity(self):
+        if not self.periodicity:
+            return
+        now = time.monotonic()
+        if now < self._next_periodicity:
+            return
+        self._next_periodicity = now + self.periodicity.interval
+        flagged = self.periodicity.run(self.clock.now())
+        if flagged:
+            self.logger.info(f"Phân tích chu kỳ: {flagged} cổng tấn công liên tục ({self.periodicity.last_duration * 1000:.1f} ms)")
+
+    def enable_polling(self, hosts, interval=30.0, max_workers=64):
+        """Hỏi định kỳ bộ đếm của các switch trong inventory, bổ sung cho syslog bị mất"""
+        from fleet_poller import FleetPoller
+        from netmiko_pool import SwitchConnectionPool
+        pool = self.pool
+        if pool is None:
+            pool = self._poll_pool = SwitchConnectionPool(max_sessions=1, logger=self.logger)
+            pool.start()
+        self.poller = FleetPoller(pool, self.detectors, hosts, interval=interval,
+                                  max_workers=max_workers, logger=self.logger)
+        self.poller.start()
+
+    def enable_sharding(self, workers):
+        """Chia việc xử lý dòng cho nhiều tiến trình theo switch; gọi sau các enable_* khác
+
+        Tiến trình này chỉ đọc log, chia dòng và gửi cảnh báo; timeout, phân tích chu kỳ
+        và trạng thái cổng nằm ở tiến trình con, detector ở đây chỉ giữ bản sao để báo cáo.
+        """
+        from sharded_ingest import ShardedIngest
+        states = {d.log_prefix: d.export_state() for d in self.detectors}
+        for detector in self.detectors:
+            detector.timeouts = {}
+        interval = self.periodicity.interval if self.periodicity else None
+        self.periodicity = None
+        self.sharded = ShardedIngest(self, workers, states, periodicity_interval=interval,
+                                     sync_interval=self.checkpoint_interval or 5.0, logger=self.logger)
+        self.sharded.start()
+        self.process_line = self.dispatch_line
+
+    def enable_metrics(self, bind="127.0.0.1", port=9108):
+        """Mở endpoint /metrics dạng Prometheus trong thread nền"""
+        from metrics import MetricsServer
+        self.metrics = MetricsServer(self.collect_metrics, bind=bind, port=port, logger=self.logger)
+        self.metrics.start()
+
+    def collect_metrics(self):
+        """Đọc các bộ đếm và trạng thái cổng (chạy ở thread HTTP)"""
+        now = time.monotonic()
+        lines = self.lines_processed + self.tailer.lines_skipped
+        last_time, last_lines = self._last_scrape
+        self._last_scrape = (now, lines)
+        rate = (lines - last_lines) / (now - last_time) if now > last_time else 0.0
+
+        lag = None
+        if self.receiver is None:
+            try:
+                lag = self.tailer.lag_bytes()
+            except (OSError, ValueError):
+                pass
+
+        event_lag = self.clock.lag()
+        storm = self.storm_stats()
+        attacking, persistent, ports, counters = [], [], [], []
+        for detector in self.detectors:
+            n_attacking = n_persistent = 0
+            # list() chụp lại dict trong một bước, tránh lỗi khi luồng đọc log thêm cổng mới
+            for device, shard in list(detector.shards.items()):
+                for iface, st in list(shard.interface_state.items()):
+                    if st.is_attacking:
+                        n_attacking += 1
+                        ports.append(({"rule": detector.log_prefix, "device": device or "",
+                                       "interface": iface, "persistent": str(st.is_persistent).lower()},
+                                      st.attack_count))
+                    if st.is_persistent:
+                        n_persistent += 1
+            attacking.append(({"rule": detector.log_prefix}, n_attacking))
+            counters.extend(({"rule": detector.log_prefix, "device": device or ""}, total)
+                            for device, total in list(detector.switch_counters.items()))
+            persistent.append(({"rule": detector.log_prefix}, n_persistent))
+
+        return [
+            ("l2_lines_total", "counter", "Số dòng syslog đã đọc, kể cả dòng bị lọc bỏ trước khi decode", [({}, lines)]),
+            ("l2_lines_per_second", "gauge", "Số dòng/giây kể từ lần scrape trước", [({}, round(rate, 1))]),
+            ("l2_rule_matches_total", "counter", "Số dòng khớp theo luật",
+             [({"rule": r.name}, r.hits) for r in self.rules.rules]),
+            ("l2_tail_lag_bytes", "gauge", "Kích thước file log trừ vị trí đã đọc", [({}, lag)]),
+            ("l2_event_lag_seconds", "gauge", "Đồng hồ máy trừ timestamp mới nhất đã đọc",
+             [({}, None if event_lag is None else round(event_lag, 3))]),
+            ("l2_late_lines_total", "counter", "Số dòng đến sau watermark", [({}, self.clock.late)]),
+            ("l2_line_processing_seconds_sum", "counter", "Tổng thời gian xử lý các dòng",
+             [({}, round(self.process_seconds, 6))]),
+            ("l2_line_processing_seconds_count", "counter", "Số dòng đã đo thời gian xử lý",
+             [({}, self.lines_processed)]),
+            ("l2_attacking_ports", "gauge", "Số cổng đang bị tấn công", attacking),
+            ("l2_persistent_ports", "gauge", "Số cổng bị tấn công liên tục qua recovery cycle", persistent),
+            ("l2_port_attack_count", "gauge", "Số lần tấn công của các cổng đang bị tấn công", ports),
+            ("l2_switch_counter_total", "counter", "Tổng phần tăng của bộ đếm cả switch từ lúc khởi động "
+             "(gói DHCP bị drop từ cổng untrusted)", counters),
+            ("l2_alert_queue_depth", "gauge", "Số mục đang chờ in/phát âm thanh", [({}, self.alerts.depth())]),
+            ("l2_collapsed_lines_total", "counter", "Số dòng tấn công trùng lặp được gộp, không gọi detector",
+             [({}, storm.get("collapsed", 0))]),
+            ("l2_repeated_lines_total", "counter", "Tổng N của các dòng \"message repeated N times\" của rsyslog",
+             [({}, storm.get("repeated", 0))]),
+            ("l2_shed_lines_total", "counter", "Số dòng nhiễu bị bỏ khi socket UDP bị dồn", [({}, storm["shed"])]),
+        ]
+
+    def storm_stats(self):
+        """Số dòng tấn công đã gộp / dòng tóm tắt lặp lại của StormGuard và số dòng nhiễu đã bỏ"""
+        stats = self.sharded.guard_stats() if self.sharded else self.guard.stats()
+        return {**stats, "shed": self.receiver.shed if self.receiver else 0}
+
+    def setup_logging(self):
+        log_dir = Path("logs")
+        log_dir.mkdir(exist_ok=True)
+        fn = f"layer2_monitor_{datetime.now().strftime('%Y%m%d')}.log"
+        log_file = log_dir / fn
+
+        self.logger = setup_queue_logger("layer2_monitor", log_file)
+        # Luồng sự kiện tấn công dạng JSONL, dùng chung cho mọi detector
+        self.events = EventLog(log_dir / f"events_{datetime.now().strftime('%Y%m%d')}.jsonl")
+
+    def init_sound_system(self):
+        """Kiểm tra file âm thanh ngay, nạp pygame và khởi tạo mixer ở thread nền"""
+        if not Path(self.alert_sound_path).exists():
+            self.logger.warning(f"Không tìm thấy âm thanh: {self.alert_sound_path}")
+            self.sound_enabled = False
+            self._sound_ready.set()
+            return
+        # Không để việc nạp SDL mixer làm chậm lúc bắt đầu đọc log
+        threading.Thread(target=self._init_mixer, daemon=True).start()
+
+    def _init_mixer(self):
+        try:
+            # Ẩn pygame welcome message
+            os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+            import pygame
+
+            # Khởi tạo pygame mixer với các tham số cụ thể
+            pygame.mixer.pre_init(frequency=22050, size=-16, channels=2, buffer=512)
+            pygame.mixer.init()
+
+            # Nạp file âm thanh một lần, mỗi lần cảnh báo chỉ cần play()
+            pygame.mixer.music.load(self.alert_sound_path)
+            self.logger.info("Âm thanh cảnh báo đã sẵn sàng")
+        except Exception as e:
+            self.logger.warning(f"Không thể khởi tạo âm thanh: {e}. Chạy ở chế độ im lặng.")
+            self.sound_enabled = False
+        finally:
+            self._sound_ready.set()
+        # Phát bù cảnh báo đã đến trong lúc khởi tạo, play_alert không chờ mixer
+        if self._sound_pending and self.sound_enabled:
+            self._sound_pending = False
+            pygame.mixer.music.play()
+
+    def play_alert(self):
+        # Chạy ở thread của AlertDispatcher: không chờ mixer để không giữ lại các dòng terminal đang xếp hàng
+        if not self.sound_enabled:
+            return
+        # Đánh dấu trước khi kiểm tra: thread khởi tạo xong ngay lúc này vẫn thấy cảnh báo đang chờ
+        self._sound_pending = True
+        if not self._sound_ready.is_set():
+            return
+        self._sound_pending = False
+        import pygame
+        pygame.mixer.music.play()
+
+    def tail_log_file(self):
+        try:
+            for line in self.tailer.lines():
+                # None nghĩa là tailer thức dậy mà không có dòng mới
+                yield line.strip() if line is not None else None
+        except Exception as e:
+            self.logger.error(f"Lỗi đọc file log: {e}")
+
+    def process_line(self, line, host=None):
+        """Quét một dòng với toàn bộ bảng luật và chuyển cho detector tương ứng
+
+        host là switch đã gửi dòng nếu nguồn log đã biết (tên file), ngược lại lấy từ header của dòng.
+        """
+        start = time.perf_counter()
+        ingest_line(line, host, self.rules, self.clock, self.detectors, self.guard)
+        self.lines_processed += 1
+        self.process_seconds += time.perf_counter() - start
+
+    def dispatch_line(self, line, host=None):
+        """process_line khi chia nhiều tiến trình: chỉ đưa dòng vào lô của tiến trình giữ switch"""
+        self.sharded.submit(line, host)
+        self.lines_processed += 1
+
+    def check_timeout_attacks(self):
+        for detector in self.detectors:
+            detector.check_timeout_attacks()
+
+    def housekeeping(self):
+        """Các việc định kỳ chạy trên luồng đọc log giữa hai dòng, mỗi việc chỉ tốn một phép so sánh khi chưa đến hạn"""
+        self.check_timeout_attacks()
+        self.save_checkpoint()
+        self.analyze_periodicity()
+        if self.sharded:
+            self.sharded.housekeeping(self.tailer.position() if self.receiver is None else None)
+        if self.poller:
+            self.poller.drain(self.sharded.forward if self.sharded else None)
+
+    def timer_tick(self):
+        """Kết thúc các tấn công đã hết hạn, trả về số giây tới deadline kế tiếp"""
+        self.housekeeping()
+        delay = self.seconds_until_timeout()
+        if self.checkpoint:
+            until_checkpoint = max(self._next_checkpoint - time.monotonic(), 0)
+            delay = until_checkpoint if delay is None else min(delay, until_checkpoint)
+        if self.sharded:
+            until_flush = self.sharded.pending_delay()
+            if until_flush is not None:
+                delay = until_flush if delay is None else min(delay, until_flush)
+        return delay
+
+    def seconds_until_timeout(self):
+        delays = [d for d in (det.seconds_until_timeout() for det in self.detectors) if d is not None]
+        return min(delays) if delays else None
+
+    def print_banner(self, source):
+        names = ", ".join(d.display_name for d in self.detectors)
+        # Hiển thị trạng thái khởi động trên terminal
+        print(f"[KHOI DONG] Dang theo doi {names} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print(source)
+        print(f"[AM THANH] {'Bat' if self.sound_enabled else 'Tat'}")
+        for detector in self.detectors:
+            print(f"[RECOVERY] {detector.display_name} - Chu ky khoi phuc tu dong: {detector.recovery_interval} giay")
+        print("=" * 50)
+
+    def monitor_logs(self):
+        self.print_banner(f"[LOG FILE] {self.log_file_path}")
+
+        for line in self.tail_log_file():
+            # Xử lý xong dòng đã đọc rồi mới dừng để offset trong checkpoint không bỏ sót dòng
+            if line is not None:
+                self.process_line(line, self.tailer.host)
+            elif self.sharded:
+                # Tailer đã đọc hết dữ liệu hiện có: gửi các lô chưa đầy
+                self.sharded.flush()
+            if not self.running:
+                break
+            self.housekeeping()
+
+        self.cleanup()
+
+    def listen_syslog(self, bind="0.0.0.0", port=514, mirror_path=None):
+        """Nhận syslog trực tiếp từ switch thay vì đọc file của rsyslog"""
+        # asyncio chỉ cần khi nhận syslog qua mạng, không nạp khi đọc file
+        from syslog_receiver import SyslogReceiver
+        # Khi socket bị dồn chỉ giữ datagram chứa tag của một luật. Khi chia nhiều tiến trình, lô chưa
+        # đầy được gửi ngay sau mỗi lần đọc socket thay vì chờ timer
+        self.receiver = SyslogReceiver(self.process_line, bind=bind, port=port, mirror_path=mirror_path,
+                                       priority=self.rules.needles(),
+                                       on_batch=self.sharded.flush if self.sharded else None, logger=self.logger)
+        self.print_banner(f"[SYSLOG] {bind}:{port} UDP/TCP" + (f" -> {mirror_path}" if mirror_path else ""))
+        try:
+            self.receiver.run(on_tick=self.timer_tick)
+        except Exception as e:
+            self.logger.error(f"Lỗi nhận syslog: {e}")
+        self.cleanup()
+
+    def signal_handler(self, sig, frame):
+        self.logger.info(f"Nhận tín hiệu {sig}, dừng chương trình...")
+        self.alerts.print(f"\n[{datetime.now().strftime('%H:%M:%S')}] [DUNG] Dung chuong trinh...")
+        self.running = False
+        self.tailer.stop()
+        if self.receiver:
+            self.receiver.stop()
+
+    def profile_signal_handler(self, sig, frame):
+        """SIGUSR1 bật/tắt đo thời gian từng giai đoạn, SIGUSR2 bật/tắt lấy mẫu stack"""
+        clock = datetime.now().strftime('%H:%M:%S')
+        if self.profiler is None:
+            from profiling import SamplingProfiler, StageProfiler
+            self.profiler = StageProfiler(logger=self.logger)
+            self.sampler = SamplingProfiler(logger=self.logger)
+        if sig == signal.SIGUSR1:
+            if self.profiler.enabled:
+                path = self.profiler.stop()
+                self.alerts.print(f"[{clock}] [PROFILE] Da tat do thoi gian, ket qua: {path}")
+            else:
+                self.profiler.start(self)
+                self.alerts.print(f"[{clock}] [PROFILE] Bat do thoi gian tung giai doan (gui lai SIGUSR1 de tat)")
+        else:
+            if self.sampler.running:
+                path = self.sampler.stop()
+                self.alerts.print(f"[{clock}] [PROFILE] Da tat lay mau stack, ket qua: {path}")
+            else:
+                self.sampler.start()
+                self.alerts.print(f"[{clock}] [PROFILE] Bat lay mau stack (gui lai SIGUSR2 de tat)")
+
+    def cleanup(self):
+        # Ghi kết quả profile đang chạy dở
+        if self.profiler:
+            self.profiler.stop()
+            self.sampler.stop()
+        if self.metrics:
+            self.metrics.stop()
+        if self.poller:
+            self.poller.stop()
+            self.logger.info(f"Thống kê hỏi bộ đếm: {self.poller.stats()}")
+            if self._poll_pool:
+                self._poll_pool.close()
+        if self.sharded:
+            # Tiến trình con xử lý nốt các dòng đã gửi, cảnh báo của chúng vẫn cần alerts và remediation
+            self.sharded.stop()
+            self.logger.info(f"Thống kê chia tiến trình: {self.sharded.stats()}")
+            self.logger.info(f"Thống kê gộp dòng trùng lặp: {self.storm_stats()}")
+            self.sharded = None
+        else:
+            self.logger.info(f"Thống kê gộp dòng trùng lặp: {self.storm_stats()}")
+        self.alerts.stop()
+        self.logger.info(f"Thống kê cảnh báo: {self.alerts.stats()}")
+        if self.remediation:
+            self.remediation.stop()
+            self.logger.info(f"Thống kê xử lý cổng: {self.remediation.stats()}")
+            self.pool.close()
+        self.save_checkpoint(force=True)
+        self.logger.info(f"Thống kê timestamp: {self.clock.stats()}")
+        for detector in self.detectors:
+            detector.shutdown()
+        if self.sound_enabled and self._sound_ready.is_set():
+            try:
+                import pygame
+                pygame.mixer.quit()
+            except:
+                pass
+        names = ", ".join(d.display_name for d in self.detectors)
+        self.logger.info(f"Đã dừng {names}")
+        # Ghi nốt log và sự kiện còn trong hàng đợi trước khi thoát
+        close_writers()
+        print(f"[HOAN THANH] Da dung {names}")
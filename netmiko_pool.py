@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def _netmiko_connect(**config):
+    # Chỉ nạp netmiko (paramiko, cryptography) khi thật sự mở phiên SSH đầu tiên
+    from netmiko import ConnectHandler
+    return ConnectHandler(**config)
+
+
+class _DevicePool:
+    """Các phiên SSH của một switch"""
+
+    def __init__(self, config, max_sessions):
+        self.config = dict(config)
+        self.idle = deque()                        # (conn, thời điểm trả về pool)
+        self.slots = threading.BoundedSemaphore(max_sessions)
+        self.in_use = 0
+        self.failures = 0
+        self.retry_at = 0.0
+
+
+class SwitchConnectionPool:
+    """Pool phiên Netmiko dùng lại cho từng switch: kết nối lười, keepalive, kết nối lại có backoff"""
+
+    def __init__(self, max_sessions=2, keepalive_interval=30, max_idle=600,
+                 backoff_base=1.0, backoff_max=60.0, connect_fn=None, logger=None):
+        self.max_sessions = max_sessions            # Số phiên đồng thời tối đa cho mỗi switch
+        self.keepalive_interval = keepalive_interval
+        self.max_idle = max_idle                    # Đóng phiên rảnh lâu hơn số giây này
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_fn = connect_fn or _netmiko_connect
+        self.logger = logger
+
+        self._devices = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._keepalive_thread = None
+
+    def _device(self, switch_config):
+        host = switch_config["host"]
+        with self._lock:
+            dev = self._devices.get(host)
+            if dev is None:
+                dev = self._devices[host] = _DevicePool(switch_config, self.max_sessions)
+            return dev
+
+    def _connect(self, dev):
+        host = dev.config["host"]
+        now = time.monotonic()
+        if now < dev.retry_at:
+            raise ConnectionError(f"{host}: đang chờ kết nối lại sau {dev.retry_at - now:.1f}s")
+        try:
+            conn = self.connect_fn(**{"keepalive": self.keepalive_interval, **dev.config})
+            if dev.config.get("secret"):
+                conn.enable()
+        except Exception as e:
+            dev.failures += 1
+            delay = min(self.backoff_base * 2 ** (dev.failures - 1), self.backoff_max)
+            dev.retry_at = time.monotonic() + delay
+            if self.logger:
+                self.logger.warning(f"Không kết nối được {host} (lần {dev.failures}): {e}. Thử lại sau {delay:.0f}s")
+            raise ConnectionError(f"{host}: {e}") from e
+        dev.failures = 0
+        dev.retry_at = 0.0
+        if self.logger:
+            self.logger.info(f"Đã mở phiên SSH tới {host}")
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            return conn.is_alive()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.disconnect()
+        except Exception:
+            pass
+
+    def _checkout(self, dev):
+        while True:
+            with self._lock:
+                if not dev.idle:
+                    break
+                conn, _ = dev.idle.pop()
+            # Phiên trong pool luôn ở enable mode: phiên lỗi đã bị loại khi trả về
+            if self._is_healthy(conn):
+                return conn
+            self._close(conn)
+        return self._connect(dev)
+
+    @contextmanager
+    def session(self, switch_config, timeout=10):
+        """Mượn một phiên đã enable() của switch, trả lại pool khi xong"""
+        dev = self._device(switch_config)
+        if not dev.slots.acquire(timeout=timeout):
+            raise TimeoutError(f"{dev.config['host']}: hết phiên SSH rảnh sau {timeout}s")
+        conn = None
+        try:
+            conn = self._checkout(dev)
+            with self._lock:
+                dev.in_use += 1
+            try:
+                yield conn
+            except Exception:
+                # Không rõ trạng thái phiên sau lỗi, bỏ phiên này
+                self._close(conn)
+                conn = None
+                raise
+            finally:
+                with self._lock:
+                    dev.in_use -= 1
+                    if conn is not None:
+                        dev.idle.append((conn, time.monotonic()))
+        finally:
+            dev.slots.release()
+
+    def prewarm(self, switch_configs):
+        """Mở sẵn một phiên cho mỗi switch ở background"""
+        def warm(config):
+            try:
+                with self.session(config):
+                    pass
+            except Exception:
+                pass
+        for config in switch_configs:
+            threading.Thread(target=warm, args=(config,), daemon=True).start()
+
+    def start(self):
+        """Chạy thread kiểm tra sức khỏe và keepalive cho các phiên rảnh"""
+        if self._keepalive_thread is None:
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval):
+            with self._lock:
+                devices = list(self._devices.values())
+            for dev in devices:
+                self._check_idle(dev)
+
+    def _check_idle(self, dev):
+        # Giữ một slot khi kiểm tra để tổng số phiên không vượt quá max_sessions
+        for _ in range(self.max_sessions):
+            if not dev.slots.acquire(blocking=False):
+                return
+            try:
+                with self._lock:
+                    if not dev.idle:
+                        return
+                    conn, since = dev.idle.popleft()
+                if time.monotonic() - since > self.max_idle or not self._is_healthy(conn):
+                    self._close(conn)
+                    continue
+                with self._lock:
+                    dev.idle.append((conn, since))
+            finally:
+                dev.slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                host: {"idle": len(dev.idle), "in_use": dev.in_use, "failures": dev.failures}
+                for host, dev in self._devices.items()
+            }
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            sessions = [conn for dev in self._devices.values() for conn, _ in dev.idle]
+            for dev in self._devices.values():
+                dev.idle.clear()
+        for conn in sessions:
+            self._close(conn)
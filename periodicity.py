@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Chấm điểm tính chu kỳ recovery của mọi cổng cùng lúc bằng NumPy
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from port_state import PortState, pack_times
+
+
+def times_matrix(states):
+    """Ma trận N x HISTORY các thời điểm tấn công theo thứ tự thời gian, NaN ở các ô chưa dùng"""
+    size = PortState.HISTORY
+    raw, totals = pack_times(states)
+    ring = np.frombuffer(raw, dtype=np.float64).reshape(len(states), size)
+    totals = np.asarray(totals, dtype=np.int64)
+    # Ring buffer đã đầy thì phần tử cũ nhất nằm ở vị trí _total % HISTORY
+    start = np.where(totals >= size, totals % size, 0)
+    cols = np.arange(size)
+    times = np.take_along_axis(ring, (start[:, None] + cols) % size, axis=1)
+    times[cols[None, :] >= np.minimum(totals, size)[:, None]] = np.nan
+    return times
+
+
+def score_periodicity(times, now, period, window, tolerance=0.25, min_gap=0.25, max_skip=3):
+    """Điểm chu kỳ của từng cổng: tỉ lệ khoảng cách giữa các đợt tấn công gần bội số của period
+
+    Các lần tấn công cách nhau dưới min_gap * period được coi là cùng một đợt (burst).
+    Cho phép lệch ±tolerance * period và bỏ lỡ tối đa max_skip - 1 chu kỳ liên tiếp,
+    nên bắt được cả kẻ tấn công có thời gian dao động. Trả về (điểm 0..1, số khoảng hợp lệ).
+    """
+    times = np.where(times >= now - window, times, np.nan)
+    with np.errstate(invalid="ignore"):
+        d = np.diff(times, axis=1)
+        gaps = d > min_gap * period          # NaN so sánh luôn False
+        k = np.clip(np.rint(d / period), 1, None)
+        hits = gaps & (np.abs(d - k * period) <= tolerance * period) & (k <= max_skip)
+    cycles = gaps.sum(axis=1)
+    score = hits.sum(axis=1) / np.maximum(cycles, 1)
+    return score, cycles
+
+
+class PeriodicityAnalyzer:
+    """Định kỳ chấm điểm các cổng đang bị tấn công, báo detector những cổng có chu kỳ recovery"""
+
+    def __init__(self, detectors, interval=10.0, min_score=0.75, min_cycles=2, logger=None):
+        self.detectors = list(detectors)
+        self.interval = interval
+        self.min_score = min_score
+        self.min_cycles = min_cycles   # Số khoảng giữa các đợt tấn công tối thiểu (3 đợt = 2 khoảng)
+        self.logger = logger
+        self.runs = 0
+        self.last_duration = 0.0
+
+    def run(self, now):
+        """Chấm điểm một lượt, trả về số cổng mới được xác định là tấn công liên tục"""
+        started = time.perf_counter()
+        flagged = 0
+        for detector in self.detectors:
+            keys, states = [], []
+            for device, shard in detector.shards.items():
+                for iface, st in shard.interface_state.items():
+                    if st.is_attacking and not st.is_persistent and st.attack_count > self.min_cycles:
+                        keys.append((device, iface))
+                        states.append(st)
+            if not states:
+                continue
+            window = max(detector.recovery_window, detector.recovery_interval * (PortState.HISTORY - 1))
+            score, cycles = score_periodicity(times_matrix(states), now, detector.recovery_interval, window)
+            for i in np.flatnonzero((cycles >= self.min_cycles) & (score >= self.min_score)):
+                device, iface = keys[i]
+                detector.mark_periodic(device, iface, float(score[i]), now)
+                flagged += 1
+        self.runs += 1
+        self.last_duration = time.perf_counter() - started
+        return flagged
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from array import array
+from collections import defaultdict
+from datetime import datetime
+
+
+def wall_clock(ts):
+    """Đổi thời điểm sự kiện (epoch theo đồng hồ switch) sang datetime để hiển thị"""
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts)
+
+
+class PortState:
+    """Trạng thái tấn công của một cổng, lưu thời điểm tấn công trong ring buffer cố định"""
+
+    HISTORY = 10  # Số thời điểm tấn công gần nhất được giữ lại
+
+    __slots__ = ("is_attacking", "first_detected", "last_activity", "attack_count",
+                 "is_persistent", "recovery_cycle", "_times", "_total", "_window_start")
+
+    def __init__(self):
+        self.is_attacking = False
+        self.first_detected = None
+        self.last_activity = None
+        self.attack_count = 0
+        self.is_persistent = False
+        self.recovery_cycle = False
+        self._times = array("d", bytes(8 * self.HISTORY))
+        self._total = 0         # Tổng số thời điểm đã ghi vào ring buffer
+        self._window_start = 0  # Chỉ số (tuyệt đối) của thời điểm cũ nhất còn trong cửa sổ
+
+    def record(self, now, count=1):
+        """Ghi nhận một lần tấn công (count dòng) tại thời điểm now - O(1), O(HISTORY) khi dòng đến trễ"""
+        self.attack_count += count
+        if self.last_activity is None or now >= self.last_activity:
+            self.last_activity = now
+            self._times[self._total % self.HISTORY] = now
+            self._total += 1
+            return
+        # Dòng UDP đến không theo thứ tự: sắp xếp lại để ring buffer vẫn tăng dần
+        times = sorted(self.timestamps() + [now])[-self.HISTORY:]
+        self._total += 1
+        first = self._total - len(times)
+        for i, t in enumerate(times, first):
+            self._times[i % self.HISTORY] = t
+        self._window_start = first
+
+    def absorb(self, count, now):
+        """Cộng count dòng trùng lặp vào lần tấn công gần nhất, không thêm thời điểm vào ring buffer"""
+        self.attack_count += count
+        if self.last_activity is None or now > self.last_activity:
+            self.last_activity = now
+
+    def window_stats(self, now, window):
+        """Trả về (số lần tấn công trong cửa sổ, khoảng cách trung bình giữa chúng)
+
+        Thời điểm chỉ tăng nên con trỏ đầu cửa sổ chỉ tiến về phía trước,
+        chi phí trung bình O(1) cho mỗi lần gọi.
+        """
+        times = self._times
+        size = self.HISTORY
+        start = max(self._window_start, self._total - size)
+        limit = now - window
+        while start < self._total and times[start % size] < limit:
+            start += 1
+        self._window_start = start
+
+        count = self._total - start
+        if count < 2:
+            return count, None
+        newest = times[(self._total - 1) % size]
+        oldest = times[start % size]
+        return count, (newest - oldest) / (count - 1)
+
+    def timestamps(self):
+        """Các thời điểm tấn công còn lưu, cũ nhất trước"""
+        first = max(0, self._total - self.HISTORY)
+        return [self._times[i % self.HISTORY] for i in range(first, self._total)]
+
+    def snapshot(self):
+        """Bản ghi gọn để lưu checkpoint, thời gian đã là epoch theo đồng hồ switch"""
+        return [self.attack_count, self.is_attacking, self.is_persistent, self.recovery_cycle,
+                self.first_detected, self.last_activity, self.timestamps()]
+
+    @classmethod
+    def restore(cls, rec):
+        """Dựng lại trạng thái từ bản ghi của snapshot()"""
+        st = cls()
+        (st.attack_count, st.is_attacking, st.is_persistent, st.recovery_cycle,
+         st.first_detected, st.last_activity, times) = rec
+        times = times[-cls.HISTORY:]
+        for i, t in enumerate(times):
+            st._times[i] = t
+        st._total = len(times)
+        return st
+
+
+def pack_times(states):
+    """Gộp ring buffer của nhiều cổng thành (bytes float64 N x HISTORY, danh sách _total)"""
+    return b"".join([st._times.tobytes() for st in states]), [st._total for st in states]
+
+
+class DeviceShard:
+    """Trạng thái các cổng của một switch"""
+
+    __slots__ = ("device", "interface_state")
+
+    def __init__(self, device):
+        self.device = device
+        self.interface_state = defaultdict(PortState)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import bisect
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+# Biên trên (giây) của các bucket histogram, bucket cuối là +Inf
+BUCKETS = (1e-6, 2e-6, 5e-6, 1e-5, 2e-5, 5e-5, 1e-4, 2e-4, 5e-4, 1e-3, 2e-3, 5e-3, 1e-2, 0.1, 1.0)
+
+
+class StageHistogram:
+    __slots__ = ("counts", "total", "n", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.n = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.n += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Ước lượng phân vị bằng biên trên của bucket"""
+        target = q * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return None
+
+
+class StageProfiler:
+    """Đo thời gian từng giai đoạn xử lý một dòng, tắt mặc định
+
+    Khi bật, các phương thức được thay bằng bản có đo thời gian trên chính instance;
+    khi tắt, bản gốc được trả lại nên đường xử lý không tốn thêm chi phí nào.
+    """
+
+    def __init__(self, log_dir="logs", logger=None):
+        self.log_dir = Path(log_dir)
+        self.logger = logger
+        self.enabled = False
+        self.stages = {}
+        self._patches = []
+        self._started = None
+        self._sharded = False
+
+    def _timed(self, fn, stage):
+        hist = self.stages.setdefault(stage, StageHistogram())
+        perf = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perf()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.add(perf() - start)
+        return wrapper
+
+    def _timed_iter(self, fn, stage):
+        """Đo thời gian mỗi lần lấy phần tử của generator (đọc + decode một dòng)"""
+        hist = self.stages.setdefault(stage, StageHistogram())
+        perf = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            it = fn(*args, **kwargs)
+            while True:
+                start = perf()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+                hist.add(perf() - start)
+                yield item
+        return wrapper
+
+    def patch(self, obj, attr, stage, iterator=False):
+        had_own = attr in getattr(obj, "__dict__", {})
+        original = getattr(obj, attr)
+        wrap = self._timed_iter if iterator else self._timed
+        setattr(obj, attr, wrap(original, stage))
+        self._patches.append((obj, attr, had_own, original))
+
+    def start(self, monitor):
+        """Gắn các điểm đo vào monitor: đọc file, so khớp, đồng hồ sự kiện, timeout, xử lý tấn công, log, terminal
+
+        Chỉ đo được luồng đọc log của tiến trình chính; tiến trình con khi chia shard không được đo.
+        """
+        if self.enabled:
+            return
+        self.stages = {}
+        self._sharded = monitor.sharded is not None
+        self.patch(monitor.tailer, "_read_available", "read", iterator=True)
+        self.patch(monitor.rules, "match", "match")
+        self.patch(monitor.clock, "observe", "clock")
+        for detector in monitor.detectors:
+            # ingest_line kiểm tra timeout của switch trước mỗi dòng tấn công, không qua monitor;
+            # lần quét định kỳ của monitor cũng đi qua check_device_timeouts cho từng switch
+            self.patch(detector, "check_device_timeouts", "check_timeouts")
+            self.patch(detector, "process_attack", "process_attack")
+            self.patch(detector, "console", "console")
+            for level in ("info", "warning", "error"):
+                self.patch(detector.logger, level, "logging")
+        self.enabled = True
+        self._started = time.monotonic()
+
+    def stop(self):
+        """Gỡ các điểm đo và ghi histogram ra file, trả về đường dẫn file"""
+        if not self.enabled:
+            return None
+        while self._patches:
+            obj, attr, had_own, original = self._patches.pop()
+            if had_own:
+                setattr(obj, attr, original)
+            else:
+                delattr(obj, attr)
+        self.enabled = False
+        return self.dump()
+
+    def dump(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        path = self.log_dir / f"profile_stages_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        elapsed = time.monotonic() - self._started
+        us = lambda v: "-" if v is None else f"{v * 1e6:,.1f}"
+        out = [f"# Thời gian đo: {elapsed:.1f}s (process_attack và check_timeouts đã gồm logging và console)"]
+        if self._sharded:
+            out.append("# Đang chia shard: chỉ đo tiến trình chính, các dòng xử lý ở tiến trình con không có trong bảng")
+        out.append(f"{'stage':<16}{'count':>12}{'total_s':>10}{'%':>7}{'mean_us':>10}{'p50_us':>10}{'p99_us':>10}{'max_us':>12}")
+        for stage, h in sorted(self.stages.items(), key=lambda kv: -kv[1].total):
+            mean = h.total / h.n if h.n else None
+            out.append(f"{stage:<16}{h.n:>12,}{h.total:>10.3f}{h.total / elapsed * 100:>7.1f}"
+                       f"{us(mean):>10}{us(h.quantile(0.5)):>10}{us(h.quantile(0.99)):>10}{us(h.max):>12}")
+        out.append("")
+        out.append("# Histogram (biên trên bucket, giây)")
+        edges = [f"{b:g}" for b in BUCKETS] + ["+Inf"]
+        for stage, h in self.stages.items():
+            out.append(f"{stage}: " + " ".join(f"{e}={c}" for e, c in zip(edges, h.counts) if c))
+        path.write_text("\n".join(out) + "\n", encoding="utf-8")
+        if self.logger:
+            self.logger.info(f"Đã ghi histogram thời gian xử lý: {path}")
+        return path
+
+
+class SamplingProfiler:
+    """Lấy mẫu stack của một thread định kỳ, ghi ra dạng collapsed stack (dùng được với flamegraph)"""
+
+    def __init__(self, thread_id=None, interval=0.005, log_dir="logs", logger=None):
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.interval = interval
+        self.log_dir = Path(log_dir)
+        self.logger = logger
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread:
+            return
+        self.samples = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        """Dừng lấy mẫu và ghi file, trả về đường dẫn file"""
+        if not self._thread:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        path = self.log_dir / f"profile_samples_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        if self.logger:
+            self.logger.info(f"Đã ghi {sum(self.samples.values())} mẫu stack: {path}")
+        return path
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# action -> (slot, hàm sinh lệnh). Các action cùng slot trên một cổng thay thế nhau
+ACTIONS = {
+    "shutdown": ("admin", lambda iface: [f"interface {iface}", "shutdown"]),
+    "no shutdown": ("admin", lambda iface: [f"interface {iface}", "shutdown", "no shutdown"]),
+    "clear port-security": ("clear", lambda iface: [f"do clear port-security sticky interface {iface}"]),
+}
+
+
+class PendingAction:
+    __slots__ = ("interface", "action", "priority", "detected_at", "count")
+
+    def __init__(self, interface, action, priority, detected_at):
+        self.interface = interface
+        self.action = action
+        self.priority = priority
+        self.detected_at = detected_at  # time.monotonic() lúc phát hiện lần đầu
+        self.count = 1                  # Số yêu cầu đã được gộp vào action này
+
+
+class _SwitchQueue:
+    def __init__(self, switch_config):
+        self.switch_config = switch_config
+        self.pending = {}       # (interface, slot) -> PendingAction
+        self.in_flight = False
+
+
+class RemediationQueue:
+    """Gom các thao tác trên cổng theo switch và gửi thành một lần send_config_set"""
+
+    def __init__(self, pool, dry_run=True, batch_window=0.2, max_workers=8, logger=None):
+        self.pool = pool
+        self.dry_run = dry_run
+        self.batch_window = batch_window   # Chờ thêm để gom các yêu cầu đến cùng lúc
+        self.logger = logger
+
+        self._switches = {}
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="remediation")
+        self._thread = None
+        self._running = False
+
+        # Thống kê độ trễ từ lúc phát hiện tới lúc cấu hình được áp dụng
+        self.submitted = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.failed = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=1000)
+
+    def submit(self, switch_config, interface, action, priority=0, detected_at=None):
+        """Đưa một thao tác vào hàng đợi, gộp với yêu cầu trùng đang chờ"""
+        slot, _ = ACTIONS[action]
+        detected_at = detected_at if detected_at is not None else time.monotonic()
+        with self._cond:
+            self.submitted += 1
+            sq = self._switches.get(switch_config["host"])
+            if sq is None:
+                sq = self._switches[switch_config["host"]] = _SwitchQueue(switch_config)
+            pending = sq.pending.get((interface, slot))
+            if pending is None:
+                sq.pending[(interface, slot)] = PendingAction(interface, action, priority, detected_at)
+                self._cond.notify()
+            else:
+                self.coalesced += 1
+                pending.count += 1
+                pending.action = action
+                pending.priority = max(pending.priority, priority)
+                pending.detected_at = min(pending.detected_at, detected_at)
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+            self._thread.start()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._ready():
+                    if not self._running and not self._busy():
+                        return
+                    self._cond.wait()
+            time.sleep(self.batch_window)
+            with self._cond:
+                batches = []
+                for sq in self._switches.values():
+                    if sq.pending and not sq.in_flight:
+                        sq.in_flight = True
+                        batches.append((sq, list(sq.pending.values())))
+                        sq.pending.clear()
+            for sq, actions in batches:
+                self._executor.submit(self._apply, sq, actions)
+
+    def _ready(self):
+        return any(sq.pending and not sq.in_flight for sq in self._switches.values())
+
+    def _busy(self):
+        return any(sq.pending or sq.in_flight for sq in self._switches.values())
+
+    def _apply(self, sq, actions):
+        host = sq.switch_config["host"]
+        # Kẻ tấn công liên tục (priority cao) được xử lý trước
+        actions.sort(key=lambda a: (-a.priority, a.detected_at))
+        commands = []
+        for a in actions:
+            commands.extend(ACTIONS[a.action][1](a.interface))
+
+        start = time.monotonic()
+        try:
+            if self.dry_run:
+                if self.logger:
+                    self.logger.info(f"[DRY-RUN] {host}: {commands}")
+            else:
+                with self.pool.session(sq.switch_config) as conn:
+                    conn.send_config_set(commands)
+        except Exception as e:
+            with self._cond:
+                self.failed += len(actions)
+            if self.logger:
+                self.logger.error(f"Lỗi áp dụng cấu hình trên {host}: {e}")
+        else:
+            done = time.monotonic()
+            with self._cond:
+                self.applied += len(actions)
+                self.batches += 1
+                self.latencies.extend(done - a.detected_at for a in actions)
+            if self.logger:
+                summary = ", ".join(f"{a.action} {a.interface} (x{a.count})" for a in actions)
+                self.logger.info(f"{host}: đã áp dụng {summary} trong {(done - start) * 1000:.0f} ms")
+        finally:
+            with self._cond:
+                sq.in_flight = False
+                self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            latencies = sorted(self.latencies)
+            stats = {
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "applied": self.applied,
+                "failed": self.failed,
+                "batches": self.batches,
+                "pending": sum(len(sq.pending) for sq in self._switches.values()),
+            }
+        if latencies:
+            stats["latency_p50"] = latencies[len(latencies) // 2]
+            stats["latency_p99"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            stats["latency_max"] = latencies[-1]
+        return stats
+
+    def stop(self, timeout=10):
+        """Gửi nốt các thao tác đang chờ rồi dừng"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
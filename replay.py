@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Chạy lại các detector trên syslog cũ (syslog.log, syslog.log.1, syslog.log.2.gz, ...)
+import argparse
+import glob
+import gzip
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def archive_order(path):
+    """Khóa sắp xếp để đọc từ cũ đến mới: syslog.log.3.gz, ..., syslog.log.1, syslog.log"""
+    m = re.search(r"\.(\d+)(\.gz)?$", path)
+    return (-int(m.group(1)) if m else 0, path)
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    """Đọc file (giải nén .gz khi đọc) theo từng khối lớn, mỗi khối kết thúc ở cuối dòng"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        rest = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            if rest:
+                chunk = rest + chunk
+            cut = chunk.rfind(b"\n") + 1
+            rest = chunk[cut:]
+            if cut:
+                yield chunk[:cut]
+        if rest:
+            yield rest
+
+
+def build_detectors(names):
+    from mac_flood_protect import MACFloodMonitor
+    from dhcp_snooping_protect import DHCPSnoopingMonitor
+    from stp_auto_recover import BPDUGuardMonitor
+    available = {"mac": MACFloodMonitor, "dhcp": DHCPSnoopingMonitor, "stp": BPDUGuardMonitor}
+    return [available[name]() for name in names]
+
+
+def replay_worker(paths, names, log_dir, part=0, parts=1, year=None):
+    """Chạy detector trên các file theo thứ tự; parts > 1 thì chỉ xử lý các switch thuộc phần part
+
+    Trả về (số dòng, số byte đã giải nén, trạng thái cổng theo từng luật).
+    """
+    from monitor_core import AttackDetector
+    from match_rules import RuleTable
+    from event_clock import EventClock
+    from storm_guard import StormGuard
+    from ingest import ingest_line
+    AttackDetector.log_dir = log_dir
+    detectors = build_detectors(names)
+    # Cùng đồng hồ sự kiện với chế độ theo dõi trực tiếp, chỉ là không trôi theo đồng hồ máy
+    clock = EventClock(year=year, realtime=False)
+    for detector in detectors:
+        # Chi tiết từng lần tấn công đã có trong log gốc, worker chỉ trả về trạng thái
+        detector.logger.disabled = True
+        detector.console = lambda *args: None
+        detector.clock = clock
+    rules = RuleTable(d.rule for d in detectors)
+    # Cùng cách gộp dòng trùng lặp với chế độ trực tiếp để ring buffer và recovery cycle giống hệt
+    guard = StormGuard()
+    accept = None
+    if parts > 1:
+        def accept(host):
+            return zlib.crc32((host or "").encode()) % parts == part
+
+    lines = nbytes = 0
+    for path in paths:
+        for chunk in iter_chunks(path):
+            nbytes += len(chunk)
+            batch = chunk.decode("utf-8", errors="replace").splitlines()
+            lines += len(batch)
+            for line in batch:
+                # Thời gian lấy từ dòng log nên timeout cũng tính theo thời gian log
+                ingest_line(line, None, rules, clock, detectors, guard, accept)
+            # Dòng không khớp luật nào vẫn cho biết log đã đi tới đâu: đẩy đồng hồ theo dòng cuối của khối
+            last = clock.timestamp(batch[-1]) if batch else None
+            if last is not None:
+                clock.advance(last)
+
+    # Hết dữ liệu: kết thúc các tấn công đã hết hạn trước dòng cuối cùng, như chế độ trực tiếp
+    watermark = clock.watermark()
+    for detector in detectors:
+        detector.check_timeout_attacks(watermark)
+
+    states = {d.log_prefix: d.export_state() for d in detectors}
+    return lines, nbytes, states
+
+
+def merge_states(results):
+    """Gộp trạng thái cổng của các worker theo thứ tự file (cũ trước)"""
+    merged = {}
+    for states in results:
+        for rule, ports in states.items():
+            table = merged.setdefault(rule, {})
+            for device, iface, rec in ports:
+                old = table.get((device, iface))
+                if old is None:
+                    table[(device, iface)] = rec
+                    continue
+                count, attacking, persistent, cycle, first, last, times = rec
+                if attacking and old[1] and old[4] is not None:
+                    # Tấn công kéo dài qua ranh giới hai file
+                    first = old[4]
+                table[(device, iface)] = [old[0] + count, attacking, old[2] or persistent, cycle,
+                                          first, last, (old[6] + times)]
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy lại các detector Layer 2 trên syslog cũ (hỗ trợ .gz)")
+    parser.add_argument("files", nargs="*", help="Các file syslog, mặc định là syslog.log* trong /var/log/syslog-remote")
+    parser.add_argument("--detectors", default="mac,dhcp,stp")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--split", choices=["file", "device"], default="file",
+                        help="Chia việc theo file (nhanh) hoặc theo switch (giữ nguyên trạng thái qua các file)")
+    parser.add_argument("--year", type=int, help="Năm của các dòng syslog không ghi năm")
+    parser.add_argument("--log-dir", default="logs/replay")
+    args = parser.parse_args()
+
+    from monitor_core import AttackDetector
+    files = args.files or glob.glob("/var/log/syslog-remote/syslog.log*")
+    files = sorted(files, key=archive_order)
+    names = args.detectors.split(",")
+    AttackDetector.log_dir = args.log_dir
+
+    if args.split == "file":
+        jobs = [([path], names, args.log_dir, 0, 1, args.year) for path in files]
+    else:
+        jobs = [(files, names, args.log_dir, k, args.workers, args.year) for k in range(args.workers)]
+
+    print(f"[REPLAY] {len(files)} file, {args.workers} worker, chia theo {args.split}")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(replay_worker, *zip(*jobs)))
+    elapsed = time.perf_counter() - start
+
+    lines = sum(r[0] for r in results)
+    nbytes = sum(r[1] for r in results)
+    if args.split == "device":
+        # Mỗi worker đều đọc toàn bộ file
+        lines //= args.workers
+        nbytes //= args.workers
+    merged = merge_states(r[2] for r in results)
+
+    # Dựng lại detector với trạng thái đã gộp để dùng chung báo cáo với chế độ theo dõi trực tiếp
+    for detector in build_detectors(names):
+        detector.restore_state(merged.get(detector.log_prefix, {}))
+        detector.shutdown()
+        attacked = sum(1 for sh in detector.shards.values() for st in sh.interface_state.values() if st.attack_count)
+        print(f"[{detector.attack_name}] {attacked} cong bi tan cong")
+
+    from event_log import close_writers
+    close_writers()
+    print(f"[HOAN THANH] {lines:,} dong, {nbytes / 1024 / 1024:,.0f} MB trong {elapsed:.1f}s "
+          f"({nbytes / 1024 / 1024 / elapsed * 60:,.0f} MB/phut) - bao cao trong {args.log_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+# Xử lý syslog trên nhiều tiến trình: chia dòng theo switch, mỗi tiến trình giữ trạng thái cổng của các switch của nó
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+import zlib
+
+from match_rules import parse_host
+
+
+def shard_of(device, workers):
+    """Tiến trình con giữ trạng thái của switch (cùng cách chia với replay --split device)"""
+    return zlib.crc32((device or "").encode()) % workers
+
+
+class _Outbox:
+    """Thay cho console/alert/EventLog/RemediationQueue của detector trong tiến trình con
+
+    Đầu ra được gom lại và gửi về tiến trình chính một lần sau mỗi lô dòng.
+    """
+
+    def __init__(self, results):
+        self.results = results
+        self.items = []
+
+    def print(self, text=""):
+        self.items.append(("print", text))
+
+    def alert(self):
+        self.items.append(("alert",))
+
+    def emit(self, *args):
+        self.items.append(("event", args))
+
+    def submit(self, *args, **kwargs):
+        self.items.append(("remediate", args, kwargs))
+
+    def flush(self):
+        if self.items:
+            self.results.put(self.items)
+            self.items = []
+
+
+def shard_worker(index, classes, inbox, results, states, remediate=False, periodicity_interval=None,
+                 log_dir="logs", poll=False):
+    """Vòng lặp của một tiến trình con: xử lý các lô dòng của những switch thuộc phần index"""
+    # Ctrl+C gửi tới cả nhóm tiến trình: chỉ tiến trình chính quyết định khi nào dừng
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    from monitor_core import AttackDetector
+    from match_rules import RuleTable
+    from event_clock import EventClock
+    from event_log import close_writers
+    from storm_guard import StormGuard
+    from ingest import ingest_line
+    from fleet_poller import PER_PORT
+
+    AttackDetector.log_dir = f"{log_dir}/shard-{index}"
+    detectors = [cls() for cls in classes]
+    by_prefix = {d.log_prefix: d for d in detectors}
+    clock = EventClock()
+    guard = StormGuard()
+    out = _Outbox(results)
+    for detector in detectors:
+        detector.console = out.print
+        detector.alert_callback = out.alert
+        detector.events = out
+        detector.remediation = out if remediate else None
+        detector.clock = clock
+        if poll and detector.poll_command in PER_PORT:
+            # FleetPoller ở tiến trình chính: đếm vi phạm syslog để trừ khỏi phần tăng của bộ đếm
+            detector.poll_reported = {}
+        detector.restore_state(states.get(detector.log_prefix, {}))
+
+    analyzer = None
+    if periodicity_interval:
+        import periodicity
+        if periodicity.np is not None:
+            analyzer = periodicity.PeriodicityAnalyzer(detectors, interval=periodicity_interval)
+    next_analysis = time.monotonic() + (periodicity_interval or 0)
+
+    rules = RuleTable(d.rule for d in detectors)
+    parent = multiprocessing.parent_process()
+    lines = 0
+    out.items.append(("ready", index))
+    out.flush()
+
+    while True:
+        delays = [t for t in (d.seconds_until_timeout() for d in detectors) if t is not None]
+        wait = min(delays) if delays else 1.0
+        try:
+            msg = inbox.get(timeout=min(wait, 1.0))
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                break
+            msg = ("tick",)
+
+        kind = msg[0]
+        if kind == "lines":
+            # hosts song song với các dòng khi host lấy từ tên file, None thì lấy từ header của dòng
+            hosts = msg[2]
+            for i, line in enumerate(msg[1]):
+                ingest_line(line, hosts[i] if hosts else None, rules, clock, detectors, guard)
+            lines += len(msg[1])
+        elif kind == "call":
+            # Kết quả hỏi bộ đếm của FleetPoller cho switch thuộc phần này
+            _, prefix, name, args = msg
+            getattr(by_prefix[prefix], name)(*args)
+        elif kind == "sync":
+            out.items.append(("state", msg[1], index, {d.log_prefix: d.export_state(changed_only=True)
+                                                       for d in detectors},
+                              {r.name: r.hits for r in rules.rules}, guard.stats()))
+        elif kind == "stop":
+            break
+
+        for detector in detectors:
+            detector.check_timeout_attacks()
+        if analyzer and time.monotonic() >= next_analysis:
+            next_analysis = time.monotonic() + analyzer.interval
+            analyzer.run(clock.now())
+        out.flush()
+
+    out.items.append(("stopped", index, {d.log_prefix: d.export_state(changed_only=True) for d in detectors},
+                      {r.name: r.hits for r in rules.rules}, guard.stats(), {"lines": lines, **clock.stats()}))
+    out.flush()
+    close_writers()
+
+
+class ShardedIngest:
+    """Tiến trình chính đọc log và chia dòng theo switch cho N tiến trình con
+
+    Mỗi tiến trình con giữ trạng thái cổng của các switch thuộc phần của nó nên không cần khóa.
+    Cảnh báo, sự kiện và yêu cầu xử lý cổng quay về tiến trình chính qua một hàng đợi;
+    trạng thái cổng được gửi về định kỳ để ghi checkpoint và metrics.
+    """
+
+    def __init__(self, monitor, workers, states, periodicity_interval=None, batch_size=256,
+                 max_delay=0.05, sync_interval=5.0, logger=None):
+        self.monitor = monitor
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_delay = max_delay          # Lô chưa đầy được gửi sau tối đa max_delay giây
+        self.sync_interval = sync_interval
+        self.logger = logger
+
+        ctx = multiprocessing.get_context("spawn")
+        self._results = ctx.Queue()
+        self._inboxes = [ctx.Queue() for _ in range(workers)]
+        # Trạng thái cổng của checkpoint cũ được chia theo switch cho từng tiến trình con
+        parts = [{} for _ in range(workers)]
+        for prefix, ports in states.items():
+            for device, iface, rec in ports:
+                parts[shard_of(device, workers)].setdefault(prefix, {})[(device, iface)] = rec
+        classes = [type(d) for d in monitor.detectors]
+        self._procs = [
+            ctx.Process(target=shard_worker, name=f"shard-{k}", daemon=True,
+                        args=(k, classes, self._inboxes[k], self._results, parts[k],
+                              monitor.remediation is not None, periodicity_interval, classes[0].log_dir,
+                              monitor.poller is not None))
+            for k in range(workers)
+        ]
+
+        self._batches = [[] for _ in range(workers)]
+        self._hosts = [[] for _ in range(workers)]
+        self._routes = {}                   # Chuỗi host trong dòng -> tiến trình con
+        self._oldest = None                 # time.monotonic() của dòng cũ nhất chưa gửi
+        self._replies = queue.SimpleQueue() # Trả lời sync/stop, chỉ luồng đọc log xử lý
+        self._syncs = {}                    # seq -> [vị trí đọc, số tiến trình đã trả lời]
+        self._seq = 0
+        self._next_sync = time.monotonic() + sync_interval
+        self._hits = [{} for _ in range(workers)]
+        self._guards = [{} for _ in range(workers)]   # StormGuard.stats() của từng tiến trình con
+        self._thread = None
+
+        self.lines_sent = 0
+        self.batches_sent = 0
+        self.worker_stats = {}
+
+    def start(self, timeout=60):
+        for proc in self._procs:
+            proc.start()
+        self._thread = threading.Thread(target=self._drain_results, daemon=True)
+        self._thread.start()
+        # Chờ mọi tiến trình con nạp xong detector
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < self.workers:
+            try:
+                reply = self._replies.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise RuntimeError(f"Chỉ {ready}/{self.workers} tiến trình con khởi động được")
+            ready += reply[0] == "ready"
+        if self.logger:
+            self.logger.info(f"Chia việc xử lý cho {self.workers} tiến trình theo switch")
+
+    def submit(self, line, host=None):
+        """Đưa một dòng vào lô của tiến trình giữ switch đã gửi dòng đó"""
+        if host is not None:
+            # Host đã biết từ tên file
+            k = shard_of(host, self.workers)
+            self._hosts[k].append(host)
+        # Định dạng truyền thống: host nằm ngay sau 15 ký tự timestamp, không cần parse cả dòng
+        elif line[15:16] == " ":
+            token = line[16:line.find(" ", 16)]
+            k = self._routes.get(token)
+            if k is None:
+                if len(self._routes) >= 65536:
+                    self._routes.clear()
+                k = self._routes[token] = shard_of(parse_host(line), self.workers)
+        else:
+            k = shard_of(parse_host(line), self.workers)
+        batch = self._batches[k]
+        batch.append(line)
+        if len(batch) >= self.batch_size:
+            self._send(k)
+        elif self._oldest is None:
+            self._oldest = time.monotonic()
+
+    def _send(self, k):
+        batch, hosts = self._batches[k], self._hosts[k]
+        self._batches[k], self._hosts[k] = [], []
+        self._inboxes[k].put(("lines", batch, hosts or None))
+        self.lines_sent += len(batch)
+        self.batches_sent += 1
+
+    def flush(self):
+        """Gửi mọi lô chưa đầy (khi tailer đã đọc hết dữ liệu hiện có)"""
+        for k, batch in enumerate(self._batches):
+            if batch:
+                self._send(k)
+        self._oldest = None
+
+    def pending_delay(self):
+        """Số giây tới lúc phải gửi lô chưa đầy, None nếu không có lô nào chờ"""
+        if self._oldest is None:
+            return None
+        return max(self._oldest + self.max_delay - time.monotonic(), 0)
+
+    def forward(self, host, fn, args):
+        """Chuyển kết quả hỏi bộ đếm (hàm của detector, tham số) cho tiến trình giữ switch"""
+        if fn.__name__ == "switch_counter":
+            # Không đụng tới trạng thái cổng: ghi nhận ngay ở tiến trình chính để metrics thấy được
+            fn(*args)
+            return
+        self._inboxes[shard_of(host, self.workers)].put(("call", fn.__self__.log_prefix, fn.__name__, args))
+
+    def _drain_results(self):
+        """Thread nền: đưa đầu ra của tiến trình con vào terminal, âm thanh, JSONL và hàng đợi xử lý cổng"""
+        monitor = self.monitor
+        while True:
+            items = self._results.get()
+            if items is None:
+                return
+            for item in items:
+                kind = item[0]
+                if kind == "print":
+                    monitor.alerts.print(item[1])
+                elif kind == "alert":
+                    monitor.alerts.alert()
+                elif kind == "event":
+                    if monitor.events:
+                        monitor.events.emit(*item[1])
+                elif kind == "remediate":
+                    if monitor.remediation:
+                        monitor.remediation.submit(*item[1], **item[2])
+                else:
+                    self._replies.put(item)
+
+    def housekeeping(self, position=None):
+        """Chạy trên luồng đọc log: gửi lô quá hạn, yêu cầu và nhận trạng thái cổng định kỳ"""
+        now = time.monotonic()
+        if self._oldest is not None and now - self._oldest >= self.max_delay:
+            self.flush()
+        if now >= self._next_sync:
+            self._next_sync = now + self.sync_interval
+            self.flush()
+            self._seq += 1
+            self._syncs[self._seq] = [position, 0]
+            for inbox in self._inboxes:
+                inbox.put(("sync", self._seq))
+        while True:
+            try:
+                reply = self._replies.get_nowait()
+            except queue.Empty:
+                return
+            self._apply(reply)
+
+    def _apply(self, reply):
+        """Chép trạng thái cổng tiến trình con gửi về vào detector của tiến trình chính"""
+        from port_state import PortState
+        if reply[0] == "stopped":
+            _, index, states, hits, guard, stats = reply
+            self.worker_stats[index] = stats
+            seq = None
+        else:
+            _, seq, index, states, hits, guard = reply
+        self._hits[index] = hits
+        self._guards[index] = guard
+        for detector in self.monitor.detectors:
+            for device, iface, rec in states.get(detector.log_prefix, ()):
+                detector.shard(device).interface_state[iface] = PortState.restore(rec)
+                detector.dirty.add((device, iface))
+        for rule in self.monitor.rules.rules:
+            rule.hits = sum(h.get(rule.name, 0) for h in self._hits)
+        sync = self._syncs.get(seq)
+        if sync is not None:
+            sync[1] += 1
+            if sync[1] == self.workers:
+                # Mọi tiến trình đã xử lý hết các dòng đọc trước vị trí này
+                del self._syncs[seq]
+                self.monitor.write_checkpoint(sync[0])
+
+    def stop(self, timeout=10):
+        """Gửi nốt các lô, chờ tiến trình con xử lý xong và nhận trạng thái cuối cùng"""
+        self.flush()
+        for inbox in self._inboxes:
+            inbox.put(("stop",))
+        deadline = time.monotonic() + timeout
+        while len(self.worker_stats) < self.workers:
+            try:
+                reply = self._replies.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            self._apply(reply)
+        for proc in self._procs:
+            proc.join(max(deadline - time.monotonic(), 0.1))
+            if proc.is_alive():
+                proc.terminate()
+        self._results.put(None)
+        self._thread.join(timeout=1)
+
+    def guard_stats(self):
+        """Tổng StormGuard.stats() của các tiến trình con theo lần gửi trạng thái gần nhất"""
+        total = {}
+        for stats in self._guards:
+            for name, value in stats.items():
+                total[name] = total.get(name, 0) + value
+        return total
+
+    def stats(self):
+        return {"workers": self.workers, "lines_sent": self.lines_sent, "batches": self.batches_sent,
+                "per_worker": {k: v for k, v in sorted(self.worker_stats.items())}}
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Gộp các dòng tấn công trùng lặp khi switch xả hàng nghìn bản tin giống hệt nhau (bão syslog)
+from match_rules import parse_repeat
+
+
+class StormGuard:
+    """Đứng giữa bảng luật và detector: mỗi (luật, switch, cổng) chỉ gọi process_attack một lần mỗi đợt
+
+    Dòng đầu tiên của đợt được xử lý ngay nên không làm chậm việc phát hiện; các dòng giống nó
+    chỉ được cộng vào attack_count/last_activity của cổng mà không thêm thời điểm vào ring buffer,
+    không in cảnh báo và không gọi khắc phục. Cửa sổ còn mở chừng nào các dòng giống nhau vẫn đến
+    cách nhau không quá window giây (theo đồng hồ sự kiện; timestamp syslog chỉ chính xác đến giây),
+    nên một đợt kéo dài nhiều giây trong mỗi recovery cycle (30s) vẫn chỉ để lại một thời điểm. Cửa sổ chỉ đóng theo thời điểm của dòng kế tiếp,
+    không theo watermark, để việc đọc chậm hơn thời gian thực trong cơn bão không làm cửa sổ đóng sớm.
+    Dòng tóm tắt "last message repeated N times" / "message repeated N times: [...]" của rsyslog
+    được tính như N dòng của bản tin gốc.
+    """
+
+    def __init__(self, window=5.0, max_keys=65536):
+        self.window = window
+        self.max_keys = max_keys
+        # (detector, switch, cổng) -> thời điểm đóng cửa sổ: dòng giống nhau gần nhất cộng window
+        self._open = {}
+        # Switch -> khóa của dòng tấn công vừa đọc từ switch đó, cho dòng "last message repeated"
+        self.last_attack = {}
+
+        self.events = 0         # Số dòng tấn công (kể cả số lần lặp của dòng tóm tắt)
+        self.collapsed = 0      # Số dòng được gộp, không gọi process_attack
+        self.repeat_lines = 0   # Số dòng tóm tắt của rsyslog đã tính
+        self.repeated = 0       # Tổng N của các dòng tóm tắt
+
+    def attack(self, detector, interface, line, device, now, count=None):
+        """Một dòng tấn công đã khớp luật; count là số dòng nó đại diện (None = đọc từ dòng tóm tắt)"""
+        if count is None:
+            count = 1
+            if "message repeated " in line:
+                # "message repeated N times: [ bản tin gốc ]" khớp luật như chính bản tin gốc
+                repeat = parse_repeat(line)
+                if repeat:
+                    count = repeat
+                    self.repeat_lines += 1
+                    self.repeated += repeat
+        self.events += count
+        if detector.poll_reported is not None:
+            detector.note_reported(device, interface, count)
+        key = (detector, device, interface)
+        self.last_attack[device] = key
+        end = self._open.get(key)
+        if end is not None and now <= end and self._attacking(detector, device, interface):
+            detector.absorb_repeats(device, interface, count, now)
+            self.collapsed += count
+            if now + self.window > end:
+                self._open[key] = now + self.window
+            return
+        if self.window:
+            if end is None and len(self._open) >= self.max_keys:
+                self._prune(now)
+            self._open[key] = now + self.window
+        detector.process_attack(interface, line, device, now, count)
+
+    @staticmethod
+    def _attacking(detector, device, interface):
+        """Cổng vẫn đang bị tấn công; tấn công đã kết thúc (timeout, nạp checkpoint) thì dòng mới là đợt mới"""
+        shard = detector.shards.get(device)
+        st = shard.interface_state.get(interface) if shard else None
+        return st is not None and st.is_attacking
+
+    def repeat_of(self, line, device):
+        """Dòng không khớp luật nào từ device: (detector, switch, cổng, N) nếu đó là dòng
+        "last message repeated N times" ngay sau một dòng tấn công của cùng switch, ngược lại None"""
+        key = self.last_attack.pop(device, None)
+        if key is None:
+            return None
+        count = parse_repeat(line)
+        if not count:
+            return None
+        # Nhiều dòng tóm tắt liên tiếp vẫn lặp lại cùng một dòng tấn công
+        self.last_attack[device] = key
+        self.repeat_lines += 1
+        self.repeated += count
+        return key + (count,)
+
+    def _prune(self, now):
+        """Bảng cửa sổ đầy: bỏ các cửa sổ đã đóng trước now, vẫn đầy thì bỏ hết"""
+        self._open = {key: end for key, end in self._open.items() if end > now}
+        if len(self._open) >= self.max_keys:
+            self._open.clear()
+
+    def stats(self):
+        return {"events": self.events, "collapsed": self.collapsed, "repeat_lines": self.repeat_lines,
+                "repeated": self.repeated, "open_windows": len(self._open)}
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Sinh syslog Cisco IOS giả lập để kiểm thử và đo hiệu năng các monitor
+import argparse
+import json
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+
+SAMPLE_NOISE = [
+    "<189>{n}: *Mar  1 00:{m:02d}:{s:02d}.123: %LINEPROTO-5-UPDOWN: Line protocol on Interface Ethernet0/1, changed state to up",
+    "<189>{n}: *Mar  1 00:{m:02d}:{s:02d}.123: %SYS-5-CONFIG_I: Configured from console by admin on vty0 (192.168.104.1)",
+    "<190>{n}: *Mar  1 00:{m:02d}:{s:02d}.123: %SEC_LOGIN-5-LOGIN_SUCCESS: Login Success [user: admin] [Source: 192.168.104.1] [localport: 22]",
+]
+SAMPLE_ATTACKS = [
+    "<186>{n}: *Mar  1 00:{m:02d}:{s:02d}.123: %PORT_SECURITY-2-PSECURE_VIOLATION: Security violation occurred, caused by MAC address aabb.cc00.{n4:04x} on port Ethernet0/{p}.",
+    "<188>{n}: *Mar  1 00:{m:02d}:{s:02d}.123: %DHCP_SNOOPING-4-DHCP_SNOOPING_ERRDISABLE_WARNING: DHCP Snooping received 10 DHCP packets on interface Ethernet0/{p}.",
+    "<186>{n}: *Mar  1 00:{m:02d}:{s:02d}.123: %SPANTREE-2-BLOCK_BPDUGUARD: Received BPDU on port Ethernet0/{p} with BPDU Guard enabled. Disabling port.",
+]
+
+
+def generate_messages(count, match_rate, seed=1):
+    """Sinh các bản tin syslog (chưa có host) với tỉ lệ dòng tấn công cho trước"""
+    rnd = random.Random(seed)
+    for n in range(count):
+        tpl = rnd.choice(SAMPLE_ATTACKS if rnd.random() < match_rate else SAMPLE_NOISE)
+        yield tpl.format(n=n, n4=n & 0xFFFF, m=(n // 60) % 60, s=n % 60, p=rnd.randint(0, 3))
+
+
+def generate_lines(count, match_rate, host="192.168.104.6", seed=1):
+    """Sinh các dòng giống file syslog.log mà rsyslog ghi ra"""
+    for n, message in enumerate(generate_messages(count, match_rate, seed)):
+        yield f"Mar  1 00:{(n // 60) % 60:02d}:{n % 60:02d} {host} {message}"
+
+
+def generate_scenario(count, rate, match_rate=0.01, burst_size=20, cycle_ports=2, cycle_interval=30.0,
+                      hosts=("192.168.104.6", "192.168.104.7"), seed=1):
+    """Sinh kịch bản (t, host, bản tin, là tấn công): log nền, các đợt tấn công dồn dập
+    và các cổng bị tấn công lại sau mỗi recovery cycle
+
+    t là số giây tính từ đầu kịch bản, tương ứng với tốc độ rate dòng/giây.
+    """
+    rnd = random.Random(seed)
+    burst_left = 0
+    burst = None
+    # Mỗi cổng recovery cycle gửi một bản tin err-disable sau mỗi cycle_interval giây
+    cycles = [[cycle_interval * (i + 1) / max(cycle_ports, 1), rnd.choice(hosts),
+               rnd.choice(SAMPLE_ATTACKS), 10 + i] for i in range(cycle_ports)]
+    for n in range(count):
+        t = n / rate
+        fields = dict(n=n, n4=n & 0xFFFF, m=int(t // 60) % 60, s=int(t) % 60)
+        due = next((c for c in cycles if c[0] <= t), None)
+        if due:
+            due[0] += cycle_interval
+            yield t, due[1], due[2].format(p=due[3], **fields), True
+            continue
+        if not burst_left and rnd.random() < match_rate / burst_size:
+            burst_left = burst_size
+            burst = (rnd.choice(hosts), rnd.choice(SAMPLE_ATTACKS), rnd.randint(0, 3))
+        if burst_left:
+            burst_left -= 1
+            yield t, burst[0], burst[1].format(p=burst[2], **fields), True
+        else:
+            yield t, rnd.choice(hosts), rnd.choice(SAMPLE_NOISE).format(p=0, **fields), False
+
+
+def format_line(start, t, host, message):
+    """Dòng syslog giống rsyslog ghi ra, start là datetime bắt đầu kịch bản"""
+    ts = start + timedelta(seconds=t)
+    return f"{ts:%b} {ts.day:2d} {ts:%H:%M:%S} {host} {message}"
+
+
+def write_scenario(records, path, rate, timings_path=None):
+    """Ghi kịch bản vào file với tốc độ xấp xỉ rate dòng/giây (0 = không giới hạn)
+
+    Nếu có timings_path, lưu [số thứ tự, time.monotonic() lúc ghi] của các dòng tấn công
+    để đo độ trễ phát hiện.
+    """
+    start_ts = datetime.now().replace(microsecond=0)
+    timings = []
+    pending = []  # Số thứ tự các dòng tấn công chưa được flush
+    buf = []
+    # Ghi và flush từng nhóm ~1 ms để độ trễ đo được không bị bộ đệm làm sai lệch
+    flush_every = max(rate // 1000, 1) if rate else 1000
+    written = 0
+    start = time.perf_counter()
+
+    def flush(f):
+        # Lấy thời điểm trước khi ghi: nhóm lớn có thể tới tay reader trước khi write() trả về
+        now = time.monotonic()
+        f.write("".join(buf))
+        f.flush()
+        buf.clear()
+        timings.extend([n, now] for n in pending)
+        pending.clear()
+
+    with open(path, "a", encoding="utf-8") as f:
+        for n, (t, host, message, is_attack) in enumerate(records):
+            buf.append(format_line(start_ts, t, host, message) + "\n")
+            if is_attack:
+                pending.append(n)
+            written += 1
+            if written % flush_every == 0:
+                flush(f)
+                if rate:
+                    ahead = written / rate - (time.perf_counter() - start)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        flush(f)
+    if timings_path:
+        with open(timings_path, "w") as tf:
+            json.dump(timings, tf)
+    return written, time.perf_counter() - start
+
+
+def send_messages(messages, target, port, protocol="udp", rate=50_000):
+    """Gửi bản tin tới syslog server với tốc độ xấp xỉ rate bản tin/giây"""
+    if protocol == "udp":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        send = lambda payload: sock.sendto(payload, (target, port))
+    else:
+        sock = socket.create_connection((target, port))
+        # Dùng framing octet-counting của RFC 6587
+        send = lambda payload: sock.sendall(b"%d %s" % (len(payload), payload))
+
+    sent = 0
+    start = time.perf_counter()
+    try:
+        for message in messages:
+            send(message.encode("utf-8"))
+            sent += 1
+            if rate and sent % 500 == 0:
+                ahead = sent / rate - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+    finally:
+        sock.close()
+    return sent, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gửi syslog Cisco IOS giả lập tới syslog server hoặc ghi ra file")
+    parser.add_argument("--target", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=514)
+    parser.add_argument("--protocol", choices=["udp", "tcp"], default="udp")
+    parser.add_argument("--count", type=int, default=500_000)
+    parser.add_argument("--rate", type=int, default=50_000, help="Số bản tin/giây, 0 = không giới hạn")
+    parser.add_argument("--match-rate", type=float, default=0.01)
+    parser.add_argument("--burst-size", type=int, default=20, help="Số dòng trong mỗi đợt tấn công")
+    parser.add_argument("--cycle-ports", type=int, default=2, help="Số cổng bị tấn công lại sau mỗi recovery cycle")
+    parser.add_argument("--cycle-interval", type=float, default=30.0)
+    parser.add_argument("--output", metavar="FILE", help="Ghi vào file (như rsyslog) thay vì gửi qua mạng")
+    parser.add_argument("--timings", metavar="FILE", help="Lưu thời điểm ghi các dòng tấn công (chỉ dùng với --output)")
+    args = parser.parse_args()
+
+    records = generate_scenario(args.count, args.rate or 10_000, args.match_rate, args.burst_size,
+                                args.cycle_ports, args.cycle_interval)
+    if args.output:
+        written, elapsed = write_scenario(records, args.output, args.rate, args.timings)
+        print(f"[GHI] {written} dong trong {elapsed:.2f}s ({written / elapsed:,.0f} dong/s) vao {args.output}")
+        return
+    messages = (message for _, _, message, _ in records)
+    sent, elapsed = send_messages(messages, args.target, args.port, args.protocol, args.rate)
+    print(f"[GUI] {sent} ban tin trong {elapsed:.2f}s ({sent / elapsed:,.0f} ban tin/s) toi {args.target}:{args.port}/{args.protocol}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+# Nhận syslog trực tiếp qua UDP/TCP bằng asyncio, không cần đọc lại file của rsyslog
+import asyncio
+import re
+import socket
+import time
+
+# Timestamp RFC 3164, ví dụ "Mar  1 00:00:01 "
+RFC3164_TS = re.compile(r"[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d ")
+
+
+def parse_syslog(data, peer):
+    """Tách (timestamp, host, message) từ một bản tin RFC 3164/5424
+
+    timestamp là chuỗi thời gian switch ghi trong header (None nếu không có), host mặc định là IP nguồn.
+    """
+    text = data.decode("utf-8", errors="replace").rstrip("\r\n\x00")
+    host = peer
+
+    # Bỏ phần PRI "<189>"
+    if text.startswith("<"):
+        end = text.find(">", 1, 5)
+        if end != -1:
+            text = text[end + 1:]
+
+    if text.startswith("1 "):
+        # RFC 5424: VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID SD MSG
+        parts = text.split(" ", 6)
+        if len(parts) == 7:
+            stamp = parts[1] if parts[1] != "-" else None
+            if parts[2] != "-":
+                host = parts[2]
+            rest = parts[6]
+            if rest.startswith("-"):
+                rest = rest[2:]
+            elif rest.startswith("["):
+                end = rest.find("] ")
+                rest = rest[end + 2:] if end != -1 else ""
+            return stamp, host, rest
+        return None, host, text
+
+    m = RFC3164_TS.match(text)
+    if m:
+        # RFC 3164: TIMESTAMP HOSTNAME MSG
+        stamp = m.group(0)[:-1]
+        rest = text[m.end():]
+        name, sep, msg = rest.partition(" ")
+        if sep:
+            return stamp, name, msg
+        return stamp, host, rest
+
+    # Cisco IOS thường gửi "123: *Mar  1 00:00:01.123: %TAG: ..." không kèm hostname và timestamp header
+    return None, host, text
+
+
+class SyslogTCPProtocol(asyncio.Protocol):
+    """Hỗ trợ cả framing octet-counting (RFC 6587) và framing theo dòng"""
+
+    def __init__(self, receiver):
+        self.receiver = receiver
+        self.buffer = b""
+        self.peer = None
+
+    def connection_made(self, transport):
+        self.peer = transport.get_extra_info("peername")[0]
+
+    def data_received(self, data):
+        buf = self.buffer + data
+        pos = 0
+        while pos < len(buf):
+            if buf[pos:pos + 1].isdigit():
+                # Octet-counting: "<độ dài> <bản tin>"
+                space = buf.find(b" ", pos)
+                if space == -1:
+                    break
+                size = int(buf[pos:space])
+                if len(buf) < space + 1 + size:
+                    break
+                self.receiver.handle_message(buf[space + 1:space + 1 + size], self.peer)
+                pos = space + 1 + size
+            else:
+                nl = buf.find(b"\n", pos)
+                if nl == -1:
+                    break
+                if nl > pos:
+                    self.receiver.handle_message(buf[pos:nl], self.peer)
+                pos = nl + 1
+        self.buffer = buf[pos:]
+        self.receiver.batch_done()
+
+
+class SyslogReceiver:
+    """Lắng nghe syslog UDP/TCP và chuyển từng dòng cho handler"""
+
+    def __init__(self, handler, bind="0.0.0.0", port=514, udp=True, tcp=True,
+                 mirror_path=None, mirror_batch=1000, mirror_interval=1.0,
+                 rcvbuf=8 * 1024 * 1024, priority=None, shed_backlog=20000, on_batch=None, logger=None):
+        self.handler = handler
+        # Gọi sau mỗi lô datagram UDP / mỗi lần nhận dữ liệu TCP, như khi tailer đã đọc hết file
+        self.on_batch = on_batch
+        self.bind = bind
+        self.port = port
+        self.udp = udp
+        self.tcp = tcp
+        self.mirror_path = mirror_path      # Ghi lại dòng gốc ra file (tùy chọn)
+        self.mirror_batch = mirror_batch
+        self.mirror_interval = mirror_interval
+        self.rcvbuf = rcvbuf                # Buffer UDP lớn để chịu được burst
+        # Khi socket UDP bị dồn, datagram không chứa chuỗi byte nào trong priority bị bỏ trước khi parse
+        self.priority = list(priority) if priority else None
+        self.shed_backlog = shed_backlog    # Số datagram đọc liên tục mà socket chưa cạn thì coi là bị dồn
+        self.logger = logger
+
+        self.received = 0
+        self.shed = 0                       # Số datagram nhiễu đã bỏ khi bị dồn
+        self._streak = 0                    # Số datagram đã đọc kể từ lần socket cạn gần nhất
+        self._shedding = False
+        self.running = True
+        self._mirror_file = None
+        self._mirror_buffer = []
+        self._loop = None
+        self._stop_event = None
+        self._stamp_second = None
+        self._stamp = ""
+
+    def _timestamp(self):
+        # Chỉ định dạng lại timestamp mỗi giây một lần
+        now = int(time.time())
+        if now != self._stamp_second:
+            self._stamp_second = now
+            self._stamp = time.strftime("%b %d %H:%M:%S", time.localtime(now))
+        return self._stamp
+
+    def handle_message(self, data, peer):
+        stamp, host, message = parse_syslog(data, peer)
+        # Dùng cùng định dạng với file của rsyslog để detector xử lý như nhau; giữ timestamp của switch
+        # để đồng hồ sự kiện nhận ra dòng đến trễ, chỉ dùng giờ nhận khi bản tin không có timestamp
+        line = f"{stamp or self._timestamp()} {host} {message}"
+        self.received += 1
+        if self._mirror_file:
+            self._mirror_buffer.append(line)
+            if len(self._mirror_buffer) >= self.mirror_batch:
+                self.flush_mirror()
+        self.handler(line)
+
+    def _drain_udp(self, sock, max_batch=4096):
+        recvfrom = sock.recvfrom
+        handle = self.handle_message
+        priority = self.priority if self._shedding else None
+        for n in range(max_batch):
+            try:
+                data, addr = recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                self._backlog(self._streak + n, drained=True)
+                self.batch_done()
+                return
+            if priority and not any(needle in data for needle in priority):
+                # Đang bị dồn: bỏ dòng nhiễu ngay trên byte, dòng có tag tấn công luôn được xử lý
+                self.shed += 1
+                continue
+            handle(data, addr[0])
+        self._backlog(self._streak + max_batch, drained=False)
+        self.batch_done()
+
+    def batch_done(self):
+        if self.on_batch:
+            self.on_batch()
+
+    def _backlog(self, streak, drained):
+        """Bật/tắt bỏ dòng nhiễu theo số datagram đọc liên tục mà socket chưa cạn"""
+        self._streak = 0 if drained else streak
+        shedding = self.priority is not None and not drained and streak >= self.shed_backlog
+        if shedding == self._shedding:
+            return
+        self._shedding = shedding
+        if self.logger:
+            if shedding:
+                self.logger.warning(f"Socket UDP bị dồn hơn {self.shed_backlog} datagram, bỏ bớt dòng nhiễu")
+            else:
+                self.logger.info(f"Hết bị dồn, tổng số dòng nhiễu đã bỏ: {self.shed}")
+
+    def flush_mirror(self):
+        if self._mirror_buffer:
+            self._mirror_file.write("\n".join(self._mirror_buffer) + "\n")
+            self._mirror_file.flush()
+            self._mirror_buffer.clear()
+
+    async def _periodic(self, interval, callback):
+        while True:
+            await asyncio.sleep(interval)
+            callback()
+
+    async def _timer(self, on_tick, max_interval):
+        # on_tick trả về số giây tới lần cần gọi kế tiếp (None nếu không có)
+        while True:
+            delay = on_tick()
+            await asyncio.sleep(max_interval if delay is None else min(delay, max_interval))
+
+    async def serve(self, on_tick=None, tick_interval=10):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        servers = []
+        tasks = []
+        udp_sock = None
+        try:
+            if self.udp:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+                except OSError:
+                    pass
+                sock.bind((self.bind, self.port))
+                sock.setblocking(False)
+                # Đọc theo lô trong một callback thay vì một callback cho mỗi datagram
+                self._loop.add_reader(sock.fileno(), self._drain_udp, sock)
+                udp_sock = sock
+            if self.tcp:
+                server = await self._loop.create_server(
+                    lambda: SyslogTCPProtocol(self), self.bind, self.port)
+                servers.append(server)
+            if self.mirror_path:
+                self._mirror_file = open(self.mirror_path, "a", encoding="utf-8")
+                tasks.append(asyncio.create_task(self._periodic(self.mirror_interval, self.flush_mirror)))
+            if on_tick:
+                tasks.append(asyncio.create_task(self._timer(on_tick, tick_interval)))
+            if self.logger:
+                self.logger.info(f"Đang nhận syslog trên {self.bind}:{self.port} (UDP={self.udp}, TCP={self.tcp})")
+
+            if self.running:
+                await self._stop_event.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for server in servers:
+                server.close()
+            if udp_sock:
+                self._loop.remove_reader(udp_sock.fileno())
+                udp_sock.close()
+            if self._mirror_file:
+                self.flush_mirror()
+                self._mirror_file.close()
+                self._mirror_file = None
+
+    def run(self, on_tick=None, tick_interval=10):
+        asyncio.run(self.serve(on_tick, tick_interval))
+
+    def stop(self):
+        """Dừng receiver, an toàn khi gọi từ signal handler hoặc thread khác"""
+        self.running = False
+        if self._loop and self._stop_event:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra checkpoint: nạp lại sau crash, đọc tiếp file đã rotate và vị trí theo từng file ở chế độ thư mục
+import os
+
+import pytest
+
+from checkpoint import CheckpointStore
+from log_tailer import LogTailer
+from monitor_core import AttackDetector, Layer2Monitor
+
+LINE = ("Mar  1 00:00:{second:02d} 10.0.0.1 <186>1: %PORT_SECURITY-2-PSECURE_VIOLATION: Security violation "
+        "occurred, caused by MAC address aabb.cc00.0001 on port Ethernet0/1.")
+
+
+def read(tailer, count):
+    gen = tailer.lines()
+    lines = [next(gen).rstrip("\n") for _ in range(count)]
+    gen.close()
+    return lines
+
+
+def test_load_applies_records_in_order_and_skips_torn_line(tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoint.jsonl")
+    store.append((1, 2, 100), {"mac": [["10.0.0.1", "Ethernet0/1", "first"]]})
+    store.append((1, 2, 250), {"mac": [["10.0.0.1", "Ethernet0/1", "second"], ["10.0.0.2", "Ethernet0/3", "x"]]})
+    with open(store.path, "a", encoding="utf-8") as f:
+        f.write('{"position":[1,2,4')  # Tiến trình bị dừng giữa lúc ghi
+
+    position, states = CheckpointStore(store.path).load()
+    assert position == (1, 2, 250)
+    assert states == {"mac": {("10.0.0.1", "Ethernet0/1"): "second", ("10.0.0.2", "Ethernet0/3"): "x"}}
+
+
+def test_directory_positions_are_kept_per_file(tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoint.jsonl")
+    store.rewrite({"10.0.0.1.log": (1, 2, 10), "10.0.0.2.log": (1, 3, 20)}, {})
+    store.append(None, {"mac": [["10.0.0.1", "Ethernet0/1", "rec"]]})
+    position, _ = CheckpointStore(store.path).load()
+    # Bản ghi chỉ có cổng không xóa vị trí đọc trước đó
+    assert position == {"10.0.0.1.log": [1, 2, 10], "10.0.0.2.log": [1, 3, 20]}
+
+
+def test_resume_finishes_rotated_file_then_reads_new_one(tmp_path):
+    path = tmp_path / "syslog.log"
+    path.write_text("line1\nline2\nline3\n")
+    tailer = LogTailer(str(path), from_start=True, idle_timeout=0.05)
+    assert read(tailer, 2) == ["line1", "line2"]
+    store = CheckpointStore(tmp_path / "checkpoint.jsonl")
+    store.append(tailer.position(), {})
+
+    # Trong lúc dịch vụ dừng: switch ghi thêm, logrotate đổi tên file và tạo file mới
+    with open(path, "a") as f:
+        f.write("line4\n")
+    os.rename(path, tmp_path / "syslog.log.1")
+    path.write_text("line5\n")
+
+    position, _ = CheckpointStore(store.path).load()
+    resumed = LogTailer(str(path), idle_timeout=0.05, resume_from=position)
+    assert read(resumed, 3) == ["line3", "line4", "line5"]
+
+
+def test_resume_ignores_offset_past_end_of_truncated_file(tmp_path):
+    path = tmp_path / "syslog.log"
+    path.write_text("a much longer first line\n")
+    tailer = LogTailer(str(path), from_start=True, idle_timeout=0.05)
+    read(tailer, 1)
+    position = tailer.position()
+    path.write_text("short\n")  # Cùng inode, ngắn hơn vị trí đã lưu
+    assert read(LogTailer(str(path), idle_timeout=0.05, resume_from=position), 1) == ["short"]
+
+
+@pytest.fixture
+def make_monitor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(AttackDetector, "log_dir", str(tmp_path / "logs"))
+
+    def make(log_path):
+        from mac_flood_protect import MACFloodMonitor
+        detector = MACFloodMonitor()
+        detector.console = lambda *args: None
+        monitor = Layer2Monitor([detector], str(log_path))
+        monitor.clock.year = 2025
+        return monitor, detector
+    return make
+
+
+def test_restart_restores_ports_and_read_position(tmp_path, make_monitor):
+    log = tmp_path / "syslog.log"
+    monitor, detector = make_monitor(log)
+    monitor.enable_checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    for second in range(3):
+        monitor.process_line(LINE.format(second=second * 10))
+    monitor.write_checkpoint((7, 42, 1234))
+
+    monitor, detector = make_monitor(log)
+    monitor.enable_checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    st = detector.shards["10.0.0.1"].interface_state["Ethernet0/1"]
+    assert (st.attack_count, st.is_attacking) == (3, True)
+    assert detector.timeouts["10.0.0.1"].next_deadline() == st.last_activity + detector.timeout_threshold
+    assert monitor.tailer.resume_from == (7, 42, 1234)
+
+
+@pytest.mark.parametrize("log_path, resumed", [
+    ("syslog.log", None),
+    ("remote/*.log", {"10.0.0.1.log": [1, 2, 10]}),
+])
+def test_directory_position_only_applies_to_directory_tailer(tmp_path, make_monitor, log_path, resumed):
+    store = CheckpointStore(tmp_path / "checkpoint.jsonl")
+    store.rewrite({"10.0.0.1.log": (1, 2, 10)}, {})
+    monitor, _ = make_monitor(tmp_path / log_path)
+    monitor.enable_checkpoint(store.path)
+    assert monitor.tailer.resume_from == resumed
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra DirectoryTailer: file của switch mới, file bị xóa, đọc tiếp theo từng file và truncate
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+import log_tailer
+from log_tailer import DirectoryTailer
+
+NEEDLE = b"%PORT_SECURITY"
+REPEATED = b"last message repeated"
+
+
+def attack(i):
+    return (f"Mar  1 00:00:{i % 60:02d} 192.168.104.6 <186>{i}: %PORT_SECURITY-2-PSECURE_VIOLATION: "
+            f"Security violation occurred, caused by MAC address aabb.cc00.0001 on port Ethernet0/{i % 4}.\n")
+
+
+def append(path, *lines):
+    with open(path, "a") as f:
+        f.writelines(lines)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class Collector:
+    """Chạy tailer.lines() trên thread nền, gom (host, dòng) vào hàng đợi"""
+
+    def __init__(self, tailer, files):
+        self.tailer = tailer
+        self.lines = queue.SimpleQueue()
+        self.received = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        # Chờ tailer mở các file đã có trước khi bắt đầu ghi
+        assert wait_until(lambda: len(tailer.readers) >= files)
+
+    def _run(self):
+        for line in self.tailer.lines():
+            if line is not None:
+                self.lines.put((self.tailer.host, line))
+
+    def wait_for(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.received) < count:
+            try:
+                self.received.append(self.lines.get(timeout=max(deadline - time.monotonic(), 0.01)))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    break
+        return self.received
+
+    def stop(self):
+        self.tailer.stop()
+        self.thread.join(timeout=5)
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def make_tailer(request, tmp_path, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr(log_tailer, "_watch_directory", lambda directory: None)
+
+    def make(**kwargs):
+        kwargs.setdefault("poll_interval", 0.02)
+        return DirectoryTailer(str(tmp_path / "*.log"), idle_timeout=0.05, **kwargs)
+    return make
+
+
+def test_new_file_is_read_from_start_with_host_from_name(tmp_path, make_tailer):
+    append(tmp_path / "10.0.0.1.log", attack(1))
+    collector = Collector(make_tailer(from_start=True), files=1)
+    try:
+        assert collector.wait_for(1) == [("10.0.0.1", attack(1))]
+        # Switch mới bắt đầu gửi log sau khi dịch vụ đã chạy
+        append(tmp_path / "10.0.0.2.log", attack(2), attack(3))
+        append(tmp_path / "10.0.0.2.txt", attack(4))
+        assert collector.wait_for(3)[1:] == [("10.0.0.2", attack(2)), ("10.0.0.2", attack(3))]
+        assert collector.wait_for(4, timeout=0.2) == collector.received[:3]
+    finally:
+        collector.stop()
+
+
+def test_deleted_file_is_no_longer_followed(tmp_path, make_tailer):
+    append(tmp_path / "10.0.0.1.log", attack(1))
+    append(tmp_path / "10.0.0.2.log", attack(2))
+    tailer = make_tailer(from_start=True)
+    collector = Collector(tailer, files=2)
+    try:
+        collector.wait_for(2)
+        os.unlink(tmp_path / "10.0.0.2.log")
+        assert wait_until(lambda: "10.0.0.2.log" not in tailer.readers)
+        assert list(tailer.readers) == ["10.0.0.1.log"]
+        append(tmp_path / "10.0.0.1.log", attack(3))
+        assert collector.wait_for(3)[2] == ("10.0.0.1", attack(3))
+    finally:
+        collector.stop()
+
+
+def test_resume_continues_each_file_from_its_own_offset(tmp_path, make_tailer):
+    append(tmp_path / "10.0.0.1.log", attack(1), attack(2))
+    append(tmp_path / "10.0.0.2.log", attack(3))
+    tailer = make_tailer(from_start=True)
+    collector = Collector(tailer, files=2)
+    collector.wait_for(3)
+    collector.stop()
+    position = tailer.position()
+    assert set(position) == {"10.0.0.1.log", "10.0.0.2.log"}
+
+    # Trong lúc dịch vụ dừng: một switch ghi thêm, một switch mới xuất hiện
+    append(tmp_path / "10.0.0.1.log", attack(4))
+    append(tmp_path / "10.0.0.3.log", attack(5))
+    collector = Collector(make_tailer(resume_from=position), files=3)
+    try:
+        assert sorted(collector.wait_for(2)) == [("10.0.0.1", attack(4)), ("10.0.0.3", attack(5))]
+        assert collector.wait_for(3, timeout=0.2) == collector.received[:2]
+    finally:
+        collector.stop()
+
+
+def test_truncate_forgets_that_last_line_was_kept(tmp_path, make_tailer):
+    path = tmp_path / "10.0.0.1.log"
+    append(path, attack(1), attack(2))
+    collector = Collector(make_tailer(from_start=True, needles=[NEEDLE], followers=[REPEATED]), files=1)
+    try:
+        collector.wait_for(2)
+        # Dòng tóm tắt đầu file mới không thuộc về dòng tấn công cuối của nội dung đã bị cắt
+        with open(path, "w") as f:
+            f.write("Mar  1 00:00:09 192.168.104.6 last message repeated 3 times\n" + attack(3))
+        assert [line for _, line in collector.wait_for(3)] == [attack(1), attack(2), attack(3)]
+        assert collector.wait_for(4, timeout=0.2) == collector.received[:3]
+    finally:
+        collector.stop()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra mỗi switch có watermark riêng: switch có đồng hồ chạy nhanh không kết thúc tấn công của switch khác
+import pytest
+
+from event_clock import EventClock
+from ingest import ingest_line
+from match_rules import RuleTable
+from monitor_core import AttackDetector
+from storm_guard import StormGuard
+
+
+def stamp(t):
+    return f"Mar  1 {t // 3600:02d}:{t // 60 % 60:02d}:{t % 60:02d}"
+
+
+def mac(t, host):
+    return (f"{stamp(t)} {host} <186>1: %PORT_SECURITY-2-PSECURE_VIOLATION: Security violation occurred, "
+            f"caused by MAC address aabb.cc00.0001 on port Ethernet0/1.")
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(AttackDetector, "log_dir", str(tmp_path))
+    from mac_flood_protect import MACFloodMonitor
+    detector = MACFloodMonitor()
+    detector.console = lambda *args: None
+    clock = EventClock(year=2025, realtime=False)
+    detector.clock = clock
+    rules = RuleTable([detector.rule])
+    guard = StormGuard()
+
+    def feed(*lines):
+        for line in lines:
+            ingest_line(line, None, rules, clock, [detector], guard)
+        return detector
+    return feed
+
+
+def test_clock_keeps_latest_time_per_switch():
+    clock = EventClock(year=2025, realtime=False)
+    a = clock.observe(mac(10, "sw-a"), "sw-a")
+    b = clock.observe(mac(3600, "sw-b"), "sw-b")
+    assert clock.now("sw-a") == a
+    assert clock.now("sw-b") == clock.now() == b
+    # Dòng đến sau được so với switch của nó, không với switch có đồng hồ chạy nhanh
+    clock.observe(mac(9, "sw-a"), "sw-a")
+    assert clock.late == 0
+
+
+def test_switch_ahead_does_not_end_other_switch_attack(pipeline):
+    detector = pipeline(mac(0, "sw-a"), mac(3600, "sw-b"), mac(3601, "sw-b"))
+    st = detector.shards["sw-a"].interface_state["Ethernet0/1"]
+    assert st.is_attacking
+    # Dòng kế tiếp của chính sw-a sau timeout mới kết thúc tấn công cũ
+    pipeline(mac(40, "sw-a"))
+    first, second = st.timestamps()
+    assert (st.is_attacking, st.attack_count, second - first) == (True, 2, 40)
+    assert st.first_detected == second
+
+
+def test_housekeeping_uses_each_switch_watermark(pipeline):
+    detector = pipeline(mac(0, "sw-a"), mac(20, "sw-b"), mac(100, "sw-a"))
+    detector.check_timeout_attacks()
+    assert detector.shards["sw-a"].interface_state["Ethernet0/1"].is_attacking
+    assert detector.shards["sw-b"].interface_state["Ethernet0/1"].is_attacking
+    assert set(detector.timeouts) == {"sw-a", "sw-b"}
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra FleetPoller khi bộ đếm và syslog cùng báo các vi phạm port-security
+from contextlib import contextmanager
+
+import pytest
+
+from event_clock import EventClock
+from fleet_poller import FleetPoller, parse_port_security
+from monitor_core import AttackDetector
+from storm_guard import StormGuard
+
+HOST = "10.0.0.1"
+PORT = "Ethernet0/1"
+
+PSECURE = """Secure Port  MaxSecureAddr  CurrentAddr  SecurityViolation  Security Action
+                (Count)       (Count)          (Count)
+---------------------------------------------------------------------------
+      Et0/1              1            1              {violations}         Shutdown
+      Et0/2              1            1                  0         Shutdown
+---------------------------------------------------------------------------
+Total Addresses in System (excluding one mac per port)     : 0
+"""
+
+
+class FakeConnection:
+    def __init__(self, outputs):
+        self.outputs = outputs
+
+    def send_command(self, command):
+        return self.outputs.get(command, "")
+
+
+class FakePool:
+    """Thay cho SwitchConnectionPool: trả về đầu ra lệnh show đã đặt sẵn"""
+
+    def __init__(self):
+        self.outputs = {}
+
+    @contextmanager
+    def session(self, config, timeout=None):
+        yield FakeConnection(self.outputs)
+
+
+class Scenario:
+    """Một detector MAC flooding nhận cả dòng syslog (qua StormGuard) lẫn bộ đếm hỏi định kỳ"""
+
+    def __init__(self):
+        from mac_flood_protect import MACFloodMonitor
+        self.detector = MACFloodMonitor()
+        self.detector.console = lambda *args: None
+        self.clock = EventClock(realtime=False)
+        self.detector.clock = self.clock
+        self.guard = StormGuard()
+        self.pool = FakePool()
+        self.poller = FleetPoller(self.pool, [self.detector], [HOST])
+        self.violations = 0
+
+    def syslog(self, t, count=1):
+        """count dòng vi phạm của cổng tại giây t (switch cũng tăng bộ đếm)"""
+        self.clock.advance(t)
+        self.detector.check_timeout_attacks(self.clock.watermark())
+        for _ in range(count):
+            self.guard.attack(self.detector, PORT, f"[{t}] %PORT_SECURITY-2-PSECURE_VIOLATION", HOST, t)
+        self.violations += count
+
+    def lost(self, count=1):
+        """Vi phạm switch đã đếm nhưng dòng syslog bị mất"""
+        self.violations += count
+
+    def poll(self, t):
+        self.clock.advance(t)
+        self.detector.check_timeout_attacks(self.clock.watermark())
+        self.pool.outputs["show port-security"] = PSECURE.format(violations=self.violations)
+        self.poller.poll_switch(self.poller.switch_configs[0])
+        self.poller.drain()
+
+    def state(self):
+        return self.detector.shards[HOST].interface_state[PORT]
+
+    def close(self):
+        self.poller.stop()
+
+
+@pytest.fixture
+def scenario(tmp_path, monkeypatch):
+    monkeypatch.setattr(AttackDetector, "log_dir", str(tmp_path))
+    sc = Scenario()
+    yield sc
+    sc.close()
+
+
+def test_parse_port_security_uses_syslog_interface_names():
+    assert parse_port_security(PSECURE.format(violations=3)) == {"Ethernet0/1": 3, "Ethernet0/2": 0}
+
+
+def test_polls_between_syslog_hits_do_not_double_count(scenario):
+    scenario.poll(-15)  # Lần hỏi đầu chỉ lấy mốc
+    for t in (0, 30, 60, 90, 120):
+        scenario.syslog(t)
+        if t < 120:
+            scenario.poll(t + 15)
+    st = scenario.state()
+    assert st.attack_count == 5
+    assert st.timestamps() == [0, 30, 60, 90, 120]
+    assert st.is_persistent
+
+
+def test_lost_syslog_is_added_without_ring_timestamp(scenario):
+    scenario.poll(-15)
+    scenario.syslog(0, count=2)
+    scenario.lost(3)
+    scenario.poll(15)
+    st = scenario.state()
+    assert st.attack_count == 5
+    assert st.timestamps() == [0]
+    assert st.last_activity == 15
+
+
+def test_counter_alone_detects_attack(scenario):
+    scenario.poll(-15)
+    scenario.lost(4)
+    scenario.poll(15)
+    st = scenario.state()
+    assert (st.is_attacking, st.attack_count, st.timestamps()) == (True, 4, [15])
+
+
+DHCP_STATS = """ Packets Forwarded                                     = 120
+ Packets Dropped                                       = {dropped}
+ Packets Dropped From untrusted ports                  = {dropped}
+"""
+
+
+def test_switch_wide_dhcp_drops_are_not_a_port_attack(tmp_path, monkeypatch):
+    monkeypatch.setattr(AttackDetector, "log_dir", str(tmp_path))
+    from dhcp_snooping_protect import DHCPSnoopingMonitor
+    detector = DHCPSnoopingMonitor()
+    detector.console = lambda *args: None
+    detector.clock = EventClock(realtime=False)
+    pool = FakePool()
+    poller = FleetPoller(pool, [detector], [HOST])
+    try:
+        # Bộ đếm tính theo gói: 3 dòng errdisable của Et0/2 không được trừ khỏi 500 gói bị drop
+        for t, dropped in ((0, 100), (30, 600)):
+            pool.outputs["show ip dhcp snooping statistics"] = DHCP_STATS.format(dropped=dropped)
+            poller.poll_switch(poller.switch_configs[0])
+            poller.drain()
+            if t == 0:
+                for _ in range(3):
+                    detector.process_attack("Ethernet0/2", "%DHCP_SNOOPING-4-DHCP_SNOOPING_ERRDISABLE_WARNING", HOST, 5)
+    finally:
+        poller.stop()
+    assert detector.switch_counters == {HOST: 500}
+    assert set(detector.shards[HOST].interface_state) == {"Ethernet0/2"}
+    assert detector.poll_reported is None
+
+
+MAC_ROW = "   1    {mac}    DYNAMIC     Et0/1"
+
+
+def mac_table(count):
+    rows = ["Vlan    Mac Address       Type        Ports", "----    -----------       --------    -----"]
+    rows += [MAC_ROW.format(mac=f"aabb.cc00.{i:04x}") for i in range(count)]
+    return "\n".join(rows)
+
+
+def test_mac_learning_warns_once_per_surge_with_syslog_port_name(scenario, monkeypatch):
+    warnings = []
+    monkeypatch.setattr(scenario.detector, "mac_learning_warning", lambda *args: warnings.append(args[:3]))
+    # Số MAC học được mỗi lần hỏi: tăng vọt hai lần liên tiếp, dừng, rồi tăng vọt lại
+    for total in (0, 500, 1000, 1000, 1500):
+        scenario.pool.outputs["show mac address-table"] = mac_table(total)
+        scenario.poller.poll_switch(scenario.poller.switch_configs[0])
+        scenario.poller.drain()
+    assert warnings == [(HOST, PORT, 500), (HOST, PORT, 500)]
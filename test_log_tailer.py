@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra LogTailer khi file bị rotate / truncate giữa một đợt ghi dồn dập
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+import log_tailer
+from log_tailer import LogTailer
+
+NEEDLE = b"%PORT_SECURITY"
+
+
+def attack(i):
+    return (f"Mar  1 00:{i // 60 % 60:02d}:{i % 60:02d} 10.0.0.1 <186>{i}: %PORT_SECURITY-2-PSECURE_VIOLATION: "
+            f"Security violation occurred, caused by MAC address aabb.cc00.0001 on port Ethernet0/{i % 4}.\n")
+
+
+def noise(i):
+    return f"Mar  1 00:{i // 60 % 60:02d}:{i % 60:02d} 10.0.0.1 <189>{i}: %LINK-3-UPDOWN: Interface Ethernet1/0, changed state to up\n"
+
+
+def burst(first, count, with_noise):
+    """Các dòng của một đợt ghi, có dòng nhiễu xen giữa nếu with_noise"""
+    lines = []
+    for i in range(first, first + count):
+        lines.append(attack(i))
+        if with_noise:
+            lines.append(noise(i))
+    return lines
+
+
+def write_split(f, lines, piece=173):
+    """Ghi cả đợt thành các mảnh không trùng ranh giới dòng để tailer thấy cả dòng chưa ghi xong"""
+    data = "".join(lines).encode()
+    for i in range(0, len(data), piece):
+        f.write(data[i:i + piece])
+        f.flush()
+
+
+class Collector:
+    """Chạy tailer.lines() trên thread nền, gom các dòng vào hàng đợi"""
+
+    def __init__(self, tailer):
+        self.tailer = tailer
+        self.lines = queue.SimpleQueue()
+        self.received = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        # Chờ tailer mở file trước khi bắt đầu ghi, rotate ngay sau đó vẫn phải được nhận ra
+        deadline = time.monotonic() + 5
+        while tailer._file is None and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def _run(self):
+        for line in self.tailer.lines():
+            if line is not None:
+                self.lines.put(line)
+
+    def wait_for(self, count, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while len(self.received) < count:
+            try:
+                self.received.append(self.lines.get(timeout=max(deadline - time.monotonic(), 0.01)))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    break
+        return self.received
+
+    def stop(self):
+        self.tailer.stop()
+        self.thread.join(timeout=5)
+
+
+@pytest.fixture(params=["inotify", "polling", "needles"])
+def mode(request, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr(log_tailer, "_watch_directory", lambda directory: None)
+    elif log_tailer._load_inotify() is None:
+        pytest.skip("hệ thống không có inotify")
+    return request.param
+
+
+def make_tailer(path, mode):
+    needles = [NEEDLE] if mode == "needles" else None
+    # chunk_size nhỏ để một đợt ghi trải qua nhiều khối và nhiều lần nới bộ đệm
+    return LogTailer(str(path), from_start=True, poll_interval=0.01, idle_timeout=0.05,
+                     needles=needles, chunk_size=512)
+
+
+def expected(lines, mode):
+    return [line for line in lines if mode != "needles" or NEEDLE.decode() in line]
+
+
+def test_rotate_during_burst(tmp_path, mode):
+    path = tmp_path / "syslog.log"
+    with_noise = mode == "needles"
+    before, old_tail, after = burst(0, 300, with_noise), burst(300, 50, with_noise), burst(350, 300, with_noise)
+    old = open(path, "ab")
+    collector = Collector(make_tailer(path, mode))
+    try:
+        write_split(old, before)
+        # logrotate đổi tên file giữa đợt, rsyslog vẫn ghi vào file cũ cho tới khi được HUP
+        os.rename(path, tmp_path / "syslog.log.1")
+        write_split(old, old_tail)
+        old.close()
+        with open(path, "ab") as new:
+            write_split(new, after)
+        want = expected(before + old_tail + after, mode)
+        assert collector.wait_for(len(want)) == want
+    finally:
+        collector.stop()
+    assert collector.lines.empty()
+
+
+def test_truncate_during_burst(tmp_path, mode):
+    path = tmp_path / "syslog.log"
+    with_noise = mode == "needles"
+    before, after = burst(0, 400, with_noise), burst(400, 100, with_noise)
+    path.touch()
+    collector = Collector(make_tailer(path, mode))
+    try:
+        with open(path, "ab") as f:
+            write_split(f, before)
+            first = expected(before, mode)
+            assert collector.wait_for(len(first)) == first
+            # copytruncate: cùng inode, kích thước về 0 rồi ghi tiếp ít hơn phần đã đọc
+            f.truncate(0)
+            write_split(f, after)
+        want = first + expected(after, mode)
+        assert collector.wait_for(len(want)) == want
+    finally:
+        collector.stop()
+
+
+def test_partial_line_is_held_until_complete(tmp_path, mode):
+    path = tmp_path / "syslog.log"
+    line = attack(7)
+    path.touch()
+    collector = Collector(make_tailer(path, mode))
+    try:
+        with open(path, "ab") as f:
+            f.write(line[:40].encode())
+            f.flush()
+            assert collector.wait_for(1, timeout=0.3) == []
+            f.write(line[40:].encode())
+            f.flush()
+        assert collector.wait_for(1) == [line]
+    finally:
+        collector.stop()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra RemediationQueue gộp các yêu cầu trùng và gửi cổng ưu tiên cao trước, qua SSH tới switch giả lập
+import pytest
+
+from fake_ios_ssh import FakeIOSServer
+from netmiko_pool import SwitchConnectionPool
+from remediation import RemediationQueue
+
+
+@pytest.fixture(scope="module")
+def server():
+    srv = FakeIOSServer().start()
+    yield srv
+    srv.close()
+
+
+@pytest.fixture
+def pool():
+    p = SwitchConnectionPool(max_sessions=1)
+    yield p
+    p.close()
+
+
+def config_lines(device):
+    """Các lệnh cấu hình switch đã nhận, bỏ phần vào/ra config mode của Netmiko"""
+    with device.lock:
+        return [cmd for mode, cmd in device.commands if mode.startswith("config") and cmd not in ("", "end", "exit")]
+
+
+def run(queue, requests):
+    for args in requests:
+        queue.submit(*args)
+    # Đưa hết yêu cầu vào trước khi dispatcher chạy để chúng nằm trong cùng một lô
+    queue.start()
+    queue.stop()
+
+
+def test_duplicate_requests_coalesce_into_one_batch(server, pool):
+    server.device.commands.clear()
+    queue = RemediationQueue(pool, dry_run=False, batch_window=0)
+    config = server.switch_config()
+    run(queue, [
+        (config, "Ethernet0/1", "shutdown", 0, 1.0),
+        (config, "Ethernet0/1", "shutdown", 0, 2.0),
+        (config, "Ethernet0/1", "no shutdown", 0, 3.0),
+        (config, "Ethernet0/1", "clear port-security", 0, 4.0),
+    ])
+    stats = queue.stats()
+    assert (stats["submitted"], stats["coalesced"], stats["applied"], stats["batches"]) == (4, 2, 2, 1)
+    # Cùng slot "admin": yêu cầu sau thay yêu cầu trước, lệnh chỉ được gửi một lần
+    assert config_lines(server.device) == [
+        "interface Ethernet0/1", "shutdown", "no shutdown",
+        "do clear port-security sticky interface Ethernet0/1",
+    ]
+
+
+def test_higher_priority_ports_are_configured_first(server, pool):
+    server.device.commands.clear()
+    queue = RemediationQueue(pool, dry_run=False, batch_window=0)
+    config = server.switch_config()
+    run(queue, [
+        (config, "Ethernet0/1", "shutdown", 0, 1.0),
+        (config, "Ethernet0/2", "shutdown", 0, 2.0),
+        (config, "Ethernet0/3", "shutdown", 1, 3.0),
+        # Cổng 2 trở thành kẻ tấn công liên tục: được nâng ưu tiên nhưng giữ lúc phát hiện sớm nhất
+        (config, "Ethernet0/2", "shutdown", 1, 4.0),
+    ])
+    assert [cmd for cmd in config_lines(server.device) if cmd.startswith("interface ")] == [
+        "interface Ethernet0/2", "interface Ethernet0/3", "interface Ethernet0/1",
+    ]
+    assert queue.stats()["coalesced"] == 1
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra replay_worker cho cùng kết luận với chế độ theo dõi trực tiếp
+from replay import replay_worker
+
+
+def stamp(t):
+    return f"Mar  1 {t // 3600:02d}:{t // 60 % 60:02d}:{t % 60:02d}"
+
+
+def mac(t, port=1, host="10.0.0.1"):
+    return (f"{stamp(t)} {host} <186>1: %PORT_SECURITY-2-PSECURE_VIOLATION: Security violation occurred, "
+            f"caused by MAC address aabb.cc00.0001 on port Ethernet0/{port}.\n")
+
+
+def dhcp(t, port=2, host="10.0.0.1"):
+    return (f"{stamp(t)} {host} <188>1: %DHCP_SNOOPING-4-DHCP_SNOOPING_ERRDISABLE_WARNING: "
+            f"DHCP Snooping received 10 DHCP packets on interface Ethernet0/{port}.\n")
+
+
+def noise(t, host="10.0.0.1"):
+    return f"{stamp(t)} {host} <189>1: %LINK-3-UPDOWN: Interface Ethernet1/0, changed state to up\n"
+
+
+def replay(tmp_path, lines, names=("mac", "dhcp")):
+    path = tmp_path / "syslog.log"
+    path.write_text("".join(lines))
+    _, _, states = replay_worker([str(path)], list(names), str(tmp_path / "logs"), year=2025)
+    return {(rule, device, iface): rec for rule, ports in states.items() for device, iface, rec in ports}
+
+
+def test_attack_times_out_when_other_detector_keeps_matching(tmp_path):
+    lines = [mac(4)] + [dhcp(t) for t in range(10, 3600, 10)]
+    states = replay(tmp_path, lines)
+    count, attacking = states[("mac_flooding_monitor", "10.0.0.1", "Ethernet0/1")][:2]
+    assert (count, attacking) == (1, False)
+
+
+def test_attack_times_out_at_end_of_input(tmp_path):
+    lines = [mac(4)] + [noise(t) for t in range(10, 3600, 10)]
+    states = replay(tmp_path, lines)
+    assert states[("mac_flooding_monitor", "10.0.0.1", "Ethernet0/1")][1] is False
+
+
+def test_attack_still_running_at_end_of_input(tmp_path):
+    lines = [mac(4), noise(10)]
+    states = replay(tmp_path, lines)
+    assert states[("mac_flooding_monitor", "10.0.0.1", "Ethernet0/1")][1] is True
+
+
+def test_replay_matches_live_monitor_on_bursts(tmp_path, monkeypatch):
+    # Năm đợt 20 dòng giống nhau trong một giây, cách nhau một recovery cycle, kèm dòng tóm tắt của rsyslog
+    lines = []
+    for cycle in range(5):
+        lines += [mac(cycle * 30)] * 20 + [noise(cycle * 30)]
+        lines += [mac(cycle * 30 + 1), f"{stamp(cycle * 30 + 1)} 10.0.0.1 last message repeated 4 times\n"]
+    replayed = replay(tmp_path, lines)[("mac_flooding_monitor", "10.0.0.1", "Ethernet0/1")]
+
+    from monitor_core import AttackDetector, Layer2Monitor
+    from mac_flood_protect import MACFloodMonitor
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(AttackDetector, "log_dir", str(tmp_path / "live"))
+    detector = MACFloodMonitor()
+    monitor = Layer2Monitor([detector], str(tmp_path / "syslog.log"))
+    monitor.clock.year = 2025
+    detector.console = lambda *args: None
+    for line in lines:
+        monitor.process_line(line.rstrip("\n"))
+    live = detector.shards["10.0.0.1"].interface_state["Ethernet0/1"].snapshot()
+
+    assert live[0] == replayed[0] == 5 * 25
+    assert live[2] is replayed[2] is True
+    assert live[6] == replayed[6]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra ShardedIngest: chia dòng theo switch, gửi lô và đồng bộ trạng thái cổng từ tiến trình con về
+import queue
+import time
+
+import pytest
+
+from monitor_core import AttackDetector, Layer2Monitor
+from sharded_ingest import ShardedIngest, shard_of
+
+HOSTS = [f"10.0.0.{i}" for i in range(1, 9)]
+
+
+def violation(host, second, port=1):
+    return (f"Mar  1 00:00:{second:02d} {host} <186>1: %PORT_SECURITY-2-PSECURE_VIOLATION: Security violation "
+            f"occurred, caused by MAC address aabb.cc00.0001 on port Ethernet0/{port}.")
+
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(AttackDetector, "log_dir", str(tmp_path / "logs"))
+    from mac_flood_protect import MACFloodMonitor
+    detector = MACFloodMonitor()
+    detector.console = lambda *args: None
+    monitor = Layer2Monitor([detector], str(tmp_path / "syslog.log"))
+    monitor.clock.year = 2025
+    return monitor
+
+
+def inbox_messages(sharded, k):
+    """Các tin đã gửi cho tiến trình con k (hàng đợi chuyển tin qua thread nền nên phải chờ một chút)"""
+    messages = []
+    while True:
+        try:
+            messages.append(sharded._inboxes[k].get(timeout=0.2))
+        except queue.Empty:
+            return messages
+
+
+def test_shard_of_is_stable_and_in_range():
+    shards = [shard_of(host, 3) for host in HOSTS]
+    assert shards == [shard_of(host, 3) for host in HOSTS]
+    assert set(shards) <= {0, 1, 2} and len(set(shards)) > 1
+    assert shard_of(None, 3) == shard_of("", 3)
+
+
+def test_submit_routes_each_switch_to_one_worker(monitor):
+    # Không khởi động tiến trình con: chỉ kiểm tra lô được chia thế nào
+    sharded = ShardedIngest(monitor, 3, {}, batch_size=1000)
+    assert sharded.pending_delay() is None
+    for second in range(3):
+        for host in HOSTS:
+            sharded.submit(violation(host, second))
+    sharded.submit(violation("192.168.104.6", 9), host="sw-a")
+    assert 0 <= sharded.pending_delay() <= sharded.max_delay
+    # Host trong header được nhớ lại, không parse lại từng dòng
+    assert sharded._routes == {host: shard_of(host, 3) for host in HOSTS}
+
+    sharded.flush()
+    assert sharded.pending_delay() is None
+    assert (sharded.lines_sent, sharded.batches_sent) == (25, 3)
+    for k in range(3):
+        [(kind, lines, hosts)] = inbox_messages(sharded, k)
+        assert kind == "lines"
+        assert {line.split()[3] for line in lines} == {h for h in HOSTS if shard_of(h, 3) == k} | (
+            {"192.168.104.6"} if shard_of("sw-a", 3) == k else set())
+        # Lô có dòng mà host lấy từ tên file mang theo danh sách host, lô khác không
+        assert hosts == (["sw-a"] if shard_of("sw-a", 3) == k else None)
+
+
+def test_full_batch_is_sent_without_flush(monitor):
+    sharded = ShardedIngest(monitor, 2, {}, batch_size=2)
+    k = shard_of(HOSTS[0], 2)
+    sharded.submit(violation(HOSTS[0], 1))
+    sharded.submit(violation(HOSTS[0], 2))
+    assert [len(msg[1]) for msg in inbox_messages(sharded, k)] == [2]
+
+
+def test_forward_keeps_switch_counters_in_main_process(monitor):
+    detector = monitor.detectors[0]
+    sharded = ShardedIngest(monitor, 2, {})
+    sharded.forward("sw-a", detector.poll_delta, ("sw-a", "Ethernet0/1", 2, "[POLL]"))
+    assert inbox_messages(sharded, shard_of("sw-a", 2)) == [
+        ("call", detector.log_prefix, "poll_delta", ("sw-a", "Ethernet0/1", 2, "[POLL]"))]
+    sharded.forward("sw-a", detector.switch_counter, ("sw-a", 5, "[POLL]"))
+    assert detector.switch_counters == {"sw-a": 5}
+    assert all(inbox_messages(sharded, k) == [] for k in range(2))
+
+
+def test_sync_returns_port_state_and_writes_checkpoint_once_all_workers_reply(monitor, monkeypatch):
+    written = []
+    monkeypatch.setattr(monitor, "write_checkpoint", written.append)
+    monitor.enable_sharding(2)
+    sharded = monitor.sharded
+    try:
+        hosts = HOSTS[:4]
+        assert len({shard_of(host, 2) for host in hosts}) == 2
+        for second in range(3):
+            for host in hosts:
+                monitor.process_line(violation(host, second * 10))
+        sharded._next_sync = 0
+        sharded.housekeeping((7, 42, 1234))
+        deadline = time.monotonic() + 30
+        while not written and time.monotonic() < deadline:
+            time.sleep(0.01)
+            sharded.housekeeping((7, 42, 1234))
+        assert written == [(7, 42, 1234)]
+
+        detector = monitor.detectors[0]
+        for host in hosts:
+            st = detector.shards[host].interface_state["Ethernet0/1"]
+            assert (st.attack_count, st.is_attacking) == (3, True)
+        assert sum(rule.hits for rule in monitor.rules.rules) == 12
+    finally:
+        sharded.stop()
+    assert sum(stats["lines"] for stats in sharded.worker_stats.values()) == 12
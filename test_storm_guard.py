@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra StormGuard gộp các đợt dòng tấn công giống nhau mà vẫn nhận ra recovery cycle
+import pytest
+
+from event_clock import EventClock
+from monitor_core import AttackDetector
+from storm_guard import StormGuard
+
+HOST = "10.0.0.1"
+PORT = "Ethernet0/1"
+LINE = "%PORT_SECURITY-2-PSECURE_VIOLATION: Security violation occurred on port Ethernet0/1."
+
+
+@pytest.fixture
+def detector(tmp_path, monkeypatch):
+    monkeypatch.setattr(AttackDetector, "log_dir", str(tmp_path))
+    from mac_flood_protect import MACFloodMonitor
+    det = MACFloodMonitor()
+    det.console = lambda *args: None
+    det.clock = EventClock(realtime=False)
+    return det
+
+
+def run(detector, guard, times):
+    calls = []
+    process_attack = detector.process_attack
+    detector.process_attack = lambda *args: calls.append(args[3]) or process_attack(*args)
+    for t in times:
+        detector.clock.advance(t)
+        detector.check_timeout_attacks(detector.clock.watermark())
+        guard.attack(detector, PORT, LINE, HOST, t)
+    return calls, detector.shards[HOST].interface_state[PORT]
+
+
+def test_burst_spread_over_seconds_leaves_one_timestamp_per_cycle(detector):
+    # Mỗi recovery cycle (30s) switch xả 20 dòng trong 5 giây
+    times = [cycle * 30 + i * 0.25 for cycle in range(5) for i in range(20)]
+    calls, st = run(detector, StormGuard(), times)
+    assert calls == [0, 30, 60, 90, 120]
+    assert st.timestamps() == [0, 30, 60, 90, 120]
+    assert st.attack_count == 100
+    assert st.last_activity == 124.75
+    assert st.is_persistent
+
+
+def test_storm_with_whole_second_timestamps_stays_one_burst(detector):
+    # Timestamp syslog chỉ đến giây: các dòng của một đợt cách nhau đúng 1s
+    times = [cycle * 30 + second for cycle in range(4) for second in range(8) for _ in range(3)]
+    calls, st = run(detector, StormGuard(), times)
+    assert calls == [0, 30, 60, 90]
+    assert st.is_persistent
+
+
+def test_window_closes_after_idle_gap(detector):
+    # Dòng cách đúng window giây (timestamp chỉ đến giây) vẫn thuộc cùng đợt
+    calls, st = run(detector, StormGuard(window=1.0), [0, 0.5, 1.5, 2.5, 3.6, 3.7])
+    assert calls == [0, 3.6]
+    assert st.attack_count == 6
+
+
+def test_window_zero_processes_every_line(detector):
+    calls, st = run(detector, StormGuard(window=0), [0, 0, 0.5])
+    assert calls == [0, 0, 0.5]
+    assert st.attack_count == 3
+
+
+def test_repeat_summary_counts_as_original_lines(detector):
+    guard = StormGuard()
+    run(detector, guard, [0])
+    repeat = guard.repeat_of("Mar  1 00:00:01 10.0.0.1 last message repeated 9 times", HOST)
+    assert repeat == (detector, HOST, PORT, 9)
+    guard.attack(detector, PORT, "last message repeated 9 times", HOST, 0.5, repeat[3])
+    assert detector.shards[HOST].interface_state[PORT].attack_count == 10
+    assert guard.stats()["collapsed"] == 9
+
+
+def test_line_after_attack_ended_is_not_collapsed(detector):
+    guard = StormGuard()
+    calls, st = run(detector, guard, [0, 1])
+    # Tấn công đã kết thúc dù cửa sổ gộp chưa đóng (vd. mốc kết thúc khi hết dữ liệu)
+    detector.check_timeout_attacks(100)
+    assert not st.is_attacking
+    calls, st = run(detector, guard, [2])
+    assert calls == [2]
+    assert st.is_attacking and st.attack_count == 3
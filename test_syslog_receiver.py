@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Kiểm tra SyslogReceiver giữ timestamp của switch để đồng hồ sự kiện nhận ra dòng đến trễ
+from event_clock import EventClock
+from syslog_receiver import SyslogReceiver, parse_syslog
+
+TAG = "%PORT_SECURITY-2-PSECURE_VIOLATION: Security violation occurred on port Ethernet0/1."
+
+
+def test_parse_rfc3164_keeps_device_timestamp():
+    assert parse_syslog(f"<186>Mar  1 00:00:05 sw1 {TAG}".encode(), "10.0.0.9") == ("Mar  1 00:00:05", "sw1", TAG)
+
+
+def test_parse_rfc5424_keeps_device_timestamp():
+    data = f"<186>1 2025-08-28T10:00:01.123+07:00 sw2 ios - - - {TAG}".encode()
+    assert parse_syslog(data, "10.0.0.9") == ("2025-08-28T10:00:01.123+07:00", "sw2", TAG)
+
+
+def test_message_without_timestamp_uses_receive_time():
+    lines = []
+    receiver = SyslogReceiver(lines.append, udp=False, tcp=False)
+    receiver.handle_message(b"<186>12: *Mar  1 00:00:01.123: " + TAG.encode(), "10.0.0.9")
+    assert lines[0].startswith(receiver._timestamp() + " 10.0.0.9 12: ")
+
+
+def test_out_of_order_datagrams_are_seen_as_late():
+    lines = []
+    receiver = SyslogReceiver(lines.append, udp=False, tcp=False)
+    for second in (10, 11, 12, 3, 13):
+        receiver.handle_message(f"<186>Mar  1 00:00:{second:02d} sw1 {TAG}".encode(), "10.0.0.9")
+    clock = EventClock(year=2025, realtime=False)
+    times = [clock.observe(line) for line in lines]
+    assert [t - times[0] for t in times] == [0, 1, 2, -7, 3]
+    assert clock.late == 1
+
+
+def test_each_udp_drain_and_tcp_read_ends_with_on_batch():
+    import socket
+    from syslog_receiver import SyslogTCPProtocol
+    events = []
+    receiver = SyslogReceiver(lambda line: events.append("line"), udp=False, tcp=False,
+                              on_batch=lambda: events.append("batch"))
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(("127.0.0.1", 0))
+    rx.setblocking(False)
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        for second in (1, 2):
+            tx.sendto(f"<186>Mar  1 00:00:0{second} sw1 {TAG}".encode(), rx.getsockname())
+        receiver._drain_udp(rx)
+    finally:
+        rx.close()
+        tx.close()
+    assert events == ["line", "line", "batch"]
+
+    # Lô chưa đầy của ShardedIngest được gửi ngay cả khi dòng TCP cuối chưa nhận đủ
+    events.clear()
+    protocol = SyslogTCPProtocol(receiver)
+    protocol.peer = "10.0.0.9"
+    protocol.data_received(f"<186>Mar  1 00:00:03 sw1 {TAG}\n<186>Mar  1".encode())
+    assert events == ["line", "batch"]
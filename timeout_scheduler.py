@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+
+
+class DeadlineScheduler:
+    """Hàng đợi deadline dạng heap, mỗi key chỉ có tối đa một mục trong heap
+
+    Cập nhật hoạt động của một cổng không cần đẩy thêm mục mới: khi mục đến hạn,
+    người gọi tự kiểm tra deadline thật và gọi schedule() lại nếu chưa hết hạn.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._scheduled = set()
+        self._seq = itertools.count()  # Tránh so sánh key khi trùng deadline
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, key, deadline):
+        """Đặt deadline cho key nếu key chưa có trong heap - O(log n), O(1) nếu đã có"""
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        heapq.heappush(self._heap, (deadline, next(self._seq), key))
+
+    def next_deadline(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Lấy ra các key có deadline <= now"""
+        heap = self._heap
+        if not heap or heap[0][0] > now:
+            return []
+        due = []
+        while heap and heap[0][0] <= now:
+            _, _, key = heapq.heappop(heap)
+            self._scheduled.discard(key)
+            due.append(key)
+        return due